@@ -3,35 +3,183 @@ import requests
 import json
 import time
 import threading
+import os
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
-    QHBoxLayout, QLabel, QFrame, QSizePolicy,
-    QScrollArea, QMessageBox
+    QListView, QStyledItemDelegate, QAbstractItemView, QMessageBox
 )
-from PyQt5.QtCore import QObject, QThread, pyqtSignal as Signal, pyqtSlot as Slot, Qt
+from PyQt5.QtCore import (
+    QObject, QThread, pyqtSignal as Signal, pyqtSlot as Slot, Qt,
+    QAbstractListModel, QModelIndex, QRect, QSize, QStandardPaths, QTimer
+)
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter, QPen, QPixmap, QPixmapCache
 from websocket import WebSocketApp
-from typing import Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import msgpack
+except ImportError:  # Sin msgpack se sigue usando JSON
+    msgpack = None
+
+
+# Formato compacto (ver server/formatos.py): estados como enteros según su
+# posición en esta lista, que debe coincidir con ESTADOS_VALIDOS del servidor
+ESQUEMA_COMPACTO = 1
+TIPO_MSGPACK = "application/x-msgpack"
+ESTADOS_COMPACTOS = [
+    "Pedido al Deposito",
+    "Listo para ser Entregado",
+    "Entregado al Cliente",
+    "No Entregado",
+    "En Deposito",
+]
+
+
+# El servidor envía un ping cada WS_PING_INTERVALO (20 s) y los clientes lo
+# responden; si pasa este tiempo sin recibir nada, la conexión se da por
+# muerta (servidor caído, Wi-Fi cortado) y se reconecta
+LATIDO_TIMEOUT = 60
+
+# Hilos que envían los cambios de estado al servidor. Los clics que llegan
+# mientras están ocupados esperan su turno en la cola, sin abrir más hilos.
+HTTP_HILOS = 2
+
+
+def _evento_compacto(evento: list) -> dict:
+    seq, pieza, guarda, codigo = evento
+    return {"seq": seq, "pieza": pieza, "guarda": guarda, "estado": ESTADOS_COMPACTOS[codigo]}
+
+
+def decodificar_mensaje(datos: bytes) -> dict:
+    """Convierte un mensaje WebSocket compacto al mismo dict que llega en JSON"""
+    esquema, tipo, *resto = msgpack.unpackb(datos)
+    if esquema != ESQUEMA_COMPACTO:
+        raise ValueError(f"Esquema de mensaje desconocido: {esquema}")
+    if tipo == 1:
+        seq, eventos = resto
+        return {"tipo": "lote", "seq": seq, "eventos": [_evento_compacto(e) for e in eventos]}
+    if tipo == 2:
+        return {"tipo": "resync", "seq": resto[0]}
+    if tipo == 3:
+        return {"tipo": "ping"}
+    return _evento_compacto(resto)
+
+
+def decodificar_cambios(datos: bytes) -> dict:
+    """Convierte una página compacta de /pedidos/changes a la forma JSON"""
+    pagina = msgpack.unpackb(datos)
+    if pagina["v"] != ESQUEMA_COMPACTO:
+        raise ValueError(f"Esquema de respuesta desconocido: {pagina['v']}")
+    pagina["pedidos"] = [
+        {"pieza": pieza, "guarda": guarda, "estado": ESTADOS_COMPACTOS[codigo], "version": version}
+        for pieza, guarda, codigo, version in pagina["pedidos"]
+    ]
+    return pagina
+
+
+class ClienteAPI(QObject):
+    """
+    Conexiones HTTP con el servidor: una sesión con keep-alive compartida y
+    un pool acotado de hilos para lo que no debe bloquear la UI. Los
+    resultados y errores de las tareas en segundo plano vuelven al hilo de
+    la UI por una señal.
+    """
+
+    # (callback, valor) a ejecutar en el hilo del objeto
+    _terminado = Signal(object, object)
+
+    def __init__(self, hilos: int = HTTP_HILOS, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.session = requests.Session()
+        # Una conexión por hilo más la de la descarga inicial, que corre en el hilo de la UI
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=hilos + 1)
+        self.session.mount("http://", adaptador)
+        self.session.mount("https://", adaptador)
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="http")
+        self._terminado.connect(self._entregar)
+
+    def en_segundo_plano(self, tarea: Callable[[], Any],
+                         al_terminar: Optional[Callable[[Any], None]] = None,
+                         al_fallar: Optional[Callable[[Exception], None]] = None) -> Future:
+        """
+        Ejecuta 'tarea' en el pool.
+
+        Args:
+            tarea: Función sin argumentos; puede usar self.session
+            al_terminar: Recibe el resultado, en el hilo de la UI
+            al_fallar: Recibe la excepción, en el hilo de la UI
+        """
+        def ejecutar():
+            try:
+                resultado = tarea()
+            except Exception as e:
+                if al_fallar:
+                    self._terminado.emit(al_fallar, e)
+                else:
+                    print(f"❌ Error en tarea en segundo plano: {e}")
+                return
+            if al_terminar:
+                self._terminado.emit(al_terminar, resultado)
+
+        return self._pool.submit(ejecutar)
+
+    @Slot(object, object)
+    def _entregar(self, callback: Callable[[Any], None], valor: Any) -> None:
+        callback(valor)
+
+    def cerrar(self) -> None:
+        """No acepta más tareas; las pendientes terminan de enviarse sin demorar el cierre de la ventana"""
+        self._pool.shutdown(wait=False)
 
 
 class WebSocketWorker(QObject):
     """Trabajador para manejar conexiones WebSocket"""
     pedido_recibido = Signal(dict)
     connection_error = Signal(str)
+    # Cada vez que la conexión queda abierta, en orden con los mensajes
+    conectado = Signal()
 
-    def __init__(self, ws_url: str):
+    def __init__(self, ws_url: str, ultimo_seq: Optional[int] = None, sector: Optional[str] = None):
+        """
+        Args:
+            ws_url: URL del WebSocket
+            ultimo_seq: Último evento aplicado; al (re)conectar se piden los posteriores
+            sector: Sector cuyos eventos se reciben; None para recibir todos
+        """
         super().__init__()
         self.ws_url = ws_url
+        self.ultimo_seq = ultimo_seq
+        self.sector = sector
         self.ws = None
         self._should_run = True
+        self._ultimo_mensaje = time.monotonic()
+
+    def _build_url(self) -> str:
+        """URL de conexión, reanudando desde el último evento aplicado"""
+        params = {}
+        if self.ultimo_seq is not None:
+            params["since"] = self.ultimo_seq
+        if self.sector:
+            params["sector"] = self.sector
+        if msgpack is not None:
+            params["formato"] = "msgpack"
+        params["latido"] = 1
+        return f"{self.ws_url}?{urlencode(params)}"
 
     @Slot()
     def run_forever(self):
         """Ejecuta el WebSocket en un bucle con reconexión automática"""
         print("Iniciando hilo de WebSocket...")
+        threading.Thread(target=self._vigilar, daemon=True).start()
         while self._should_run:
             try:
                 self.ws = WebSocketApp(
-                    self.ws_url,
+                    self._build_url(),
+                    on_open=self._on_open,
                     on_message=self._on_message,
                     on_close=self._on_close,
                     on_error=self._on_error
@@ -39,15 +187,35 @@ class WebSocketWorker(QObject):
                 self.ws.run_forever()
             except Exception as e:
                 error_msg = f"WS desconectado: {e}"
-                print(f"⚠️ {error_msg}. Reintentando en 5 segundos...")
+                print(f"⚠️ {error_msg}")
                 self.connection_error.emit(error_msg)
-                if self._should_run:
-                    time.sleep(5)
+            if self._should_run:
+                print("Reintentando conexión WebSocket en 5 segundos...")
+                time.sleep(5)
+
+    def _vigilar(self):
+        """Cierra la conexión si el servidor dejó de enviar, para que run_forever reconecte"""
+        while self._should_run:
+            time.sleep(LATIDO_TIMEOUT / 4)
+            ws = self.ws
+            silencio = time.monotonic() - self._ultimo_mensaje
+            if ws and ws.sock and ws.sock.connected and silencio > LATIDO_TIMEOUT:
+                print(f"⚠️ Sin noticias del servidor hace {silencio:.0f} s, reconectando...")
+                ws.close()
+
+    def _on_open(self, ws):
+        self._ultimo_mensaje = time.monotonic()
+        self.conectado.emit()
 
     def _on_message(self, ws, message):
         """Maneja mensajes recibidos del WebSocket"""
+        self._ultimo_mensaje = time.monotonic()
         try:
-            data = json.loads(message)
+            # Frames binarios: formato compacto; texto: JSON
+            data = decodificar_mensaje(message) if isinstance(message, bytes) else json.loads(message)
+            if data.get("tipo") == "ping":
+                ws.send('{"tipo":"pong"}')
+                return
             self.pedido_recibido.emit(data)
         except Exception as e:
             print(f"❌ Error procesando mensaje WebSocket: {e}")
@@ -69,8 +237,333 @@ class WebSocketWorker(QObject):
             self.ws.close()
 
 
+# Roles con los que el delegate lee cada fila del modelo
+ROL_PIEZA = Qt.ItemDataRole.UserRole + 1
+ROL_GUARDA = Qt.ItemDataRole.UserRole + 2
+ROL_COLOR = Qt.ItemDataRole.UserRole + 3
+
+
+class FilaPedido(NamedTuple):
+    """Pedido tal como se muestra: pieza, guarda y color de la tarjeta"""
+    pieza: str
+    guarda: str
+    color: str
+
+
+# Operaciones que llevan una lista de filas a otra, en el orden en que se
+# aplican y con índices válidos en el momento de aplicarlas:
+#   ("quitar", inicio, fin)       filas inicio..fin inclusive
+#   ("mover", origen, destino)    la fila origen pasa antes de la que está en destino
+#   ("insertar", fila, FilaPedido)
+#   ("recolorear", inicio, fin)   misma pieza, otro color o guarda
+Operacion = Tuple
+
+
+def _estables(posiciones: List[int]) -> Set[int]:
+    """Subsecuencia creciente más larga de 'posiciones': las filas que no hace falta mover"""
+    colas: List[int] = []       # menor final de cada largo de subsecuencia
+    indices: List[int] = []     # índice en 'posiciones' de cada uno de esos finales
+    previo = [-1] * len(posiciones)
+    for i, posicion in enumerate(posiciones):
+        largo = bisect_left(colas, posicion)
+        if largo == len(colas):
+            colas.append(posicion)
+            indices.append(i)
+        else:
+            colas[largo] = posicion
+            indices[largo] = i
+        previo[i] = indices[largo - 1] if largo else -1
+    estables = set()
+    i = indices[-1] if indices else -1
+    while i >= 0:
+        estables.add(posiciones[i])
+        i = previo[i]
+    return estables
+
+
+def _tramos(filas: List[int]) -> List[Tuple[int, int]]:
+    """Agrupa índices ascendentes en tramos contiguos (inicio, fin)"""
+    tramos: List[Tuple[int, int]] = []
+    for fila in filas:
+        if tramos and tramos[-1][1] == fila - 1:
+            tramos[-1] = (tramos[-1][0], fila)
+        else:
+            tramos.append((fila, fila))
+    return tramos
+
+
+def reconciliar(anteriores: List[FilaPedido], nuevas: List[FilaPedido]) -> List[Operacion]:
+    """
+    Calcula las operaciones mínimas que llevan la vista de 'anteriores' a 'nuevas'.
+
+    Se quitan las piezas que ya no están (de atrás hacia adelante, por
+    tramos), quedan quietas las que conservan su orden relativo (la
+    subsecuencia creciente más larga) y el resto se mueve o se inserta
+    recorriendo la vista nueva desde el final, cada una antes de la que le
+    sigue. Por último se recolorean las que cambiaron de color o guarda.
+    Un evento típico (un pedido nuevo o que cambia de estado) produce una
+    sola operación.
+    """
+    visibles = {fila.pieza for fila in nuevas}
+    actual = [fila.pieza for fila in anteriores]
+    operaciones: List[Operacion] = []
+
+    quitadas = [i for i, pieza in enumerate(actual) if pieza not in visibles]
+    for inicio, fin in reversed(_tramos(quitadas)):
+        operaciones.append(("quitar", inicio, fin))
+    if quitadas:
+        actual = [pieza for pieza in actual if pieza in visibles]
+
+    posicion = {pieza: i for i, pieza in enumerate(actual)}
+    estables = {actual[i] for i in _estables([posicion[f.pieza] for f in nuevas if f.pieza in posicion])}
+
+    siguiente = None  # pieza ya ubicada que debe quedar justo después
+    for fila in reversed(nuevas):
+        pieza = fila.pieza
+        if pieza not in estables:
+            destino = len(actual) if siguiente is None else actual.index(siguiente)
+            if pieza not in posicion:
+                operaciones.append(("insertar", destino, fila))
+                actual.insert(destino, pieza)
+            else:
+                origen = actual.index(pieza)
+                if destino != origen + 1:
+                    operaciones.append(("mover", origen, destino))
+                    actual.insert(destino - 1 if origen < destino else destino, actual.pop(origen))
+        siguiente = pieza
+
+    previas = {fila.pieza: fila for fila in anteriores}
+    cambiadas = [i for i, fila in enumerate(nuevas) if fila.pieza in posicion and previas[fila.pieza] != fila]
+    for inicio, fin in _tramos(cambiadas):
+        operaciones.append(("recolorear", inicio, fin))
+    return operaciones
+
+
+class PedidosModel(QAbstractListModel):
+    """Pedidos visibles de un sector, en el orden en que se muestran"""
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._filas: List[FilaPedido] = []
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._filas)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        fila = self._filas[index.row()]
+        if role in (Qt.ItemDataRole.DisplayRole, ROL_PIEZA):
+            return fila.pieza
+        if role == ROL_GUARDA:
+            return fila.guarda
+        if role == ROL_COLOR:
+            return fila.color
+        return None
+
+    def piezas(self) -> List[str]:
+        """Piezas en el orden en que se muestran"""
+        return [fila.pieza for fila in self._filas]
+
+    def actualizar(self, filas: List[FilaPedido]) -> List[Operacion]:
+        """
+        Lleva el modelo a 'filas' con las operaciones mínimas: la vista solo
+        vuelve a dibujar las filas afectadas que están en pantalla.
+
+        Returns:
+            List[Operacion]: Operaciones aplicadas
+        """
+        if filas == self._filas:
+            return []
+        operaciones = reconciliar(self._filas, filas)
+        raiz = QModelIndex()
+        for operacion in operaciones:
+            tipo, primero, segundo = operacion
+            if tipo == "quitar":
+                self.beginRemoveRows(raiz, primero, segundo)
+                del self._filas[primero:segundo + 1]
+                self.endRemoveRows()
+            elif tipo == "mover":
+                self.beginMoveRows(raiz, primero, primero, raiz, segundo)
+                fila = self._filas.pop(primero)
+                self._filas.insert(segundo - 1 if primero < segundo else segundo, fila)
+                self.endMoveRows()
+            elif tipo == "insertar":
+                self.beginInsertRows(raiz, primero, primero)
+                self._filas.insert(primero, segundo)
+                self.endInsertRows()
+            else:
+                self._filas[primero:segundo + 1] = filas[primero:segundo + 1]
+                self.dataChanged.emit(self.index(primero), self.index(segundo))
+        return operaciones
+
+
+def _fuente(puntos: int, negrita: bool) -> QFont:
+    fuente = QFont()
+    fuente.setPointSize(max(1, puntos))
+    fuente.setBold(negrita)
+    return fuente
+
+
+class PedidoDelegate(QStyledItemDelegate):
+    """
+    Dibuja cada pedido como una tarjeta de color con la pieza (tipo, número
+    y final) y, si corresponde, la guarda recuadrada. No crea widgets: las
+    fuentes, medidas y colores se calculan una vez, y cada tarjeta se dibuja
+    en un pixmap que queda en QPixmapCache. Repintar una fila (al hacer
+    scroll, al reordenar o cuando un pedido vuelve a la vista) es copiar ese
+    pixmap; la caché de Qt tiene tamaño fijo y descarta las menos usadas.
+    """
+
+    def __init__(self, font_scale: float, show_guarda: bool, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.show_guarda = show_guarda
+        # Distingue las tarjetas de este delegate en la caché compartida de Qt
+        self._prefijo = f"pedido|{font_scale}|{int(show_guarda)}"
+        self._fondos: Dict[str, QColor] = {}
+        guarda_size = int(20 * font_scale)
+        self.alto = max(40, int(60 * font_scale))
+        self.radio = int(5 * font_scale)
+        self.margen = int(5 * font_scale)
+        self.separacion = int(guarda_size * 0.15)
+
+        # Sin guarda la pieza se muestra más grande y centrada
+        if show_guarda:
+            tamanios = (int(13 * font_scale), int(10 * font_scale), int(18 * font_scale))
+            self.espacio_pieza = int(2 * font_scale)
+        else:
+            tamanios = (int(15 * font_scale), int(12 * font_scale), int(22 * font_scale))
+            self.espacio_pieza = int(4 * font_scale)
+        # (fuente, métricas, ancho mínimo) del tipo, el número y el final de la pieza
+        partes = ((tamanios[0], True, int(25 * font_scale)),
+                  (tamanios[1], False, 0),
+                  (tamanios[2], True, int(45 * font_scale)))
+        self.partes = [(_fuente(puntos, negrita), minimo) for puntos, negrita, minimo in partes]
+        self.metricas = [QFontMetrics(fuente) for fuente, _ in self.partes]
+
+        self.fuente_guarda = _fuente(guarda_size, True)
+        self.ancho_guarda = int(60 * font_scale)
+        self.borde_guarda = QPen(QColor("#000000"), max(2, int(2 * font_scale)))
+        self.radio_guarda = int(3 * font_scale)
+        self.fondo_guarda = QColor(255, 255, 255, 26)
+        self.color_texto = QColor("#000000")
+
+    def sizeHint(self, option, index: QModelIndex) -> QSize:
+        return QSize(option.rect.width(), self.alto)
+
+    def paint(self, painter: QPainter, option, index: QModelIndex) -> None:
+        rect = option.rect
+        ratio = painter.device().devicePixelRatioF()
+        pieza, guarda, color = index.data(ROL_PIEZA), index.data(ROL_GUARDA), index.data(ROL_COLOR)
+        clave = f"{self._prefijo}|{rect.width()}x{rect.height()}@{ratio}|{color}|{guarda}|{pieza}"
+        tarjeta = QPixmapCache.find(clave)
+        if tarjeta is None:
+            tarjeta = self._dibujar_tarjeta(rect.size(), ratio, pieza, guarda, color)
+            QPixmapCache.insert(clave, tarjeta)
+        painter.drawPixmap(rect.topLeft(), tarjeta)
+
+    def _dibujar_tarjeta(self, tamanio: QSize, ratio: float, pieza: str, guarda: str, color: str) -> QPixmap:
+        tarjeta = QPixmap(tamanio * ratio)
+        tarjeta.setDevicePixelRatio(ratio)
+        tarjeta.fill(Qt.GlobalColor.transparent)
+        fondo = self._fondos.get(color)
+        if fondo is None:
+            fondo = self._fondos[color] = QColor(color)
+
+        painter = QPainter(tarjeta)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = QRect(0, 0, tamanio.width(), tamanio.height())
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(fondo)
+        painter.drawRoundedRect(rect, self.radio, self.radio)
+
+        contenido = rect.adjusted(self.margen, 0, -self.margen, 0)
+        if self.show_guarda:
+            contenido.setRight(self._pintar_guarda(painter, contenido, guarda) - self.separacion)
+        self._pintar_pieza(painter, contenido, pieza)
+        painter.end()
+        return tarjeta
+
+    def _pintar_pieza(self, painter: QPainter, rect: QRect, pieza: str) -> None:
+        textos = (pieza[:2], pieza[2:-5], pieza[-5:-2])
+        anchos = [max(minimo, metricas.horizontalAdvance(texto))
+                  for (_, minimo), metricas, texto in zip(self.partes, self.metricas, textos)]
+        x = rect.left()
+        if not self.show_guarda:
+            total = sum(anchos) + self.espacio_pieza * (len(anchos) - 1)
+            x += max(0, (rect.width() - total) // 2)
+        painter.setPen(self.color_texto)
+        for (fuente, _), texto, ancho in zip(self.partes, textos, anchos):
+            painter.setFont(fuente)
+            painter.drawText(QRect(x, rect.top(), ancho, rect.height()), Qt.AlignmentFlag.AlignCenter, texto)
+            x += ancho + self.espacio_pieza
+
+    def _pintar_guarda(self, painter: QPainter, rect: QRect, guarda: str) -> int:
+        """Dibuja la guarda al borde derecho y devuelve dónde empieza"""
+        borde = self.borde_guarda.width()
+        caja = QRect(rect.right() - self.ancho_guarda + 1, rect.top(), self.ancho_guarda, rect.height())
+        caja.adjust(borde // 2, borde // 2, -(borde // 2), -(borde // 2))
+        painter.setPen(self.borde_guarda)
+        painter.setBrush(self.fondo_guarda)
+        painter.drawRoundedRect(caja, self.radio_guarda, self.radio_guarda)
+        painter.setFont(self.fuente_guarda)
+        painter.drawText(caja, Qt.AlignmentFlag.AlignCenter, guarda)
+        return caja.left()
+
+
+class ListaPedidos(QListView):
+    """Lista virtualizada: solo se dibujan las filas visibles y todas miden lo mismo"""
+
+    # Pieza clicada y el evento del mouse (clic simple o doble clic)
+    pedido_clic = Signal(str, object)
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        # Las teclas (Escape) siguen llegando a la ventana
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+
+    def dataChanged(self, top_left: QModelIndex, bottom_right: QModelIndex, roles=()) -> None:
+        # QListView repinta todo el viewport ante cualquier cambio de datos; con
+        # filas de igual alto y sin editores alcanza con repintar el tramo cambiado
+        rect = self.visualRect(top_left).united(self.visualRect(bottom_right))
+        if rect.intersects(self.viewport().rect()):
+            self.viewport().update(rect)
+
+    def mousePressEvent(self, event) -> None:
+        self._emitir_clic(event)
+
+    def mouseDoubleClickEvent(self, event) -> None:
+        self._emitir_clic(event)
+
+    def _emitir_clic(self, event) -> None:
+        index = self.indexAt(event.pos())
+        if index.isValid():
+            self.pedido_clic.emit(index.data(ROL_PIEZA), event)
+
+
 class BaseApp(QMainWindow):
     """Aplicación base que proporciona funcionalidad común"""
+
+    # Estado real de un pedido informado por el servidor al rechazar un cambio
+    estado_servidor = Signal(dict)
+
+    # Sector al que se suscribe el WebSocket; el servidor solo envía los
+    # eventos de pedidos que entran o salen de su vista
+    SECTOR: Optional[str] = None
+
+    # Estados que muestra el sector, en el orden en que se agrupan, con el
+    # color de sus tarjetas
+    ESTADOS_VISIBLES: Dict[str, str] = {}
+
+    # Los eventos del WebSocket se acumulan y la lista se actualiza a lo sumo
+    # una vez por cuadro (~60 por segundo), aunque lleguen cientos seguidos
+    INTERVALO_REFRESCO_MS = 16
     
     def __init__(self, titulo: str, server_url: str, ws_url: str, show_guarda: bool = True):
         """
@@ -88,7 +581,24 @@ class BaseApp(QMainWindow):
         self.ws_url = ws_url
         self.show_guarda = show_guarda
         self.pedidos = {}
-        self.widgets = {}
+        self.ultimo_seq: Optional[int] = None
+        # Eventos que llegan mientras se resincroniza en segundo plano (None si no se está resincronizando)
+        self._eventos_en_espera: Optional[List[dict]] = None
+        # Última descarga en frío con su ETag, para revalidar al arrancar. Va
+        # en la carpeta de caché del usuario y no en la de trabajo, que depende
+        # de desde dónde se abra la aplicación
+        carpeta = (QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+                   or os.path.dirname(os.path.abspath(__file__)))
+        self._cache_http_path = os.path.join(carpeta, f"cache_{self.SECTOR or 'pedidos'}.json")
+        self._respuestas = self._leer_cache_http()
+        self.estado_servidor.connect(self._aplicar_estado_servidor)
+        self.api = ClienteAPI(parent=self)
+        # Piezas cambiadas que la lista todavía no muestra
+        self._pendientes = set()
+        self._temporizador_ui = QTimer(self)
+        self._temporizador_ui.setSingleShot(True)
+        self._temporizador_ui.setInterval(self.INTERVALO_REFRESCO_MS)
+        self._temporizador_ui.timeout.connect(self._refrescar_pendientes)
         
         self._setup_ui(titulo)
         self._load_existing_orders()
@@ -114,7 +624,7 @@ class BaseApp(QMainWindow):
         
         # Configuración del widget central
         self._setup_central_widget()
-        self._setup_scroll_area(font_scale)
+        self._setup_lista(font_scale)
         self._setup_window_properties(window_width, window_height, available_geometry)
 
     def _setup_central_widget(self) -> None:
@@ -125,33 +635,21 @@ class BaseApp(QMainWindow):
         self.main_layout.setSpacing(0)
         self.main_layout.setContentsMargins(0, 0, 0, 0)
 
-    def _setup_scroll_area(self, font_scale: float) -> None:
-        """Configura el área de desplazamiento"""
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        
-        # Estilos del scroll area
-        scroll_area.setStyleSheet(self._get_scroll_area_styles(font_scale))
-
-        # Contenedor para los widgets de pedidos
-        content_widget = QWidget()
-        self.layout = QVBoxLayout(content_widget)
-        
-        spacing = max(2, int(3 * font_scale))
-        margins = max(2, int(3 * font_scale))
-        
-        self.layout.setSpacing(spacing)
-        self.layout.setContentsMargins(margins, margins, margins, margins)
-
-        scroll_area.setWidget(content_widget)
-        self.main_layout.addWidget(scroll_area)
+    def _setup_lista(self, font_scale: float) -> None:
+        """Configura la lista de pedidos: un modelo y un delegate que los dibuja"""
+        self.modelo = PedidosModel(self)
+        self.lista = ListaPedidos()
+        self.lista.setModel(self.modelo)
+        self.lista.setItemDelegate(PedidoDelegate(font_scale, self.show_guarda, self.lista))
+        self.lista.setSpacing(max(1, int(3 * font_scale) // 2))
+        self.lista.setStyleSheet(self._get_scroll_area_styles(font_scale))
+        self.lista.pedido_clic.connect(self.marcar)
+        self.main_layout.addWidget(self.lista)
 
     def _get_scroll_area_styles(self, font_scale: float) -> str:
-        """Obtiene los estilos para el área de desplazamiento"""
+        """Obtiene los estilos para la lista y su barra de desplazamiento"""
         return f"""
-            QScrollArea {{
+            QListView {{
                 border: none;
                 background-color: transparent;
             }}
@@ -194,135 +692,291 @@ class BaseApp(QMainWindow):
     def _setup_websocket(self) -> None:
         """Configura la conexión WebSocket"""
         self.ws_thread = QThread()
-        self.ws_worker = WebSocketWorker(self.ws_url)
+        self.ws_worker = WebSocketWorker(self.ws_url, self.ultimo_seq, self.SECTOR)
         self.ws_worker.moveToThread(self.ws_thread)
 
         # Conexiones de señales
-        self.ws_worker.pedido_recibido.connect(self.handle_nuevo_pedido)
+        self.ws_worker.pedido_recibido.connect(self._procesar_evento)
+        self.ws_worker.conectado.connect(self._al_conectar)
         self.ws_worker.connection_error.connect(self._handle_connection_error)
         self.ws_thread.started.connect(self.ws_worker.run_forever)
         
         self.ws_thread.start()
 
+    @Slot()
+    def _al_conectar(self) -> None:
+        """Si la carga inicial falló (servidor caído al arrancar), la hace ahora"""
+        if self.ultimo_seq is None and self._eventos_en_espera is None:
+            print("🔄 Conectado sin pedidos cargados, descargando...")
+            # Sin seq propio, _resincronizar hace la descarga completa
+            self._resincronizar(0)
+
+    @Slot(dict)
+    def _procesar_evento(self, data: dict) -> None:
+        """Aplica un evento del WebSocket en orden de secuencia"""
+        if self._eventos_en_espera is not None:
+            # Se aplican cuando termine la resincronización, sobre lo descargado
+            self._eventos_en_espera.append(data)
+            return
+
+        if data.get("tipo") == "resync":
+            print("🔄 El servidor no pudo reponer los eventos perdidos, sincronizando pedidos...")
+            self._resincronizar(data.get("seq", 0))
+            return
+
+        if data.get("tipo") == "lote":
+            for evento in data.get("eventos", []):
+                self._procesar_evento(evento)
+            return
+
+        seq = data.get("seq")
+        if seq is not None and self.ultimo_seq is not None and seq <= self.ultimo_seq:
+            return  # Ya aplicado (llegó en la carga inicial o en una reposición)
+
+        self.handle_nuevo_pedido(data)
+        if seq is not None:
+            self._registrar_seq(seq)
+
+    def _registrar_seq(self, seq: int) -> None:
+        """Guarda el último evento aplicado para reanudar desde ahí al reconectar"""
+        self.ultimo_seq = seq
+        if hasattr(self, 'ws_worker'):
+            self.ws_worker.ultimo_seq = seq
+
+    def _descargar_pedidos(self, estados: Optional[List[str]] = None, since: Optional[int] = None) -> list:
+        """
+        Descarga pedidos con GET /pedidos/changes, recorriendo todas las páginas.
+
+        Args:
+            estados: Estados a traer en el arranque en frío
+            since: Último seq aplicado; si se indica, trae solo lo modificado después
+
+        Returns:
+            list: Pedidos recibidos, en orden
+        """
+        pedidos, seq_inicial, respuestas = self._bajar_pedidos(estados, since)
+        if since is None:
+            self._guardar_cache_http(respuestas)
+        self._registrar_seq(seq_inicial)
+        return pedidos
+
+    def _bajar_pedidos(self, estados: Optional[List[str]], since: Optional[int]) -> Tuple[list, int, dict]:
+        """
+        Recorre las páginas de GET /pedidos/changes sin tocar el estado de la
+        ventana, así que puede correr en el pool de self.api.
+
+        Returns:
+            tuple: (pedidos en orden, seq al empezar, páginas con ETag para la caché)
+        """
+        url = f"{self.server_url}pedidos/changes"
+        params = {}
+        if since is not None:
+            params["since"] = since
+        elif estados:
+            params["estado"] = ",".join(estados)
+
+        headers = {"Accept": f"{TIPO_MSGPACK}, application/json"} if msgpack is not None else {}
+
+        pedidos = []
+        seq_inicial = None
+        respuestas = {}
+        while True:
+            clave = f"{url}?{urlencode(sorted(params.items()))}"
+            guardada = self._respuestas.get(clave) if since is None else None
+            headers_pagina = dict(headers, **{"If-None-Match": guardada["etag"]}) if guardada else headers
+            response = self.api.session.get(url, params=params, headers=headers_pagina, timeout=10)
+            if response.status_code == 304 and guardada:
+                # Sin cambios: la página guardada sigue vigente al seq actual
+                pagina = dict(guardada["pagina"], seq=int(response.headers.get("X-Seq", guardada["pagina"]["seq"])))
+            else:
+                response.raise_for_status()
+                if response.headers.get("Content-Type", "").startswith(TIPO_MSGPACK):
+                    pagina = decodificar_cambios(response.content)
+                else:
+                    pagina = response.json()
+            if response.headers.get("ETag"):
+                respuestas[clave] = {"etag": response.headers["ETag"], "pagina": pagina}
+            pedidos.extend(pagina["pedidos"])
+            if seq_inicial is None:
+                # Lo que cambie mientras se recorren las páginas llega por el WebSocket
+                seq_inicial = pagina["seq"]
+            if not pagina["mas"]:
+                break
+            params["cursor"] = pagina["cursor"]
+
+        return pedidos, seq_inicial, respuestas
+
+    def _leer_cache_http(self) -> dict:
+        """Carga las páginas guardadas en la última descarga en frío"""
+        if not os.path.exists(self._cache_http_path):
+            return {}
+        try:
+            with open(self._cache_http_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No se pudo leer la caché de pedidos: {e}")
+            return {}
+
+    def _guardar_cache_http(self, respuestas: dict) -> None:
+        """Reemplaza las páginas guardadas por las de esta descarga"""
+        self._respuestas = respuestas
+        try:
+            os.makedirs(os.path.dirname(self._cache_http_path), exist_ok=True)
+            with open(self._cache_http_path, "w", encoding="utf-8") as f:
+                json.dump(respuestas, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la caché de pedidos: {e}")
+
+    def _process_existing_orders(self, pedidos_data: list) -> None:
+        """Procesa la lista de pedidos existentes"""
+        for pedido in pedidos_data:
+            try:
+                pieza = pedido.get("pieza")
+                guarda = pedido.get("guarda")
+                estado = pedido.get("estado")
+                
+                if pieza and guarda and estado:
+                    self.pedidos[pieza] = {
+                        "estado": estado,
+                        "datos": {"pieza": pieza, "guarda": guarda}
+                    }
+                else:
+                    print(f"⚠️ Pedido con datos incompletos: {pedido}")
+                    
+            except Exception as e:
+                print(f"❌ Error procesando pedido {pedido}: {e}")
+
+    def _resincronizar(self, seq_servidor: int) -> None:
+        """
+        Trae en segundo plano los cambios que no se pudieron reponer por el
+        WebSocket. Los eventos que llegan mientras tanto quedan en espera y se
+        aplican al terminar, en el mismo orden que si la descarga fuera bloqueante.
+        """
+        # Si la base del servidor se reinició, recarga completa
+        completa = self.ultimo_seq is None or seq_servidor < self.ultimo_seq
+        if completa:
+            estados, since = list(self.ESTADOS_VISIBLES), None
+        else:
+            estados, since = None, self.ultimo_seq
+        self._eventos_en_espera = []
+
+        def al_terminar(resultado: Tuple[list, int, dict]) -> None:
+            pedidos, seq_inicial, respuestas = resultado
+            if completa:
+                self._guardar_cache_http(respuestas)
+                self.pedidos.clear()
+            self._process_existing_orders(pedidos)
+            self._registrar_seq(seq_inicial)
+            if completa:
+                print(f"✅ Cargados {len(pedidos)} pedidos existentes")
+            else:
+                print(f"🔄 Sincronizados {len(pedidos)} pedidos modificados")
+            self._fin_resincronizacion()
+
+        def al_fallar(e: Exception) -> None:
+            print(f"❌ Error al sincronizar pedidos: {e}")
+            self._fin_resincronizacion()
+
+        self.api.en_segundo_plano(lambda: self._bajar_pedidos(estados, since), al_terminar, al_fallar)
+
+    def _fin_resincronizacion(self) -> None:
+        """Muestra lo descargado y aplica los eventos que quedaron en espera"""
+        eventos, self._eventos_en_espera = self._eventos_en_espera, None
+        self._update_ui()
+        for evento in eventos:
+            self._procesar_evento(evento)
+
     def _handle_connection_error(self, error_msg: str) -> None:
         """Maneja errores de conexión del WebSocket"""
         print(f"Error de conexión: {error_msg}")
         # Aquí podrías implementar lógica adicional para manejar errores
 
-    def crear_widget_pedido(self, pieza_str: str, guarda_str: str, color: str):
-        """Crea un widget para mostrar un pedido"""
-        # Cálculos de tamaños basados en el factor de escala
-        widget_height = int(60 * self.font_scale)
-        tipo_size = int(13 * self.font_scale)
-        medio_size = int(10 * self.font_scale)
-        final_size = int(18 * self.font_scale)
-        guarda_size = int(20 * self.font_scale)
-        border_radius = int(5 * self.font_scale)
-        margins = int(5 * self.font_scale)
-        spacing = int(guarda_size * 0.15)
-
-        widget = QFrame()
-        widget.setFixedHeight(max(40, widget_height))
-        widget.setStyleSheet(f"""
-            QFrame {{
-                background-color: {color};
-                border-radius: {border_radius}px;
-                padding: 0px;
-                margin: 0px;
-            }}
-        """)
-        
-        widget_layout = QHBoxLayout(widget)
-        widget_layout.setContentsMargins(margins, 0, margins, 0)
-        widget_layout.setSpacing(spacing)
+    def _send_status_update(self, pieza: str, nuevo_estado: str, esperado: Optional[str] = None) -> None:
+        """
+        Envía en segundo plano una actualización de estado al servidor.
 
-        # Panel de código de pieza
-        pieza_panel = self._create_pieza_panel(pieza_str, tipo_size, medio_size, final_size)
-        widget_layout.addWidget(pieza_panel)
+        Args:
+            pieza: Número de pieza
+            nuevo_estado: Estado al que pasa el pedido
+            esperado: Estado que el cliente veía; el servidor rechaza el cambio (409) si ya no es ese
+        """
+        url = f"{self.server_url}pedido/{pieza}"
+        self.api.en_segundo_plano(
+            lambda: self.api.session.put(url, json={"estado": nuevo_estado, "esperado": esperado},
+                                         headers=self._headers_sector(), timeout=5),
+            al_terminar=lambda response: self._revisar_cambio_estado(pieza, nuevo_estado, esperado, response),
+            al_fallar=lambda e: self._error_envio(f"No se pudo actualizar el estado: {e}")
+        )
 
-        # Panel de número de guarda (si corresponde)
-        if self.show_guarda:
-            guarda_panel = self._create_guarda_panel(guarda_str, guarda_size, spacing)
-            widget_layout.addWidget(guarda_panel)
-            widget_layout.setSpacing(spacing)
-        else:
-            widget_layout.setSpacing(0)
+    def _send_status_updates(self, cambios: List[dict]) -> None:
+        """Envía en segundo plano varios cambios de estado ({"pieza", "estado", "esperado"}) en una sola petición"""
+        url = f"{self.server_url}pedidos/estado/batch"
+        self.api.en_segundo_plano(
+            lambda: self.api.session.put(url, json={"cambios": cambios},
+                                         headers=self._headers_sector(), timeout=10),
+            al_terminar=lambda response: self._revisar_cambios_estado(cambios, response),
+            al_fallar=lambda e: self._error_envio(f"No se pudieron actualizar los estados: {e}")
+        )
 
-        widget.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Fixed)
-        return widget, widget_layout
+    def _revisar_cambio_estado(self, pieza: str, nuevo_estado: str, esperado: Optional[str],
+                               response: requests.Response) -> None:
+        if response.status_code == 409:
+            self._notificar_conflicto(response.json())
+        elif response.status_code == 404:
+            self._quitar_pedido(pieza)
+        elif response.status_code == 400:
+            print(f"⚠️ El servidor rechazó el cambio de {pieza}: {response.json().get('error')}")
+            self._revertir_cambio(pieza, nuevo_estado, esperado)
 
-    def _create_pieza_panel(self, pieza_str: str, tipo_size: int, medio_size: int, final_size: int) -> QWidget:
-        """Crea el panel del código de pieza"""
-        pieza_panel = QWidget()
-        pieza_layout = QHBoxLayout(pieza_panel)
-        pieza_layout.setContentsMargins(0, 0, 0, 0)
-        
-        if not self.show_guarda:
-            tipo_size = int(15 * self.font_scale)
-            medio_size = int(12 * self.font_scale)
-            final_size = int(22 * self.font_scale)
-            pieza_layout.setSpacing(int(4 * self.font_scale))
-        else:
-            pieza_layout.setSpacing(int(2 * self.font_scale))
+    def _revisar_cambios_estado(self, cambios: List[dict], response: requests.Response) -> None:
+        if response.status_code == 400:
+            # El lote se rechaza entero: no se aplicó ningún cambio
+            print(f"⚠️ El servidor rechazó el lote de cambios: {response.json().get('error')}")
+            for cambio in cambios:
+                self._revertir_cambio(cambio["pieza"], cambio["estado"], cambio["esperado"])
+        elif response.status_code == 200:
+            resultado = response.json()
+            for conflicto in resultado.get("conflictos", []):
+                self._notificar_conflicto(conflicto)
+            for pieza in resultado.get("no_encontradas", []):
+                self._quitar_pedido(pieza)
 
-        # Componentes del código de pieza
-        tipo = QLabel(f'<span style="font-size:{tipo_size}pt; font-weight:bold;">{pieza_str[:2]}</span>')
-        tipo.setMinimumWidth(int(25 * self.font_scale))
-        tipo.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        medio = QLabel(f'<span style="font-size:{medio_size}pt;">{pieza_str[2:-5]}</span>')
-        medio.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        final = QLabel(f'<span style="font-size:{final_size}pt; font-weight:bold;">{pieza_str[-5:-2]}</span>')
-        final.setMinimumWidth(int(45 * self.font_scale))
-        final.setAlignment(Qt.AlignmentFlag.AlignCenter)
+    def _revertir_cambio(self, pieza: str, nuevo_estado: str, esperado: Optional[str]) -> None:
+        """Vuelve atrás un cambio optimista que el servidor no aplicó"""
+        info = self.pedidos.get(pieza)
+        # Si ya llegó otro estado por el WebSocket, ese es el vigente
+        if info is None or esperado is None or info["estado"] != nuevo_estado:
+            return
+        self.estado_servidor.emit({"pieza": pieza, "guarda": info["datos"]["guarda"], "estado": esperado})
 
-        if not self.show_guarda:
-            pieza_layout.addStretch(1)
-        
-        pieza_layout.addWidget(tipo)
-        pieza_layout.addWidget(medio)
-        pieza_layout.addWidget(final)
-        pieza_layout.addStretch(1)
-
-        return pieza_panel
-
-    def _create_guarda_panel(self, guarda_str: str, guarda_size: int, spacing: int) -> QWidget:
-        """Crea el panel del número de guarda"""
-        guarda_container = QWidget()
-        guarda_layout = QHBoxLayout(guarda_container)
-        guarda_layout.setContentsMargins(0, 0, 0, 0)
-        guarda_layout.setSpacing(0)
-        
-        guarda_label = QLabel(f'<span style="font-size:{guarda_size}pt; font-weight:bold;">{guarda_str}</span>')
-        label_width = int(60 * self.font_scale)
-        guarda_label.setFixedWidth(label_width)
-        guarda_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        border_width = max(2, int(2 * self.font_scale))
-        padding = int(4 * self.font_scale)
-        
-        guarda_label.setStyleSheet(f"""
-            QLabel {{
-                border: {border_width}px solid #000000;
-                border-radius: {int(3 * self.font_scale)}px;
-                background-color: rgba(255, 255, 255, 0.1);
-                padding-left: {padding}px;
-                padding-right: {padding}px;
-            }}
-        """)
-        
-        guarda_layout.addWidget(guarda_label)
-        return guarda_container
+    def _quitar_pedido(self, pieza: str) -> None:
+        """El servidor ya no tiene la pieza (por ejemplo, archivada): deja de mostrarla"""
+        print(f"⚠️ {pieza} ya no está en el servidor, se quita de la lista")
+        if self.pedidos.pop(pieza, None) is not None:
+            self.programar_actualizacion(pieza)
 
-    def _send_status_update(self, pieza: str, nuevo_estado: str) -> None:
-        """Envía actualización de estado al servidor"""
-        try:
-            url = f"{self.server_url}pedido/{pieza}"
-            requests.put(url, json={"estado": nuevo_estado}, timeout=5)
-        except Exception as e:
-            print(f"❌ Error al actualizar estado en servidor: {e}")
-            self._show_connection_error(f"No se pudo actualizar el estado: {e}")
+    def _error_envio(self, mensaje: str) -> None:
+        print(f"❌ {mensaje}")
+        self._show_connection_error(mensaje)
+
+    def _headers_sector(self) -> dict:
+        """Identifica el puesto en los cambios de estado (historial de transiciones)"""
+        return {"X-Sector": self.SECTOR} if self.SECTOR else {}
+
+    def _notificar_conflicto(self, conflicto: dict) -> None:
+        """Aplica el estado real de un pedido que otro puesto ya cambió"""
+        print(f"⚠️ {conflicto['pieza']} ya estaba en '{conflicto['estado_actual']}', cambio descartado")
+        self.estado_servidor.emit({
+            "pieza": conflicto["pieza"],
+            "guarda": conflicto["guarda"],
+            "estado": conflicto["estado_actual"]
+        })
+
+    @Slot(dict)
+    def _aplicar_estado_servidor(self, data: dict) -> None:
+        """Corrige el estado local de un pedido con el que informó el servidor"""
+        # Sin seq: no adelanta el punto de reanudación del WebSocket
+        self.handle_nuevo_pedido(data)
 
     def _show_connection_error(self, message: str) -> None:
         """Muestra un error de conexión al usuario"""
@@ -339,8 +993,45 @@ class BaseApp(QMainWindow):
         """Actualiza la interfaz de usuario - alias para mantener compatibilidad"""
         self.actualizar_ui_inteligentemente()
 
+    def programar_actualizacion(self, pieza: str) -> None:
+        """
+        Anota un pedido cambiado y programa la actualización de la lista.
+
+        El primer cambio arranca el temporizador y los que llegan antes de que
+        venza se suman a la misma actualización.
+        """
+        self._pendientes.add(pieza)
+        if not self._temporizador_ui.isActive():
+            self._temporizador_ui.start()
+
+    @Slot()
+    def _refrescar_pendientes(self) -> None:
+        if self._pendientes:
+            self.actualizar_ui_inteligentemente()
+
+    def actualizar_ui_inteligentemente(self) -> None:
+        """Muestra los pedidos visibles; el modelo aplica solo lo que cambió"""
+        # Incluye los cambios pendientes: no hace falta esperar al temporizador
+        self._temporizador_ui.stop()
+        self._pendientes.clear()
+        self.modelo.actualizar(self.filas_visibles())
+
+    def filas_visibles(self) -> List[FilaPedido]:
+        """Pedidos en ESTADOS_VISIBLES, agrupados en ese orden y, dentro de cada estado, por llegada"""
+        grupos = {estado: [] for estado in self.ESTADOS_VISIBLES}
+        for pieza, info in self.pedidos.items():
+            grupo = grupos.get(info["estado"])
+            if grupo is not None:
+                grupo.append(FilaPedido(pieza, info["datos"]["guarda"], self.color_pedido(pieza, info["estado"])))
+        return [fila for grupo in grupos.values() for fila in grupo]
+
+    def color_pedido(self, pieza: str, estado: str) -> str:
+        """Color de la tarjeta de un pedido visible"""
+        return self.ESTADOS_VISIBLES[estado]
+
     def closeEvent(self, event):
         """Maneja el cierre de la aplicación"""
+        self.api.cerrar()
         if hasattr(self, 'ws_worker'):
             self.ws_worker.stop()
         if hasattr(self, 'ws_thread'):
@@ -353,10 +1044,6 @@ class BaseApp(QMainWindow):
         """Maneja un nuevo pedido recibido vía WebSocket"""
         raise NotImplementedError("Las clases hijas deben implementar handle_nuevo_pedido")
 
-    def actualizar_ui_inteligentemente(self) -> None:
-        """Actualiza la interfaz de usuario de forma inteligente"""
-        raise NotImplementedError("Las clases hijas deben implementar actualizar_ui_inteligentemente")
-
     def marcar(self, pieza: str, event) -> None:
         """Maneja el marcado de pedidos"""
         raise NotImplementedError("Las clases hijas deben implementar marcar")
@@ -9,16 +9,21 @@ class ServerConfig:
     """Configuración del servidor"""
     ip: str
     port: int
-    
+    sucursal: Optional[str] = None  # None: sucursal principal del servidor
+
+    @property
+    def _prefijo(self) -> str:
+        return f"s/{self.sucursal}/" if self.sucursal else ""
+
     @property
     def server_url(self) -> str:
         """URL del servidor HTTP"""
-        return f"http://{self.ip}:{self.port}/"
+        return f"http://{self.ip}:{self.port}/{self._prefijo}"
     
     @property
     def websocket_url(self) -> str:
         """URL del WebSocket"""
-        return f"ws://{self.ip}:{self.port}/ws"
+        return f"ws://{self.ip}:{self.port}/{self._prefijo}ws"
 
 
 class ConfigurationManager:
@@ -42,7 +47,8 @@ class ConfigurationManager:
                     data = json.load(f)
                     self._config = ServerConfig(
                         ip=data.get('ip', 'localhost'),
-                        port=data.get('puerto', 8000)
+                        port=data.get('puerto', 8000),
+                        sucursal=data.get('sucursal')
                     )
             except (json.JSONDecodeError, KeyError, TypeError) as e:
                 print(f"Error al leer el archivo de configuración: {e}")
@@ -57,6 +63,8 @@ class ConfigurationManager:
                 'ip': server_config.ip,
                 'puerto': server_config.port
             }
+            if server_config.sucursal:
+                config_data['sucursal'] = server_config.sucursal
             
             with open(self._config_file, 'w', encoding='utf-8') as f:
                 json.dump(config_data, f, indent=4, ensure_ascii=False)
@@ -86,7 +94,9 @@ class ConfigurationManager:
 
     def update_configuration(self, ip: str, port: int) -> bool:
         """Actualiza la configuración con nuevos valores"""
-        server_config = ServerConfig(ip=ip, port=port)
+        # La sucursal no se edita en el diálogo: se conserva la del archivo
+        sucursal = self._config.sucursal if self._config else None
+        server_config = ServerConfig(ip=ip, port=port, sucursal=sucursal)
         return self.save_configuration(server_config)
 
     def reset_configuration(self) -> None:
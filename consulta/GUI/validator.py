@@ -13,6 +13,9 @@ class PiezaValidator:
         'RE', 'RP', 'RR', 'SD', 'SL', 'SP', 'SR', 'TC', 'TD', 'TL', 'UP', 
         'CX', 'XP', 'XX', 'XR'
     }
+
+    # Patrón: 2 letras mayúsculas + 9 dígitos + AR
+    PATRON = re.compile(r'^([A-Z]{2})(\d{9})(AR)$')
     
     @classmethod
     def validar_formato_completo(cls, pieza: str) -> bool:
@@ -28,9 +31,7 @@ class PiezaValidator:
         if not pieza or len(pieza) != 13:
             return False
             
-        # Patrón: 2 letras mayúsculas + 9 dígitos + AR
-        patron = re.compile(r'^([A-Z]{2})(\d{9})(AR)$')
-        match = patron.match(pieza.upper())
+        match = cls.PATRON.match(pieza.upper())
         
         if not match:
             return False
@@ -49,8 +50,7 @@ class PiezaValidator:
         Returns:
             Optional[Tuple[str, str, str]]: (código_inicial, número, terminación) o None
         """
-        patron = re.compile(r'^([A-Z]{2})(\d{9})(AR)$')
-        match = patron.match(pieza.upper())
+        match = cls.PATRON.match(pieza.upper())
         
         if match:
             return match.group(1), match.group(2), match.group(3)
@@ -108,7 +108,7 @@ class ServerCommunicator:
         """Envía los datos al servidor y retorna si fue exitoso"""
         try:
             payload = {"pieza": datos.pieza, "guarda": datos.guarda}
-            response = requests.post(self.server_url, json=payload)
+            response = requests.post(self.server_url, json=payload, headers={"X-Sector": "consulta"})
             response.raise_for_status()
             return True
         except Exception as e:
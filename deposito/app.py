@@ -1,7 +1,6 @@
 import sys
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import pyqtSlot
-import threading
+from PyQt5.QtCore import pyqtSlot, Qt
 import requests
 from common import BaseApp
 
@@ -9,7 +8,18 @@ from common import BaseApp
 class DepositoApp(BaseApp):
     """Aplicación para el sector de depósito"""
     
+    SECTOR = "deposito"
+    # Primero "No Entregado", luego "Pedido al Deposito"; cada uno por orden de llegada
+    ESTADOS_VISIBLES = {
+        "No Entregado": "#e74c3c",        # Rojo
+        "Pedido al Deposito": "#f1c40f",  # Amarillo
+    }
+    COLOR_SELECCION = "#3498db"  # Azul
+
     def __init__(self, server_url: str, ws_url: str):
+        # Selección múltiple: Ctrl+clic alterna, Shift+clic extiende desde el ancla
+        self.seleccion = set()
+        self._ancla = None
         super().__init__("Depósito", server_url, ws_url, show_guarda=True)
 
     @pyqtSlot(dict)
@@ -31,85 +41,22 @@ class DepositoApp(BaseApp):
                 "estado": estado, 
                 "datos": {"pieza": pieza, "guarda": guarda}
             }
-            self.actualizar_ui_inteligentemente()
+            self.programar_actualizacion(pieza)
 
     def actualizar_ui_inteligentemente(self) -> None:
         """Actualiza la interfaz de usuario de forma eficiente"""
-        # Limpiar layout existente
-        self._clear_layout()
-
-        # Filtrar pedidos visibles para depósito
-        estados_visibles = ["Pedido al Deposito", "No Entregado"]
-        pedidos_visibles = {
-            pieza: info 
-            for pieza, info in self.pedidos.items() 
-            if info["estado"] in estados_visibles
-        }
-
-        # Limpiar widgets obsoletos
-        self._cleanup_obsolete_widgets(pedidos_visibles)
-
-        # Crear y agregar widgets actualizados
-        self._create_and_add_widgets(pedidos_visibles)
-
-        # Agregar stretch al final
-        self.layout.addStretch()
-
-    def _clear_layout(self) -> None:
-        """Limpia el layout eliminando todos los elementos"""
-        while self.layout.count() > 0:
-            item = self.layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.spacerItem():
-                self.layout.removeItem(item)
-
-    def _cleanup_obsolete_widgets(self, pedidos_visibles: dict) -> None:
-        """Elimina widgets que ya no son necesarios"""
-        widgets_obsoletos = set(self.widgets.keys()) - set(pedidos_visibles.keys())
-        for pieza in widgets_obsoletos:
-            if pieza in self.widgets:
-                del self.widgets[pieza]
-
-    def _create_and_add_widgets(self, pedidos_visibles: dict) -> None:
-        """Crea y agrega widgets para pedidos visibles, priorizando 'No Entregado' y respetando el orden de llegada"""
-    
-        # Orden por prioridad de estado: primero "No Entregado", luego "Pedido al Deposito"
-        orden_estados = ["No Entregado", "Pedido al Deposito"]
-
-        for estado in orden_estados:
-            for pieza, info in pedidos_visibles.items():
-                if info["estado"] == estado:
-                    datos = info["datos"]
-                    color = self._get_color_for_status(estado)
-
-                    widget, widget_layout = self.crear_widget_pedido(
-                        datos["pieza"],
-                        datos["guarda"],
-                        color
-                    )
-
-                    self._configure_widget_events(widget, widget_layout, pieza)
-                    self.widgets[pieza] = widget
-                    self.layout.addWidget(widget)
-
-    def _get_color_for_status(self, estado: str) -> str:
-        """Obtiene el color correspondiente al estado"""
-        color_mapping = {
-            "Pedido al Deposito": "#f1c40f",  # Amarillo
-            "No Entregado": "#e74c3c"        # Rojo
+        # Los pedidos que dejaron de verse salen de la selección
+        self.seleccion = {
+            pieza for pieza in self.seleccion
+            if self.pedidos.get(pieza, {}).get("estado") in self.ESTADOS_VISIBLES
         }
-        return color_mapping.get(estado, "#95a5a6")  # Gris por defecto
+        super().actualizar_ui_inteligentemente()
 
-    def _configure_widget_events(self, widget, widget_layout, pieza: str) -> None:
-        """Configura los eventos de clic para el widget"""
-        # Evento principal del widget
-        widget.mousePressEvent = lambda event, p=pieza: self.marcar(p, event)
-        
-        # Eventos para elementos hijos
-        for child in widget_layout.children():
-            if hasattr(child, 'mousePressEvent'):
-                child.mousePressEvent = lambda event, p=pieza: self.marcar(p, event)
+    def color_pedido(self, pieza: str, estado: str) -> str:
+        """Los seleccionados se pintan de azul"""
+        if pieza in self.seleccion:
+            return self.COLOR_SELECCION
+        return super().color_pedido(pieza, estado)
 
     def marcar(self, pieza: str, event) -> None:
         """Maneja el marcado de pedidos según su estado actual"""
@@ -117,6 +64,20 @@ class DepositoApp(BaseApp):
             print(f"⚠️ Pedido {pieza} no encontrado")
             return
 
+        modificadores = event.modifiers()
+        if modificadores & Qt.KeyboardModifier.ControlModifier:
+            self._alternar_seleccion(pieza)
+            return
+        if modificadores & Qt.KeyboardModifier.ShiftModifier:
+            self._extender_seleccion(pieza)
+            return
+
+        # Clic sobre un pedido seleccionado: se marcan todos los seleccionados
+        if pieza in self.seleccion:
+            self._update_orders_status(list(self.seleccion))
+            return
+
+        self._limpiar_seleccion()
         estado_actual = self.pedidos[pieza]["estado"]
         nuevo_estado = self._get_next_status(estado_actual)
         
@@ -138,6 +99,7 @@ class DepositoApp(BaseApp):
     def _update_order_status(self, pieza: str, nuevo_estado: str) -> None:
         """Actualiza el estado del pedido local y remotamente"""
         # Actualizar estado local
+        esperado = self.pedidos[pieza]["estado"]
         self.pedidos[pieza]["estado"] = nuevo_estado
         print(f"📦 {pieza} → {nuevo_estado}")
         
@@ -145,48 +107,69 @@ class DepositoApp(BaseApp):
         self.actualizar_ui_inteligentemente()
         
         # Enviar actualización al servidor en segundo plano
-        threading.Thread(
-            target=self._send_status_update, 
-            args=(pieza, nuevo_estado), 
-            daemon=True
-        ).start()
+        self._send_status_update(pieza, nuevo_estado, esperado)
+
+    def _alternar_seleccion(self, pieza: str) -> None:
+        """Agrega o quita un pedido de la selección"""
+        self.seleccion ^= {pieza}
+        self._ancla = pieza
+        self.actualizar_ui_inteligentemente()
+
+    def _extender_seleccion(self, pieza: str) -> None:
+        """Selecciona el tramo de pedidos visibles entre el ancla y la pieza"""
+        orden_visible = self.modelo.piezas()
+        if self._ancla not in orden_visible:
+            self._ancla = pieza
+        desde = orden_visible.index(self._ancla)
+        hasta = orden_visible.index(pieza)
+        if desde > hasta:
+            desde, hasta = hasta, desde
+        self.seleccion |= set(orden_visible[desde:hasta + 1])
+        self.actualizar_ui_inteligentemente()
+
+    def _limpiar_seleccion(self) -> None:
+        """Descarta la selección actual"""
+        if self.seleccion:
+            self.seleccion.clear()
+            self.actualizar_ui_inteligentemente()
+        self._ancla = None
+
+    def keyPressEvent(self, event) -> None:
+        """Escape descarta la selección"""
+        if event.key() == Qt.Key.Key_Escape:
+            self._limpiar_seleccion()
+        else:
+            super().keyPressEvent(event)
+
+    def _update_orders_status(self, piezas: list) -> None:
+        """Pasa varios pedidos a su próximo estado con una sola petición al servidor"""
+        cambios = []
+        for pieza in piezas:
+            esperado = self.pedidos[pieza]["estado"]
+            nuevo_estado = self._get_next_status(esperado)
+            if nuevo_estado:
+                self.pedidos[pieza]["estado"] = nuevo_estado
+                cambios.append({"pieza": pieza, "estado": nuevo_estado, "esperado": esperado})
+        print(f"📦 {len(cambios)} pedidos actualizados en lote")
+
+        self.seleccion.clear()
+        self._ancla = None
+        self.actualizar_ui_inteligentemente()
+
+        if cambios:
+            self._send_status_updates(cambios)
 
     def cargar_existentes(self) -> None:
         """Carga pedidos existentes desde el servidor"""
         try:
-            url = f"{self.server_url}pedidos"
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                pedidos_data = response.json()
-                self._process_existing_orders(pedidos_data)
-                print(f"✅ Cargados {len(pedidos_data)} pedidos existentes")
-            else:
-                print(f"⚠️ Error del servidor: {response.status_code}")
-                
+            # Solo los pedidos pendientes: el historial entregado no se descarga
+            pedidos_data = self._descargar_pedidos(estados=list(self.ESTADOS_VISIBLES))
+            self._process_existing_orders(pedidos_data)
+            print(f"✅ Cargados {len(pedidos_data)} pedidos existentes")
         except requests.exceptions.RequestException as e:
             print(f"❌ Error al cargar pedidos existentes: {e}")
             self._handle_connection_error(e)
 
-    def _process_existing_orders(self, pedidos_data: list) -> None:
-        """Procesa la lista de pedidos existentes"""
-        for pedido in pedidos_data:
-            try:
-                pieza = pedido.get("pieza")
-                guarda = pedido.get("guarda")
-                estado = pedido.get("estado")
-                
-                if pieza and guarda and estado:
-                    self.pedidos[pieza] = {
-                        "estado": estado,
-                        "datos": {"pieza": pieza, "guarda": guarda}
-                    }
-                else:
-                    print(f"⚠️ Pedido con datos incompletos: {pedido}")
-                    
-            except Exception as e:
-                print(f"❌ Error procesando pedido {pedido}: {e}")
-
     def _handle_connection_error(self, error) -> None:
         """Maneja errores de conexión con el servidor"""
         error_message = f"No se pudo conectar con el servidor: {error}"
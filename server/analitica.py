@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from repositorio import RepositorioPedidos
+
+# Segundos que se reutiliza un resultado: los tableros consultan seguido y
+# los agregados recorren todo el rango pedido
+ANALITICA_TTL = float(os.environ.get("ANALITICA_TTL", "60"))
+# Rango por defecto cuando no se indica 'desde'
+ANALITICA_DIAS = 7
+PERCENTILES = (0.5, 0.9, 0.99)
+MAX_ENTRADAS = 32
+
+
+def _formato(momento: datetime) -> str:
+    """Mismo formato que AHORA_SQL (UTC)"""
+    return momento.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def normalizar_fecha(fecha: Optional[str]) -> Optional[str]:
+    """Acepta '2024-05-01' o '2024-05-01T10:00' y la deja comparable con creado_en"""
+    return fecha.replace("T", " ") if fecha else None
+
+
+class Analitica:
+    """Tiempos de espera por etapa y cambios por hora de una sucursal, con caché"""
+
+    def __init__(self, repo: RepositorioPedidos, ttl: float = ANALITICA_TTL):
+        self.repo = repo
+        self.ttl = ttl
+        # (desde, hasta) -> (vence, tarea); la tarea se comparte entre los
+        # requests que llegan mientras se calcula
+        self._cache: "OrderedDict[Tuple[Optional[str], Optional[str]], Tuple[float, asyncio.Future]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def consultar(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> dict:
+        """
+        Args:
+            desde: Inicio del rango (UTC); por defecto, ANALITICA_DIAS atrás
+            hasta: Fin del rango, excluido; por defecto, ahora
+        """
+        clave = (normalizar_fecha(desde), normalizar_fecha(hasta))
+        entrada = self._cache.get(clave)
+        if entrada is not None and entrada[0] > time.monotonic():
+            self.hits += 1
+            tarea = entrada[1]
+        else:
+            self.misses += 1
+            tarea = asyncio.ensure_future(self._calcular(*clave))
+            self._cache[clave] = (time.monotonic() + self.ttl, tarea)
+            self._cache.move_to_end(clave)
+            while len(self._cache) > MAX_ENTRADAS:
+                self._cache.popitem(last=False)
+        try:
+            return await asyncio.shield(tarea)
+        except Exception:
+            if self._cache.get(clave, (None, None))[1] is tarea:
+                del self._cache[clave]
+            raise
+
+    async def _calcular(self, desde: Optional[str], hasta: Optional[str]) -> dict:
+        ahora = datetime.now(timezone.utc)
+        desde = desde or _formato(ahora - timedelta(days=ANALITICA_DIAS))
+        hasta = hasta or _formato(ahora)
+        etapas, por_hora = await self.repo.analitica(desde, hasta, PERCENTILES)
+
+        horas = {}
+        for hora, estado, cantidad in por_hora:
+            resumen = horas.setdefault(hora, {"hora": f"{hora}:00", "total": 0, "por_estado": {}})
+            resumen["total"] += cantidad
+            resumen["por_estado"][estado] = cantidad
+        return {
+            "desde": desde,
+            "hasta": hasta,
+            "calculado_en": _formato(ahora),
+            "etapas": [
+                {
+                    "desde_estado": anterior,
+                    "hasta_estado": estado,
+                    "cantidad": cantidad,
+                    "promedio_s": round(promedio, 1),
+                    "max_s": round(maximo, 1),
+                    **{f"p{round(p * 100)}_s": round(valor, 1) for p, valor in zip(PERCENTILES, valores)},
+                }
+                for anterior, estado, cantidad, promedio, maximo, *valores in etapas
+            ],
+            "por_hora": list(horas.values()),
+        }
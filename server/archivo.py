@@ -0,0 +1,68 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from estados import ESTADOS_FINALES
+from repositorio import RepositorioPedidos
+
+ARCHIVO_DIAS = float(os.environ.get("ARCHIVO_DIAS", "7"))
+ARCHIVO_INTERVALO = float(os.environ.get("ARCHIVO_INTERVALO", "3600"))
+ARCHIVO_LOTE = int(os.environ.get("ARCHIVO_LOTE", "5000"))
+
+
+class Archivador:
+    """Tarea de fondo que saca de la tabla activa los pedidos cerrados hace tiempo"""
+
+    def __init__(self, repo: RepositorioPedidos, dias: float = ARCHIVO_DIAS,
+                 intervalo: float = ARCHIVO_INTERVALO, lote: int = ARCHIVO_LOTE):
+        """
+        Args:
+            repo: Repositorio de la sucursal; en SQLite el archivado pasa por el hilo escritor
+            dias: Antigüedad mínima, desde el último cambio, para archivar un pedido
+            intervalo: Segundos entre pasadas
+            lote: Pedidos movidos por transacción, para no frenar otras escrituras
+        """
+        self.repo = repo
+        self.dias = dias
+        self.intervalo = intervalo
+        self.lote = lote
+        self.archivados = 0
+        self._tarea = None
+
+    def _limite(self) -> str:
+        """Fecha de corte con el mismo formato que AHORA_SQL (UTC)"""
+        corte = datetime.now(timezone.utc) - timedelta(days=self.dias)
+        return corte.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    async def archivar(self) -> int:
+        """Hace una pasada completa, lote por lote, y devuelve los pedidos archivados"""
+        antes_de = self._limite()
+        total = 0
+        while True:
+            movidos = await self.repo.archivar(ESTADOS_FINALES, antes_de, self.lote)
+            total += movidos
+            if movidos < self.lote:
+                break
+        self.archivados += total
+        if total:
+            print(f"🗃️ {total} pedidos archivados (sin cambios desde {antes_de})")
+        return total
+
+    async def _bucle(self) -> None:
+        while True:
+            try:
+                await self.archivar()
+            except Exception as e:
+                print(f"❌ Error al archivar pedidos: {e}")
+            await asyncio.sleep(self.intervalo)
+
+    def iniciar(self) -> None:
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self) -> None:
+        if self._tarea:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,81 @@
+"""
+Costo de cada operación del almacenamiento, llamando al repositorio
+directamente (sin HTTP ni WebSocket), con SQLite y con el motor en memoria.
+
+Junto con bench_carga.py --almacen memoria separa lo que cuesta la base de
+lo que cuesta el resto del servidor: la diferencia entre ambos motores acá
+es el costo de la base, y la latencia que queda con --almacen memoria es la
+del framework, la caché y el broadcast.
+
+Uso (desde la carpeta server/):
+    python benchmarks/bench_almacen.py --pedidos 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import servidor_local  # noqa: F401  (agrega server/ al sys.path)
+from generadores import generar_guarda, generar_pieza
+from estados import ESTADOS_ACTIVOS, LISTO_PARA_ENTREGAR, PEDIDO_AL_DEPOSITO
+from repositorio import MOTOR_MEMORIA, MOTOR_SQLITE, crear_repositorio
+
+
+async def cronometrar(operacion, repeticiones: int) -> float:
+    """Microsegundos promedio por llamada"""
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        await operacion(i)
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+async def medir(motor: str, db_path: str, args) -> dict:
+    repo = crear_repositorio(db_path, motor)
+    piezas = [generar_pieza() for _ in range(args.pedidos)]
+    await repo.crear_varios([(p, generar_guarda()) for p in piezas], PEDIDO_AL_DEPOSITO)
+    nuevas = [generar_pieza() for _ in range(args.repeticiones)]
+    seq = await repo.ultimo_seq()
+
+    resultados = {
+        "crear": await cronometrar(
+            lambda i: repo.crear(nuevas[i], "1", PEDIDO_AL_DEPOSITO), args.repeticiones),
+        "transicionar": await cronometrar(
+            lambda i: repo.transicionar(piezas[i], LISTO_PARA_ENTREGAR), args.repeticiones),
+        "conflicto": await cronometrar(
+            lambda i: repo.transicionar(piezas[i], LISTO_PARA_ENTREGAR, PEDIDO_AL_DEPOSITO), args.repeticiones),
+        "listar activos": await cronometrar(
+            lambda i: repo.listar(ESTADOS_ACTIVOS), max(1, args.repeticiones // 100)),
+        "cambios (página)": await cronometrar(
+            lambda i: repo.cambios(None, ESTADOS_ACTIVOS, 0, args.limite), max(1, args.repeticiones // 10)),
+        "cambios since": await cronometrar(
+            lambda i: repo.cambios(seq, None, 0, args.limite), args.repeticiones),
+        "eventos_desde": await cronometrar(
+            lambda i: repo.eventos_desde(seq), args.repeticiones),
+    }
+    repo.cerrar()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pedidos", type=int, default=20000, help="pedidos cargados antes de medir")
+    parser.add_argument("--repeticiones", type=int, default=1000)
+    parser.add_argument("--limite", type=int, default=500, help="pedidos por página de /pedidos/changes")
+    args = parser.parse_args()
+
+    tabla = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for motor in (MOTOR_SQLITE, MOTOR_MEMORIA):
+            random.seed(1234)
+            tabla[motor] = asyncio.run(medir(motor, os.path.join(tmp, "almacen.db"), args))
+
+    print(f"{'operación':<18} {'sqlite':>12} {'memoria':>12} {'costo base':>12}   (µs por llamada)")
+    for operacion, sqlite in tabla[MOTOR_SQLITE].items():
+        memoria = tabla[MOTOR_MEMORIA][operacion]
+        print(f"{operacion:<18} {sqlite:>12.1f} {memoria:>12.1f} {sqlite - memoria:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Prueba de carga de la difusión WebSocket: registra N sockets simulados
+(algunos trabados) y mide la latencia de PUT /pedido/{pieza}.
+
+- antes: el bucle original, 'await ws.send_json(...)' cliente por cliente
+- después: BroadcastHub, con una cola y una tarea escritora por cliente
+
+Uso (desde la carpeta server/):
+    python benchmarks/bench_broadcast.py --sockets 200 --trabados 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+import servidor_local  # noqa: F401  (agrega server/ al sys.path)
+
+
+class SocketSimulado:
+    """WebSocket falso: los trabados tardan 'demora' segundos en cada envío"""
+
+    def __init__(self, demora: float = 0.0):
+        self.demora = demora
+        self.recibidos = 0
+
+    async def send_text(self, texto: str) -> None:
+        if self.demora:
+            await asyncio.sleep(self.demora)
+        self.recibidos += 1
+
+    async def send_json(self, data: dict) -> None:
+        await self.send_text(json.dumps(data))
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def percentil(valores: list, p: float) -> float:
+    valores = sorted(valores)
+    return valores[max(0, int(len(valores) * p) - 1)]
+
+
+async def medir_puts(cliente: httpx.AsyncClient, piezas: list) -> list:
+    tiempos = []
+    for pieza in piezas:
+        inicio = time.perf_counter()
+        respuesta = await cliente.put(f"/pedido/{pieza}", json={"estado": "Listo para ser Entregado"})
+        respuesta.raise_for_status()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def crear_app_antes(simulados: list):
+    """Réplica del handler original: envía a cada socket antes de responder"""
+    from fastapi import FastAPI
+    import main
+
+    principal = main.sucursales.principal
+    app = FastAPI()
+
+    @app.put("/pedido/{pieza}")
+    async def actualizar_estado(pieza: str, estado_update: main.EstadoUpdate):
+        transicion = await principal.repo.transicionar(pieza, estado_update.estado)
+        for ws in simulados:
+            await ws.send_json({"seq": transicion.version, "pieza": pieza,
+                                "guarda": transicion.guarda, "estado": estado_update.estado})
+        return {"status": "ok"}
+
+    return app
+
+
+async def correr(modo: str, sockets: int, trabados: int, demora: float, puts: int) -> list:
+    import main
+
+    principal = main.sucursales.principal
+    piezas = [f"CU{i:09d}AR" for i in range(puts)]
+    for pieza in piezas:
+        await principal.repo.crear(pieza, "1", "Pedido al Deposito")
+
+    simulados = [SocketSimulado(demora if i < trabados else 0.0) for i in range(sockets)]
+    if modo == "antes":
+        app = crear_app_antes(simulados)
+    else:
+        app = main.app
+        for ws in simulados:
+            principal.hub.conectar(ws)
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        tiempos = await medir_puts(cliente, piezas)
+
+    # Deja que las tareas escritoras vacíen las colas de los sockets sanos
+    await asyncio.sleep(0.1)
+    sanos = simulados[trabados:]
+    entregados = min(ws.recibidos for ws in sanos) if sanos else 0
+    print(f"  {modo:<8} mensajes entregados a cada socket sano: {entregados}/{puts}, "
+          f"sockets descartados: {principal.hub.descartados}")
+    await principal.hub.cerrar()
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=200)
+    parser.add_argument("--trabados", type=int, default=5)
+    parser.add_argument("--demora", type=float, default=0.5,
+                        help="segundos que tarda cada envío a un socket trabado")
+    parser.add_argument("--puts", type=int, default=50)
+    parser.add_argument("--modo", choices=["antes", "despues", "ambos"], default="ambos")
+    args = parser.parse_args()
+
+    modos = ["antes", "despues"] if args.modo == "ambos" else [args.modo]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "broadcast.db")
+        print(f"{args.sockets} sockets, {args.trabados} trabados ({args.demora}s por envío), {args.puts} PUTs")
+        for modo in modos:
+            tiempos = asyncio.run(correr(modo, args.sockets, args.trabados, args.demora, args.puts))
+            print(f"  {modo:<8} p50={statistics.median(tiempos):8.2f} ms  "
+                  f"p95={percentil(tiempos, 0.95):8.2f} ms  max={max(tiempos):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Simulación de una sucursal completa contra uvicorn:
+
+- N PCs de consulta cargando pedidos (POST /pedido)
+- M clientes de depósito pasando pedidos a "Listo para ser Entregado"
+- M clientes de entrega cerrándolos (Entregado al Cliente / No Entregado)
+- K oyentes WebSocket que miden cuánto tarda cada cambio en llegarles
+
+Reporta p50/p95/p99 y throughput en JSON, para comparar entre versiones.
+Con --sucursales N simula N sucursales a la vez contra el mismo proceso,
+cada una con sus propios clientes; con --rafaga la primera carga sin pausa,
+para ver si afecta la latencia de las demás.
+
+Uso (desde la carpeta server/):
+    python benchmarks/bench_carga.py --duracion 30 --salida carga.json
+    python benchmarks/bench_carga.py --comparar carga.json     (muestra la diferencia)
+    python benchmarks/bench_carga.py --url http://127.0.0.1:8000/  (servidor ya levantado)
+    python benchmarks/bench_carga.py --sucursales 4 --rafaga
+    python benchmarks/bench_carga.py --almacen memoria   (sin el costo de la base)
+    python benchmarks/bench_carga.py --workers 4 --intervalo 0   (varios procesos con el bus)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import websockets
+
+from servidor_local import SERVER_DIR, ServidorProceso
+from generadores import generar_guarda, generar_pieza
+
+PEDIDO_AL_DEPOSITO = "Pedido al Deposito"
+LISTO_PARA_ENTREGAR = "Listo para ser Entregado"
+ENTREGADO = "Entregado al Cliente"
+NO_ENTREGADO = "No Entregado"
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano"""
+    valores = sorted(valores)
+    return valores[max(0, min(len(valores), round(len(valores) * p)) - 1)]
+
+
+def resumir(tiempos: List[float], errores: int, duracion: float) -> dict:
+    resumen = {"total": len(tiempos), "errores": errores, "por_segundo": round(len(tiempos) / duracion, 1)}
+    if tiempos:
+        resumen.update({
+            "p50_ms": round(percentil(tiempos, 0.50), 2),
+            "p95_ms": round(percentil(tiempos, 0.95), 2),
+            "p99_ms": round(percentil(tiempos, 0.99), 2),
+            "max_ms": round(max(tiempos), 2),
+        })
+    return resumen
+
+
+class Carga:
+    """Estado compartido entre los clientes simulados"""
+
+    def __init__(self, intervalo: float, rechazo: float):
+        self.intervalo = intervalo
+        self.rechazo = rechazo
+        self.para_deposito: "asyncio.Queue[str]" = asyncio.Queue()
+        self.para_entrega: "asyncio.Queue[str]" = asyncio.Queue()
+        # (pieza, estado) -> momento en que se envió el request que lo produce
+        self.enviados: Dict[Tuple[str, str], float] = {}
+        self.tiempos: Dict[str, List[float]] = {"crear": [], "deposito": [], "entrega": []}
+        self.errores: Dict[str, int] = {"crear": 0, "deposito": 0, "entrega": 0}
+        self.propagacion: List[float] = []
+
+    async def pedir(self, operacion: str, enviar, pieza: str, estado: str) -> bool:
+        inicio = time.perf_counter()
+        self.enviados[(pieza, estado)] = inicio
+        try:
+            respuesta = await enviar()
+            ok = respuesta.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            self.tiempos[operacion].append((time.perf_counter() - inicio) * 1000)
+        else:
+            self.errores[operacion] += 1
+            self.enviados.pop((pieza, estado), None)
+        return ok
+
+    async def pausa(self) -> None:
+        if self.intervalo:
+            # Con algo de variación, para que los clientes no vayan sincronizados
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.intervalo)
+
+
+async def pc_consulta(carga: Carga, http: httpx.AsyncClient) -> None:
+    while True:
+        pieza = generar_pieza()
+        pedido = {"pieza": pieza, "guarda": generar_guarda()}
+        if await carga.pedir("crear", lambda: http.post("pedido", json=pedido), pieza, PEDIDO_AL_DEPOSITO):
+            carga.para_deposito.put_nowait(pieza)
+        await carga.pausa()
+
+
+async def cliente_deposito(carga: Carga, http: httpx.AsyncClient) -> None:
+    cambio = {"estado": LISTO_PARA_ENTREGAR, "esperado": PEDIDO_AL_DEPOSITO}
+    while True:
+        pieza = await carga.para_deposito.get()
+        if await carga.pedir("deposito", lambda: http.put(f"pedido/{pieza}", json=cambio), pieza, LISTO_PARA_ENTREGAR):
+            carga.para_entrega.put_nowait(pieza)
+        await carga.pausa()
+
+
+async def cliente_entrega(carga: Carga, http: httpx.AsyncClient) -> None:
+    while True:
+        pieza = await carga.para_entrega.get()
+        estado = NO_ENTREGADO if random.random() < carga.rechazo else ENTREGADO
+        cambio = {"estado": estado, "esperado": LISTO_PARA_ENTREGAR}
+        await carga.pedir("entrega", lambda: http.put(f"pedido/{pieza}", json=cambio), pieza, estado)
+        await carga.pausa()
+
+
+async def oyente(carga: Carga, ws_url: str, conectado: asyncio.Event) -> None:
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        conectado.set()
+        async for texto in ws:
+            llegada = time.perf_counter()
+            mensaje = json.loads(texto)
+            eventos = mensaje["eventos"] if mensaje.get("tipo") == "lote" else [mensaje]
+            for evento in eventos:
+                enviado = carga.enviados.get((evento.get("pieza"), evento.get("estado")))
+                if enviado is not None:
+                    carga.propagacion.append((llegada - enviado) * 1000)
+
+
+async def precargar(http: httpx.AsyncClient, cantidad: int) -> None:
+    """Llena la tabla por lotes antes de medir, para probar con una base de tamaño real"""
+    for inicio in range(0, cantidad, 1000):
+        lote = [{"pieza": generar_pieza(), "guarda": generar_guarda()}
+                for _ in range(min(1000, cantidad - inicio))]
+        (await http.post("pedidos/batch", json={"pedidos": lote})).raise_for_status()
+
+
+async def simular_sucursal(url: str, args, intervalo: float) -> dict:
+    """Corre la carga de una sucursal y devuelve sus resúmenes"""
+    carga = Carga(intervalo, args.rechazo)
+    limites = httpx.Limits(max_connections=args.consultas + args.depositos + args.entregas)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=30) as http:
+        if args.precarga:
+            await precargar(http, args.precarga)
+
+        ws_url = url.replace("http", "ws", 1) + "ws"
+        if args.sector:
+            ws_url += f"?sector={args.sector}"
+        tareas = []
+        for _ in range(args.oyentes):
+            conectado = asyncio.Event()
+            tareas.append(asyncio.create_task(oyente(carga, ws_url, conectado)))
+            await conectado.wait()
+
+        inicio = time.perf_counter()
+        tareas += [asyncio.create_task(pc_consulta(carga, http)) for _ in range(args.consultas)]
+        tareas += [asyncio.create_task(cliente_deposito(carga, http)) for _ in range(args.depositos)]
+        tareas += [asyncio.create_task(cliente_entrega(carga, http)) for _ in range(args.entregas)]
+        await asyncio.sleep(args.duracion)
+        duracion = time.perf_counter() - inicio
+
+        # Un momento para que los oyentes reciban lo último que se envió
+        await asyncio.sleep(0.5)
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    return {
+        "intervalo": intervalo,
+        "duracion_s": round(duracion, 2),
+        "operaciones": {
+            operacion: resumir(carga.tiempos[operacion], carga.errores[operacion], duracion)
+            for operacion in carga.tiempos
+        },
+        "propagacion": resumir(carga.propagacion, 0, duracion),
+    }
+
+
+def nombres_sucursales(cantidad: int) -> List[str]:
+    return [f"s{i}" for i in range(1, cantidad + 1)]
+
+
+async def simular(url: str, args) -> dict:
+    reporte = {
+        "commit": commit_actual(),
+        "configuracion": {
+            "consultas": args.consultas, "depositos": args.depositos, "entregas": args.entregas,
+            "oyentes": args.oyentes, "sector": args.sector, "intervalo": args.intervalo, "precarga": args.precarga,
+            "duracion": args.duracion, "sucursales": args.sucursales, "rafaga": args.rafaga,
+            "almacen": args.almacen, "workers": args.workers,
+        },
+    }
+    if args.sucursales <= 1:
+        reporte.update(await simular_sucursal(url, args, args.intervalo))
+    else:
+        nombres = nombres_sucursales(args.sucursales)
+        resultados = await asyncio.gather(*(
+            simular_sucursal(f"{url}s/{nombre}/", args, 0 if args.rafaga and i == 0 else args.intervalo)
+            for i, nombre in enumerate(nombres)
+        ))
+        reporte["sucursales"] = dict(zip(nombres, resultados))
+
+    if args.metricas:
+        async with httpx.AsyncClient(base_url=url) as http:
+            reporte["metricas_servidor"] = (await http.get("metrics")).text
+    return reporte
+
+
+def commit_actual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def secciones(reporte: dict) -> Dict[str, dict]:
+    """Resúmenes del reporte por nombre ("crear", "s2/propagacion", ...)"""
+    if "sucursales" not in reporte:
+        return dict(reporte["operaciones"], propagacion=reporte["propagacion"])
+    return {
+        f"{sucursal}/{nombre}": resumen
+        for sucursal, parcial in reporte["sucursales"].items()
+        for nombre, resumen in secciones(parcial).items()
+    }
+
+
+def comparar(anterior: dict, actual: dict) -> None:
+    """Muestra la variación de cada percentil respecto de un reporte anterior"""
+    print(f"Comparación {anterior.get('commit')} → {actual.get('commit')}")
+    previas = secciones(anterior)
+    for nombre, resumen in secciones(actual).items():
+        previo = previas.get(nombre, {})
+        for clave in ("por_segundo", "p50_ms", "p95_ms", "p99_ms"):
+            antes, ahora = previo.get(clave), resumen.get(clave)
+            if not antes or ahora is None:
+                continue
+            cambio = (ahora - antes) / antes * 100
+            # Más throughput es mejor; más latencia es peor
+            peor = cambio < -10 if clave == "por_segundo" else cambio > 10
+            print(f"  {nombre:<16} {clave:<12} {antes:>10} → {ahora:>10} ({cambio:+.1f}%){'  ⚠️' if peor else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consultas", type=int, default=4, help="PCs de consulta cargando pedidos")
+    parser.add_argument("--depositos", type=int, default=2, help="clientes de depósito")
+    parser.add_argument("--entregas", type=int, default=2, help="clientes de entrega")
+    parser.add_argument("--oyentes", type=int, default=20, help="sockets que miden la propagación")
+    parser.add_argument("--sector", choices=["deposito", "entrega"],
+                        help="suscribir a los oyentes a un sector en vez de a todos los eventos")
+    parser.add_argument("--duracion", type=float, default=20.0, help="segundos de carga")
+    parser.add_argument("--intervalo", type=float, default=0.05,
+                        help="pausa media entre requests de cada cliente (0 = sin pausa)")
+    parser.add_argument("--rechazo", type=float, default=0.1, help="proporción de pedidos no entregados")
+    parser.add_argument("--precarga", type=int, default=0, help="pedidos a insertar antes de medir")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--sucursales", type=int, default=1,
+                        help="sucursales simuladas a la vez (s1, s2, ...), cada una con su base")
+    parser.add_argument("--rafaga", action="store_true",
+                        help="con varias sucursales, la primera carga sin pausa entre requests")
+    parser.add_argument("--almacen", choices=["sqlite", "memoria"], default="sqlite",
+                        help="motor de almacenamiento del servidor arrancado; con memoria queda solo "
+                             "el costo de HTTP, WebSocket, caché y broadcast")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="procesos de uvicorn del servidor arrancado; con más de uno comparten los "
+                             "eventos por el bus (solo con --almacen sqlite)")
+    parser.add_argument("--url", help="servidor ya levantado (con SUCURSALES=s1,s2,... si se usan varias); "
+                                      "si no, se arranca uno con bases temporales")
+    parser.add_argument("--salida", help="archivo donde guardar el reporte JSON")
+    parser.add_argument("--comparar", help="reporte JSON anterior contra el cual comparar")
+    parser.add_argument("--metricas", action="store_true", help="incluir GET /metrics en el reporte")
+    args = parser.parse_args()
+
+    random.seed(args.semilla)
+    if args.url:
+        reporte = asyncio.run(simular(args.url.rstrip("/") + "/", args))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {"DB_DIR": tmp, "SUCURSALES": ",".join(nombres_sucursales(args.sucursales)),
+                   "ALMACEN": args.almacen, "WEB_CONCURRENCY": str(args.workers)}
+            with ServidorProceso(os.path.join(tmp, "carga.db"), env=env) as servidor:
+                reporte = asyncio.run(simular(servidor.url, args))
+
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(json.load(f), reporte)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compara JSON contra el formato compacto (MessagePack con estados como
+enteros): tamaño de cada mensaje y tiempo de codificar en el servidor y de
+decodificar en el cliente, hasta obtener los mismos dicts.
+
+Uso (desde la carpeta server/):
+    python benchmarks/bench_formatos.py --pedidos 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from servidor_local import SERVER_DIR
+from generadores import generar_guarda, generar_pieza
+from estados import ESTADOS_VALIDOS
+import formatos
+
+# Decodificadores del cliente (common.py en la raíz del repo)
+sys.path.append(os.path.dirname(SERVER_DIR))
+from common import decodificar_cambios, decodificar_mensaje  # noqa: E402
+
+
+def json_compacto(datos) -> bytes:
+    """Igual que lo que envían el hub y FastAPI"""
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def cronometrar(fn, repeticiones: int) -> float:
+    """Microsegundos promedio por llamada"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def comparar(nombre: str, repeticiones: int, cod_json, dec_json, cod_compacto, dec_compacto) -> None:
+    datos_json, datos_compacto = cod_json(), cod_compacto()
+    assert dec_json(datos_json) == dec_compacto(datos_compacto), nombre
+    print(f"{nombre}")
+    for formato, datos, codificar, decodificar in (
+        ("json", datos_json, cod_json, dec_json),
+        ("msgpack", datos_compacto, cod_compacto, dec_compacto),
+    ):
+        print(f"  {formato:<8} {len(datos):>10} bytes   "
+              f"codificar {cronometrar(codificar, repeticiones):>10.1f} µs   "
+              f"decodificar {cronometrar(lambda: decodificar(datos), repeticiones):>10.1f} µs")
+    print(f"  msgpack ocupa el {len(datos_compacto) / len(datos_json):.0%} de JSON")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pedidos", type=int, default=5000, help="pedidos en la página de /pedidos/changes")
+    parser.add_argument("--lote", type=int, default=100, help="eventos en un mensaje de lote")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(1234)
+    eventos = [
+        {"seq": seq, "pieza": generar_pieza(), "guarda": generar_guarda(), "estado": random.choice(ESTADOS_VALIDOS)}
+        for seq in range(1, max(args.lote, args.pedidos) + 1)
+    ]
+    evento = eventos[0]
+    lote = {"tipo": "lote", "seq": eventos[args.lote - 1]["seq"], "eventos": eventos[:args.lote]}
+    filas = [(e["seq"], e["pieza"], e["guarda"], e["estado"], e["seq"]) for e in eventos[:args.pedidos]]
+    pagina = {
+        "pedidos": [{"pieza": f[1], "guarda": f[2], "estado": f[3], "version": f[4]} for f in filas],
+        "cursor": filas[-1][0], "mas": True, "seq": filas[-1][4],
+    }
+
+    # Los mensajes chicos se repiten más para que el tiempo sea medible
+    comparar("Evento WebSocket", args.repeticiones * 100,
+             lambda: json_compacto(evento), json.loads,
+             lambda: formatos.codificar_mensaje(evento), decodificar_mensaje)
+    comparar(f"Lote WebSocket de {args.lote} eventos", args.repeticiones * 10,
+             lambda: json_compacto(lote), json.loads,
+             lambda: formatos.codificar_mensaje(lote), decodificar_mensaje)
+    comparar(f"Página de /pedidos/changes con {args.pedidos} pedidos", args.repeticiones,
+             lambda: json_compacto(pagina), lambda datos: {**json.loads(datos), "v": formatos.ESQUEMA},
+             lambda: formatos.codificar_cambios(filas, pagina["cursor"], pagina["mas"], pagina["seq"]),
+             decodificar_cambios)
+
+
+if __name__ == "__main__":
+    main()
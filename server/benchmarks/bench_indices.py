@@ -0,0 +1,82 @@
+"""
+Mide la latencia del PUT /pedido/{pieza} (UPDATE + SELECT guarda) según el
+tamaño de la tabla, con el esquema original sin índices y después de migrar
+la misma base en el lugar.
+
+Uso (desde la carpeta server/):
+    python benchmarks/bench_indices.py --filas 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import servidor_local  # noqa: F401  (agrega server/ al sys.path)
+import db
+import migrations
+
+ESTADOS = ["Pedido al Deposito", "Listo para ser Entregado", "Entregado al Cliente",
+           "No Entregado", "En Deposito"]
+
+
+def crear_base_original(path: str, filas: int) -> list:
+    """Crea una base con el esquema previo a las migraciones y la llena"""
+    conn = sqlite3.connect(path)
+    migrations.MIGRACIONES[0][1](conn)
+    piezas = [f"CU{i:09d}AR" for i in range(filas)]
+    conn.executemany(
+        "INSERT INTO pedidos (pieza, guarda, estado) VALUES (?, ?, ?)",
+        ((p, str(i % 150 + 1), ESTADOS[i % len(ESTADOS)]) for i, p in enumerate(piezas))
+    )
+    conn.commit()
+    conn.close()
+    return piezas
+
+
+def put_original(conn: sqlite3.Connection, pieza: str, estado: str) -> None:
+    conn.execute("UPDATE pedidos SET estado = ? WHERE pieza = ?", (estado, pieza))
+    conn.commit()
+    conn.execute("SELECT guarda FROM pedidos WHERE pieza = ?", (pieza,)).fetchone()
+
+
+def medir(conn: sqlite3.Connection, put, piezas: list, muestras: int) -> dict:
+    """Devuelve la latencia media y p95 en milisegundos"""
+    tiempos = []
+    for pieza in random.sample(piezas, muestras):
+        inicio = time.perf_counter()
+        put(conn, pieza, "Listo para ser Entregado")
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {"media": statistics.mean(tiempos), "p95": tiempos[int(len(tiempos) * 0.95) - 1]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--muestras", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'filas':>10} | {'sin índices (ms)':>22} | {'migrada (ms)':>22}")
+    print(f"{'':>10} | {'media':>10} {'p95':>11} | {'media':>10} {'p95':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for filas in args.filas:
+            path = os.path.join(tmp, f"pedidos_{filas}.db")
+            piezas = crear_base_original(path, filas)
+
+            # Misma configuración que el servidor (WAL) para aislar el costo de la búsqueda
+            pool = db.ConnectionPool(path, size=1)
+            with pool.conexion() as conn:
+                antes = medir(conn, put_original, piezas, args.muestras)
+                migrations.migrar(conn)
+                despues = medir(conn, db.actualizar_estado, piezas, args.muestras)
+            pool.close()
+
+            print(f"{filas:>10} | {antes['media']:>10.3f} {antes['p95']:>11.3f} | "
+                  f"{despues['media']:>10.3f} {despues['p95']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Costo en el cliente de reflejar eventos en la lista de pedidos: aplica una
+serie de eventos a la vista de depósito y cuenta widgets creados, filas que
+el modelo avisa a la vista, tarjetas que la vista vuelve a pintar y cuántas
+de ellas hubo que dibujar de cero (las demás salen de QPixmapCache).
+
+Compara la reconciliación (PedidosModel.actualizar, que solo aplica lo que
+cambió) contra reiniciar el modelo en cada evento, que es lo que hacía la
+primera versión con modelo: la vista descarta todo y redibuja cada fila en
+pantalla. Como referencia mide también, sobre los primeros --muestra
+eventos, la versión anterior: un QFrame con sus paneles y etiquetas por
+pedido, todos recreados en cada evento.
+
+Uso (desde la carpeta server/):
+    python benchmarks/bench_lista.py --pedidos 200 --eventos 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from servidor_local import SERVER_DIR
+from generadores import generar_guarda, generar_pieza
+from estados import LISTO_PARA_ENTREGAR, NO_ENTREGADO, PEDIDO_AL_DEPOSITO
+
+from PyQt5.QtGui import QPixmapCache  # noqa: E402
+from PyQt5.QtWidgets import (  # noqa: E402
+    QApplication, QFrame, QHBoxLayout, QLabel, QScrollArea, QVBoxLayout, QWidget
+)
+
+# Lista del cliente (common.py en la raíz del repo)
+sys.path.append(os.path.dirname(SERVER_DIR))
+from common import FilaPedido, ListaPedidos, PedidoDelegate, PedidosModel  # noqa: E402
+
+# Mismos estados y colores que DepositoApp, en el orden en que se muestran
+ESTADOS_VISIBLES = {NO_ENTREGADO: "#e74c3c", PEDIDO_AL_DEPOSITO: "#f1c40f"}
+COLOR_SELECCION = "#3498db"
+
+
+class ModeloReinicio(PedidosModel):
+    """Reinicia el modelo ante cualquier cambio"""
+
+    def actualizar(self, filas):
+        if filas == self._filas:
+            return []
+        self.beginResetModel()
+        self._filas = list(filas)
+        self.endResetModel()
+        return [("reiniciar", 0, len(filas))]
+
+
+class DelegateContador(PedidoDelegate):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.pintadas = 0
+        self.dibujadas = 0
+
+    def paint(self, painter, option, index):
+        self.pintadas += 1
+        super().paint(painter, option, index)
+
+    def _dibujar_tarjeta(self, *args):
+        self.dibujadas += 1
+        return super()._dibujar_tarjeta(*args)
+
+
+class VistaWidgets(QScrollArea):
+    """La lista anterior: un árbol de widgets con estilos por pedido, recreado en cada evento"""
+
+    def __init__(self):
+        super().__init__()
+        self.setWidgetResizable(True)
+        contenido = QWidget()
+        self.capa = QVBoxLayout(contenido)
+        self.setWidget(contenido)
+
+    def actualizar(self, filas) -> None:
+        while self.capa.count():
+            item = self.capa.takeAt(0)
+            if item.widget():
+                item.widget().deleteLater()
+        for fila in filas:
+            self.capa.addWidget(self._tarjeta(fila))
+        self.capa.addStretch()
+
+    @staticmethod
+    def _tarjeta(fila: FilaPedido) -> QFrame:
+        tarjeta = QFrame()
+        tarjeta.setFixedHeight(60)
+        tarjeta.setStyleSheet(f"QFrame {{ background-color: {fila.color}; border-radius: 5px; }}")
+        capa = QHBoxLayout(tarjeta)
+        pieza = QWidget()
+        capa_pieza = QHBoxLayout(pieza)
+        for texto, estilo in ((fila.pieza[:2], "font-size:13pt; font-weight:bold;"),
+                              (fila.pieza[2:-5], "font-size:10pt;"),
+                              (fila.pieza[-5:-2], "font-size:18pt; font-weight:bold;")):
+            capa_pieza.addWidget(QLabel(f'<span style="{estilo}">{texto}</span>'))
+        capa.addWidget(pieza)
+        guarda = QWidget()
+        etiqueta = QLabel(f'<span style="font-size:20pt; font-weight:bold;">{fila.guarda}</span>')
+        etiqueta.setStyleSheet("QLabel { border: 2px solid #000000; border-radius: 3px; }")
+        QHBoxLayout(guarda).addWidget(etiqueta)
+        capa.addWidget(guarda)
+        return tarjeta
+
+
+def generar_eventos(pedidos: dict, cantidad: int) -> list:
+    """Pedidos nuevos, pasos del depósito, vueltas de entrega y selecciones"""
+    pendientes = list(pedidos)
+    eventos = []
+    for _ in range(cantidad):
+        tipo = random.random()
+        if tipo < 0.3 or not pendientes:
+            pieza = generar_pieza()
+            pendientes.append(pieza)
+            eventos.append(("pedido", pieza, generar_guarda()))
+        elif tipo < 0.6:
+            eventos.append(("estado", pendientes.pop(random.randrange(len(pendientes))), LISTO_PARA_ENTREGAR))
+        elif tipo < 0.8:
+            eventos.append(("estado", random.choice(pendientes), NO_ENTREGADO))
+        else:
+            eventos.append(("seleccion", random.choice(pendientes), None))
+    return eventos
+
+
+def filas_visibles(pedidos: dict, seleccion: set) -> list:
+    """Igual que BaseApp.filas_visibles con el color de DepositoApp"""
+    grupos = {estado: [] for estado in ESTADOS_VISIBLES}
+    for pieza, (guarda, estado) in pedidos.items():
+        if estado in grupos:
+            color = COLOR_SELECCION if pieza in seleccion else ESTADOS_VISIBLES[estado]
+            grupos[estado].append(FilaPedido(pieza, guarda, color))
+    return [fila for grupo in grupos.values() for fila in grupo]
+
+
+def dibujar(app: QApplication) -> None:
+    """Procesa el layout diferido de la vista y el repintado que genera"""
+    for _ in range(3):
+        app.processEvents()
+
+
+def aplicar(pedidos: dict, seleccion: set, evento: tuple) -> None:
+    tipo, pieza, valor = evento
+    if tipo == "pedido":
+        pedidos[pieza] = (valor, PEDIDO_AL_DEPOSITO)
+    elif tipo == "estado":
+        pedidos[pieza] = (pedidos[pieza][0], valor)
+    else:
+        seleccion ^= {pieza}
+
+
+def medir_widgets(app: QApplication, iniciales: dict, eventos: list) -> dict:
+    vista = VistaWidgets()
+    vista.resize(230, 700)
+    pedidos = dict(iniciales)
+    seleccion = set()
+    vista.actualizar(filas_visibles(pedidos, seleccion))
+    vista.show()
+    dibujar(app)
+
+    creados = 0
+    inicio = time.perf_counter()
+    for evento in eventos:
+        aplicar(pedidos, seleccion, evento)
+        antes = len(QApplication.allWidgets())
+        vista.actualizar(filas_visibles(pedidos, seleccion))
+        creados += len(QApplication.allWidgets()) - antes
+        dibujar(app)
+    segundos = time.perf_counter() - inicio
+    vista.close()
+    vista.deleteLater()
+    app.processEvents()
+    return {"widgets creados": creados, "ms por evento": segundos / len(eventos) * 1e3}
+
+
+def medir(app: QApplication, modelo_clase, iniciales: dict, eventos: list) -> dict:
+    QPixmapCache.clear()
+    lista = ListaPedidos()
+    lista.resize(230, 700)
+    modelo = modelo_clase()
+    delegate = DelegateContador(1.0, True, lista)
+    lista.setModel(modelo)
+    lista.setItemDelegate(delegate)
+    pedidos = dict(iniciales)
+    seleccion = set()
+    modelo.actualizar(filas_visibles(pedidos, seleccion))
+    lista.show()
+    dibujar(app)
+
+    filas_avisadas = 0
+    widgets_antes = len(QApplication.allWidgets())
+    delegate.pintadas = delegate.dibujadas = 0
+    operaciones = 0
+
+    inicio = time.perf_counter()
+    for evento in eventos:
+        aplicar(pedidos, seleccion, evento)
+        aplicadas = modelo.actualizar(filas_visibles(pedidos, seleccion))
+        operaciones += len(aplicadas)
+        for nombre, primero, segundo in aplicadas:
+            if nombre == "reiniciar":
+                filas_avisadas += segundo
+            elif nombre in ("quitar", "recolorear"):
+                filas_avisadas += segundo - primero + 1
+            else:
+                filas_avisadas += 1
+        # Cada evento llega por separado: la vista se dibuja entre uno y otro
+        dibujar(app)
+    segundos = time.perf_counter() - inicio
+
+    resultado = {
+        "widgets creados": len(QApplication.allWidgets()) - widgets_antes,
+        "operaciones": operaciones,
+        "filas avisadas": filas_avisadas,
+        "tarjetas pintadas": delegate.pintadas,
+        "dibujadas de cero": delegate.dibujadas,
+        "ms por evento": segundos / len(eventos) * 1e3,
+    }
+    lista.close()
+    lista.deleteLater()
+    app.processEvents()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pedidos", type=int, default=200, help="pedidos en la vista al empezar")
+    parser.add_argument("--eventos", type=int, default=1000)
+    parser.add_argument("--muestra", type=int, default=50, help="eventos medidos con la versión de widgets")
+    args = parser.parse_args()
+
+    random.seed(1234)
+    iniciales = {generar_pieza(): (generar_guarda(), PEDIDO_AL_DEPOSITO) for _ in range(args.pedidos)}
+    eventos = generar_eventos(iniciales, args.eventos)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    tabla = {
+        "reinicio": medir(app, ModeloReinicio, iniciales, eventos),
+        "reconciliación": medir(app, PedidosModel, iniciales, eventos),
+    }
+
+    print(f"{args.eventos} eventos sobre {args.pedidos} pedidos en pantalla de depósito")
+    print(f"{'':<20} {'reinicio':>14} {'reconciliación':>16}")
+    for medida in tabla["reinicio"]:
+        antes, despues = tabla["reinicio"][medida], tabla["reconciliación"][medida]
+        formato = ".3f" if isinstance(antes, float) else "d"
+        print(f"{medida:<20} {antes:>14{formato}} {despues:>16{formato}}")
+
+    if args.muestra:
+        muestra = eventos[:args.muestra]
+        widgets = medir_widgets(app, iniciales, muestra)
+        print(f"\nVersión anterior, un QFrame por pedido (primeros {len(muestra)} eventos): "
+              f"{widgets['widgets creados']} widgets creados, {widgets['ms por evento']:.1f} ms por evento")
+
+
+if __name__ == "__main__":
+    main()
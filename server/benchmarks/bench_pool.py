@@ -0,0 +1,136 @@
+"""
+Compara requests/segundo de los endpoints del servidor:
+
+- antes: una conexión sqlite3 nueva por request, ejecutada dentro del event loop
+- después: pool de conexiones persistentes (WAL) ejecutado fuera del event loop
+
+"Después" es la app completa de main.py: además del pool, cada request pasa
+por GZip y las métricas, que "antes" no tenía. En un listado vacío de un
+estado fuera de la caché (GET vacío) ese costo fijo pesa más que lo que se
+ahorra en la base y queda algo por debajo de "antes" (x0.9 a x0.95); sin esos
+dos middlewares queda a la par. Los listados con pedidos salen de la caché.
+
+Uso (desde la carpeta server/):
+    python benchmarks/bench_pool.py --requests 2000 --clientes 8
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from servidor_local import ServidorLocal
+
+
+def crear_app_antes(path: str):
+    """Réplica de los handlers originales: connect/close por request"""
+    from fastapi import FastAPI, Query
+    from fastapi.middleware.cors import CORSMiddleware
+    from pydantic import BaseModel
+
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
+                       allow_methods=["*"], allow_headers=["*"])
+
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS pedidos (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                 " pieza TEXT, guarda TEXT, estado TEXT)")
+    conn.commit()
+    conn.close()
+
+    class Pedido(BaseModel):
+        pieza: str
+        guarda: str
+
+    class EstadoUpdate(BaseModel):
+        estado: str
+
+    @app.post("/pedido")
+    async def nuevo_pedido(pedido: Pedido):
+        conn = sqlite3.connect(path)
+        conn.execute("INSERT INTO pedidos (pieza, guarda, estado) VALUES (?, ?, ?)",
+                     (pedido.pieza, pedido.guarda, "Pedido al Deposito"))
+        conn.commit()
+        conn.close()
+        return {"status": "ok"}
+
+    @app.put("/pedido/{pieza}")
+    async def actualizar_estado(pieza: str, estado_update: EstadoUpdate):
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE pedidos SET estado = ? WHERE pieza = ?", (estado_update.estado, pieza))
+        conn.commit()
+        conn.execute("SELECT guarda FROM pedidos WHERE pieza = ?", (pieza,)).fetchone()
+        conn.close()
+        return {"status": "ok"}
+
+    @app.get("/pedidos")
+    async def obtener_pedidos(estado: str = Query(default=None)):
+        conn = sqlite3.connect(path)
+        rows = conn.execute("SELECT pieza, guarda, estado FROM pedidos WHERE estado IN (?)",
+                            (estado,)).fetchall()
+        conn.close()
+        return [{"pieza": r[0], "guarda": r[1], "estado": r[2]} for r in rows]
+
+    return app
+
+
+def crear_app_despues(path: str):
+    """La app real de main.py apuntando a una base temporal"""
+    os.environ["DB_PATH"] = path
+    import main
+    return main.app
+
+
+def medir(nombre: str, total: int, clientes: int, fn) -> float:
+    """Ejecuta fn(i) total veces con 'clientes' hilos y devuelve requests/segundo"""
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        list(executor.map(fn, range(total)))
+    rps = total / (time.perf_counter() - inicio)
+    print(f"  {nombre:<16} {rps:>8.0f} req/s")
+    return rps
+
+
+def correr(app, total: int, clientes: int) -> dict:
+    """Mide POST, PUT y GET contra una app levantada localmente"""
+    sesion = requests.Session()
+    sesion.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=clientes))
+    piezas = [f"CU{i:09d}AR" for i in range(total)]
+
+    with ServidorLocal(app) as servidor:
+        url = servidor.url
+        return {
+            "POST /pedido": medir("POST /pedido", total, clientes, lambda i: sesion.post(
+                f"{url}pedido", json={"pieza": piezas[i], "guarda": str(i % 150)}).raise_for_status()),
+            "PUT /pedido": medir("PUT /pedido", total, clientes, lambda i: sesion.put(
+                f"{url}pedido/{piezas[i]}", json={"estado": "Listo para ser Entregado"}).raise_for_status()),
+            # Después del PUT todos los pedidos están listos para entregar
+            "GET /pedidos": medir("GET /pedidos", total // 4, clientes, lambda i: sesion.get(
+                f"{url}pedidos", params={"estado": "Listo para ser Entregado"}).raise_for_status()),
+            "GET vacío": medir("GET vacío", total // 4, clientes, lambda i: sesion.get(
+                f"{url}pedidos", params={"estado": "Entregado al Cliente"}).raise_for_status()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clientes", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Antes (conexión por request):")
+        antes = correr(crear_app_antes(os.path.join(tmp, "antes.db")), args.requests, args.clientes)
+        print("Después (pool de conexiones):")
+        despues = correr(crear_app_despues(os.path.join(tmp, "despues.db")), args.requests, args.clientes)
+
+    print("Mejora:")
+    for endpoint in antes:
+        print(f"  {endpoint:<16} x{despues[endpoint] / antes[endpoint]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import uvicorn
+
+# Permite importar los módulos del servidor (main, db, ...) desde los benchmarks
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+
+def puerto_libre() -> int:
+    """Obtiene un puerto TCP libre en localhost"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServidorLocal:
+    """Levanta una app ASGI con uvicorn en un hilo, para usar con 'with'"""
+
+    def __init__(self, app, port: int = None):
+        self.port = port or puerto_libre()
+        self.url = f"http://127.0.0.1:{self.port}/"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "ServidorLocal":
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self._thread.join()
+
+
+class ServidorProceso:
+    """Levanta 'uvicorn main:app' en un proceso aparte, para que la carga no le robe CPU"""
+
+    def __init__(self, db_path: str, port: int = None, timeout: float = 15.0, env: dict = None):
+        self.port = port or puerto_libre()
+        self.url = f"http://127.0.0.1:{self.port}/"
+        self.db_path = db_path
+        self.env = env or {}
+        self.timeout = timeout
+        self.proceso: subprocess.Popen = None
+
+    def __enter__(self) -> "ServidorProceso":
+        env = dict(os.environ, DB_PATH=self.db_path, **self.env)
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL,
+        )
+        limite = time.monotonic() + self.timeout
+        while True:
+            try:
+                urllib.request.urlopen(self.url + "health", timeout=1).close()
+                return self
+            except OSError:
+                if self.proceso.poll() is not None or time.monotonic() > limite:
+                    self.proceso.kill()
+                    raise RuntimeError("❌ El servidor no arrancó")
+                time.sleep(0.1)
+
+    def __exit__(self, *exc) -> None:
+        self.proceso.terminate()
+        try:
+            self.proceso.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket
+
+import formatos
+
+MAX_COLA = int(os.environ.get("WS_MAX_COLA", "100"))
+# Código de cierre 1013 "Try Again Later": el cliente debe reconectarse
+CIERRE_CLIENTE_LENTO = 1013
+TIMEOUT_CIERRE = 1.0
+# Latido: cada cuántos segundos se envía un ping a los clientes que lo
+# pidieron, y cuánto silencio se tolera a cualquier cliente antes de darlo por muerto
+PING_INTERVALO = float(os.environ.get("WS_PING_INTERVALO", "20"))
+PING_TIMEOUT = float(os.environ.get("WS_PING_TIMEOUT", "60"))
+# Código de cierre 1001 "Going Away" para los clientes que dejaron de responder
+CIERRE_SIN_RESPUESTA = 1001
+
+
+class Cliente:
+    """Socket conectado con su cola de salida y su tarea escritora"""
+
+    def __init__(self, websocket: WebSocket, max_cola: int, since: Optional[int],
+                 filtro: Optional[FrozenSet[str]] = None, formato: Optional[str] = None, latido: bool = False):
+        self.websocket = websocket
+        self.cola: "asyncio.Queue[Tuple[Optional[int], Union[str, bytes]]]" = asyncio.Queue(maxsize=max_cola)
+        self.since = since
+        self.filtro = filtro
+        self.formato = formato
+        # Solo los clientes con latido reciben pings; el resto debe enviar algo por su cuenta
+        self.latido = latido
+        self.actividad = time.monotonic()
+        self.tarea: asyncio.Task = None
+
+    def recibido(self) -> None:
+        """Registra que llegó algo del cliente (un pong o cualquier otro mensaje)"""
+        self.actividad = time.monotonic()
+
+    async def enviar(self, datos: Union[str, bytes]) -> None:
+        if isinstance(datos, bytes):
+            await self.websocket.send_bytes(datos)
+        else:
+            await self.websocket.send_text(datos)
+
+
+def serializar(mensaje: dict, formato: Optional[str] = None) -> Union[str, bytes]:
+    """Texto JSON, o bytes MessagePack si el cliente pidió el formato compacto"""
+    if formato == formatos.FORMATO_MSGPACK:
+        return formatos.codificar_mensaje(mensaje)
+    return json.dumps(mensaje, ensure_ascii=False, separators=(",", ":"))
+
+
+def filtrar(mensaje: dict, filtro: Optional[FrozenSet[str]]) -> Optional[dict]:
+    """
+    Parte del mensaje que corresponde a un cliente suscripto a los estados de
+    'filtro', o None si no le corresponde nada. Un evento le corresponde si el
+    pedido entra a esos estados o sale de ellos (estado anterior), sin importar
+    el camino: un pedido listo que se vuelve a pedir tiene que salir de la
+    vista de entrega. Los mensajes sin estado (como el aviso de
+    resincronización) le llegan a todos.
+    """
+    if filtro is None:
+        return mensaje
+    if mensaje.get("tipo") == "lote":
+        eventos = [e for e in mensaje["eventos"] if _corresponde(e, filtro)]
+        if not eventos:
+            return None
+        if len(eventos) == len(mensaje["eventos"]):
+            return mensaje
+        return {"tipo": "lote", "seq": eventos[-1]["seq"], "eventos": eventos}
+    if "estado" in mensaje and not _corresponde(mensaje, filtro):
+        return None
+    return mensaje
+
+
+def _corresponde(evento: dict, filtro: FrozenSet[str]) -> bool:
+    return evento["estado"] in filtro or evento.get("anterior") in filtro
+
+
+def _seq_evento(mensaje: dict) -> Optional[int]:
+    """
+    Seq con el que el escritor saltea lo que ya repuso del historial. El del
+    aviso de resincronización no es un evento sino desde dónde traer los
+    cambios, así que ese aviso nunca se saltea.
+    """
+    return None if mensaje.get("tipo") == "resync" else mensaje.get("seq")
+
+
+class BroadcastHub:
+    """Difunde mensajes a todos los sockets sin que un cliente lento frene al resto"""
+
+    def __init__(self, historial: Callable[[int], Awaitable[List[dict]]] = None, max_cola: int = MAX_COLA,
+                 ping_intervalo: float = PING_INTERVALO, ping_timeout: float = PING_TIMEOUT):
+        """
+        Args:
+            historial: Corrutina que devuelve los mensajes posteriores a un seq,
+                usada para reponer lo que un cliente se perdió al reconectarse
+            max_cola: Mensajes pendientes permitidos por cliente antes de desconectarlo
+            ping_intervalo: Segundos entre pings a los clientes con latido
+            ping_timeout: Segundos sin recibir nada tras los cuales se desconecta
+                a un cliente, tenga latido o no
+        """
+        self.historial = historial
+        self.max_cola = max_cola
+        self.ping_intervalo = ping_intervalo
+        self.ping_timeout = ping_timeout
+        self.clientes: Set[Cliente] = set()
+        self.descartados = 0
+        self.inactivos = 0
+        self.publicados = 0
+        self.mensajes_descartados = 0
+        self._latido: Optional[asyncio.Task] = None
+
+    def iniciar(self) -> None:
+        """Arranca la tarea que envía los pings y desconecta a los clientes muertos"""
+        self._latido = asyncio.create_task(self._bucle_latido())
+
+    def conectar(self, websocket: WebSocket, since: Optional[int] = None,
+                 filtro: Optional[FrozenSet[str]] = None, formato: Optional[str] = None,
+                 latido: bool = False) -> Cliente:
+        """
+        Registra un socket ya aceptado y arranca su tarea escritora.
+
+        Args:
+            websocket: Socket aceptado
+            since: Último seq aplicado por el cliente; se le reenvía lo posterior
+            filtro: Estados de los eventos que recibe el cliente; None para todos
+            formato: "msgpack" para el formato compacto; None para JSON
+            latido: El cliente quiere recibir pings para tener algo que responder
+        """
+        cliente = Cliente(websocket, self.max_cola, since, filtro, formato, latido)
+        cliente.tarea = asyncio.create_task(self._escritor(cliente))
+        self.clientes.add(cliente)
+        return cliente
+
+    def desconectar(self, cliente: Cliente) -> None:
+        """Quita el cliente y detiene su tarea escritora"""
+        if cliente in self.clientes:
+            self.clientes.remove(cliente)
+            cliente.tarea.cancel()
+
+    def publicar(self, mensaje: dict) -> None:
+        """Encola el mensaje para los clientes interesados sin esperar los envíos"""
+        self.publicados += 1
+        # Se serializa una vez por suscripción y formato distintos, no por cliente
+        salientes: Dict[tuple, Optional[Tuple[Optional[int], Union[str, bytes]]]] = {}
+        for cliente in list(self.clientes):
+            clave = (cliente.filtro, cliente.formato)
+            if clave not in salientes:
+                parte = filtrar(mensaje, cliente.filtro)
+                salientes[clave] = (_seq_evento(parte), serializar(parte, cliente.formato)) if parte else None
+            saliente = salientes[clave]
+            if saliente is None:
+                continue
+            try:
+                cliente.cola.put_nowait(saliente)
+            except asyncio.QueueFull:
+                self._descartar(cliente)
+
+    def _descartar(self, cliente: Cliente) -> None:
+        """Desconecta un cliente que no consume sus mensajes a tiempo"""
+        print(f"⚠️ Cliente WebSocket lento desconectado ({cliente.cola.qsize()} mensajes pendientes)")
+        self.descartados += 1
+        # Lo pendiente más el mensaje que ya no entró
+        self.mensajes_descartados += cliente.cola.qsize() + 1
+        self.desconectar(cliente)
+        asyncio.create_task(self._cerrar(cliente.websocket, CIERRE_CLIENTE_LENTO))
+
+    async def _cerrar(self, websocket: WebSocket, codigo: int) -> None:
+        try:
+            await asyncio.wait_for(websocket.close(code=codigo), TIMEOUT_CIERRE)
+        except Exception:
+            pass
+
+    def latir(self) -> None:
+        """
+        Desconecta a los clientes que no enviaron nada a tiempo y encola un
+        ping para los que siguen y lo pidieron. El ping pasa por la cola como
+        cualquier mensaje: si no entra, el cliente además es lento.
+        """
+        limite = time.monotonic() - self.ping_timeout
+        pings: Dict[Optional[str], Tuple[None, Union[str, bytes]]] = {}
+        for cliente in list(self.clientes):
+            if cliente.actividad < limite:
+                print(f"⚠️ Cliente WebSocket sin respuesta hace más de {self.ping_timeout:.0f} s, desconectado")
+                self.inactivos += 1
+                self.desconectar(cliente)
+                asyncio.create_task(self._cerrar(cliente.websocket, CIERRE_SIN_RESPUESTA))
+                continue
+            if not cliente.latido:
+                continue
+            if cliente.formato not in pings:
+                pings[cliente.formato] = (None, serializar({"tipo": "ping"}, cliente.formato))
+            try:
+                cliente.cola.put_nowait(pings[cliente.formato])
+            except asyncio.QueueFull:
+                self._descartar(cliente)
+
+    async def _bucle_latido(self) -> None:
+        while True:
+            await asyncio.sleep(self.ping_intervalo)
+            self.latir()
+
+    async def _escritor(self, cliente: Cliente) -> None:
+        """Reenvía lo que el cliente se perdió y luego los mensajes encolados, en orden"""
+        try:
+            # El cliente ya está registrado, así que nada publicado después
+            # de leer el historial se pierde: lo ya repuesto se salta por seq.
+            ultimo = 0
+            if cliente.since is not None and self.historial:
+                for mensaje in await self.historial(cliente.since):
+                    ultimo = mensaje["seq"]
+                    if filtrar(mensaje, cliente.filtro) is not None:
+                        await cliente.enviar(serializar(mensaje, cliente.formato))
+            while True:
+                seq, datos = await cliente.cola.get()
+                if seq is not None and seq <= ultimo:
+                    continue
+                await cliente.enviar(datos)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.clientes.discard(cliente)
+
+    def profundidad_colas(self) -> Tuple[int, int]:
+        """Mensajes pendientes (total, máximo por cliente) en las colas de salida"""
+        tamanios = [cliente.cola.qsize() for cliente in self.clientes]
+        return sum(tamanios), max(tamanios, default=0)
+
+    async def cerrar(self) -> None:
+        """Detiene el latido y todas las tareas escritoras"""
+        if self._latido:
+            self._latido.cancel()
+        for cliente in list(self.clientes):
+            self.desconectar(cliente)
@@ -0,0 +1,171 @@
+"""
+Bus de eventos entre los workers de un mismo servidor.
+
+Con uvicorn en varios procesos (WEB_CONCURRENCY=4 o --workers 4) cada worker tiene sus
+propios sockets, su caché y su hub: un PUT atendido por un worker no llega
+por sí solo a los sockets de otro. La base ya es un log ordenado de todo lo
+que escriben los workers (la tabla eventos, numerada por seq), así que hace
+de bus sin servicios externos: cada worker lee los eventos nuevos en orden
+de seq, los aplica a su caché y los difunde a sus sockets. Como todos leen
+el mismo log en el mismo orden, ningún cliente recibe un evento viejo
+después de uno más nuevo, sin importar qué worker hizo cada escritura.
+
+Para no consultar el log sin necesidad se mira PRAGMA data_version, que
+cambia cuando otra conexión (de este o de otro proceso) confirma una
+escritura. Las escrituras propias despiertan al lector en el acto; las de
+otros workers se ven a más tardar en BUS_INTERVALO segundos.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+from typing import Callable, List, Optional, Tuple
+
+import db
+from repositorio import RepositorioSQLite
+
+
+def _workers_de_uvicorn(argv: List[str]) -> Optional[int]:
+    """
+    Valor de --workers si el proceso es de 'uvicorn ... --workers N'. Los
+    workers arrancan con multiprocessing (spawn), que les copia el sys.argv
+    del proceso principal, pero la opción no llega a WEB_CONCURRENCY.
+    """
+    programa = argv[0].replace("\\", "/") if argv else ""
+    if not (os.path.basename(programa).startswith("uvicorn") or programa.endswith("uvicorn/__main__.py")):
+        return None
+    for i, arg in enumerate(argv):
+        if arg == "--workers" and i + 1 < len(argv):
+            valor = argv[i + 1]
+        elif arg.startswith("--workers="):
+            valor = arg.split("=", 1)[1]
+        else:
+            continue
+        return int(valor) if valor.isdigit() else None
+    return None
+
+
+# Procesos que levanta uvicorn; con más de uno las sucursales usan el bus.
+# Como en uvicorn, --workers tiene prioridad sobre WEB_CONCURRENCY.
+WORKERS = _workers_de_uvicorn(sys.argv) or int(os.environ.get("WEB_CONCURRENCY", "1"))
+BUS_INTERVALO = float(os.environ.get("BUS_INTERVALO", "0.02"))
+# Eventos leídos por consulta
+BUS_LOTE = 1000
+# Con más eventos nuevos que esto en una pasada (una carga masiva) se
+# difunde un aviso de resincronización en vez de los eventos
+MAX_DIFUSION = db.MAX_REPLAY
+
+# (id, pieza, guarda, estado, seq, estado anterior o None si el pedido es nuevo)
+Evento = Tuple[Optional[int], str, str, str, int, Optional[str]]
+
+
+class BusEventos:
+    """Lee en orden de seq lo que escriben todos los workers en la base de una sucursal"""
+
+    def __init__(self, repo: RepositorioSQLite, seq: int, aplicar: Callable[[List[Evento], bool], None],
+                 publicar: Callable[[dict], None], intervalo: float = BUS_INTERVALO):
+        """
+        Args:
+            repo: Repositorio de la sucursal, sobre la base que comparten los workers
+            seq: Último evento ya reflejado en la caché
+            aplicar: Refleja eventos (id, pieza, guarda, estado, seq, anterior) en la caché
+                y, si el segundo argumento es verdadero, los difunde
+            publicar: Difunde un mensaje a los sockets de este worker
+            intervalo: Segundos entre consultas de PRAGMA data_version
+        """
+        self.repo = repo
+        self.seq = seq
+        self.aplicar = aplicar
+        self.publicar = publicar
+        self.intervalo = intervalo
+        # Cambios en la base que no agregaron eventos: pasadas del archivador
+        # de cualquier worker. Sirve para invalidar los ETag fuera de la caché.
+        self.cambios_sin_eventos = 0
+        # Conexión propia: data_version solo detecta lo que confirman las demás
+        self._conn = sqlite3.connect(repo.pool.path, check_same_thread=False)
+        self._data_version = self._version()
+        self._despertar: Optional[asyncio.Event] = None
+        self._avance: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+
+    def _version(self) -> int:
+        # Lee el encabezado del WAL en memoria compartida: no toca el disco
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def iniciar(self) -> None:
+        self._despertar = asyncio.Event()
+        self._avance = asyncio.Event()
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def alcanzar(self, seq: int) -> None:
+        """Espera a que los eventos hasta 'seq' estén en la caché y difundidos"""
+        while self.seq < seq:
+            avance = self._avance
+            self._despertar.set()
+            await avance.wait()
+
+    async def sincronizar(self) -> None:
+        """Si otra conexión confirmó algo que todavía no se leyó, espera a que se aplique"""
+        while self._version() != self._data_version:
+            avance = self._avance
+            self._despertar.set()
+            await avance.wait()
+
+    async def _bucle(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._despertar.wait(), self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            despertado = self._despertar.is_set()
+            self._despertar.clear()
+            try:
+                version = self._version()
+                if despertado or version != self._data_version:
+                    if not await self.leer() and not despertado:
+                        self.cambios_sin_eventos += 1
+                    # Todo lo confirmado hasta 'version' ya está aplicado
+                    self._data_version = version
+            except Exception as e:
+                print(f"❌ Error al leer el bus de eventos: {e}")
+                await asyncio.sleep(self.intervalo)
+            finally:
+                # Los que esperan en alcanzar() o sincronizar() vuelven a mirar
+                avance, self._avance = self._avance, asyncio.Event()
+                avance.set()
+
+    async def leer(self) -> int:
+        """Aplica y difunde los eventos posteriores al último leído; devuelve cuántos había"""
+        cursor = self.seq
+        pendientes: List[Evento] = []
+        total = 0
+        while True:
+            eventos = await self.repo.eventos_posteriores(cursor, BUS_LOTE)
+            if not eventos:
+                break
+            cursor = eventos[-1][4]
+            total += len(eventos)
+            if total > MAX_DIFUSION:
+                # Carga masiva: a la caché por partes, sin difundir
+                self.aplicar(pendientes + eventos, False)
+                pendientes = []
+            else:
+                pendientes.extend(eventos)
+            if len(eventos) < BUS_LOTE:
+                break
+        if total > MAX_DIFUSION:
+            # Cada cliente trae lo modificado desde su último seq
+            self.publicar({"tipo": "resync", "seq": self.seq})
+        elif pendientes:
+            self.aplicar(pendientes, True)
+        self.seq = cursor
+        return total
+
+    async def cerrar(self) -> None:
+        if self._tarea:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._conn.close()
@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class PedidoCache(NamedTuple):
+    id: int
+    pieza: str
+    guarda: str
+    estado: str
+    version: int
+
+
+class CachePedidos:
+    """Índice en memoria de los pedidos activos, por pieza y agrupados por estado"""
+
+    def __init__(self, estados_activos: Iterable[str]):
+        """
+        Args:
+            estados_activos: Estados que se mantienen en memoria; los demás
+                (historial) solo se leen de la base
+        """
+        self.estados_activos = set(estados_activos)
+        self._por_pieza: Dict[str, PedidoCache] = {}
+        self._por_estado: Dict[str, Dict[str, PedidoCache]] = {e: {} for e in self.estados_activos}
+        # Último evento que agregó o quitó un pedido de cada estado
+        self._cambios: Dict[str, int] = {e: 0 for e in self.estados_activos}
+        self.seq = 0
+        self.hits = 0
+        self.misses = 0
+
+    def cargar(self, seq: int, filas: List[Tuple[int, str, str, str, int]]) -> None:
+        """Reconstruye la caché con las filas (id, pieza, guarda, estado, version) de la base"""
+        self._por_pieza.clear()
+        for bucket in self._por_estado.values():
+            bucket.clear()
+        for fila in filas:
+            self.aplicar(*fila)
+        self.seq = seq
+        for estado in self._cambios:
+            self._cambios[estado] = seq
+
+    def aplicar(self, id: int, pieza: str, guarda: str, estado: str, version: int) -> None:
+        """Refleja una escritura ya confirmada en la base"""
+        anterior = self._por_pieza.pop(pieza, None)
+        if anterior is not None:
+            del self._por_estado[anterior.estado][pieza]
+            self._cambios[anterior.estado] = version
+        if estado in self.estados_activos:
+            pedido = PedidoCache(id, pieza, guarda, estado, version)
+            self._por_pieza[pieza] = pedido
+            self._por_estado[estado][pieza] = pedido
+            self._cambios[estado] = version
+        self.seq = max(self.seq, version)
+
+    def listar(self, estados: Optional[List[str]]) -> Optional[List[PedidoCache]]:
+        """
+        Pedidos en 'estados' ordenados por id, o None si alguno de los
+        estados pedidos no está en memoria y hay que ir a la base.
+        """
+        if not estados or not self.estados_activos.issuperset(estados):
+            self.misses += 1
+            return None
+        self.hits += 1
+        pedidos = [p for estado in set(estados) for p in self._por_estado[estado].values()]
+        pedidos.sort(key=lambda p: p.id)
+        return pedidos
+
+    def version(self, estados: Optional[List[str]]) -> Optional[int]:
+        """
+        Último evento que modificó el listado de 'estados', o None si alguno
+        no está en memoria. No cambia mientras no cambien esos pedidos, así
+        que sirve como ETag por filtro.
+        """
+        if not estados or not self.estados_activos.issuperset(estados):
+            return None
+        return max(self._cambios[estado] for estado in estados)
+
+    def estadisticas(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "pedidos": len(self._por_pieza),
+            "por_estado": {estado: len(bucket) for estado, bucket in self._por_estado.items()},
+            "seq": self.seq,
+        }
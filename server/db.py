@@ -0,0 +1,520 @@
+import asyncio
+import functools
+import json
+import os
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+import estados as maquina
+from migrations import AHORA_SQL
+
+T = TypeVar("T")
+
+DB_PATH = os.environ.get("DB_PATH", "database.db")
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+MAX_REPLAY = int(os.environ.get("WS_MAX_REPLAY", "1000"))
+
+
+class ConnectionPool:
+    """Pool de conexiones SQLite de larga duración"""
+
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE):
+        """
+        Inicializa el pool abriendo todas las conexiones.
+
+        Las lecturas usan cualquiera de las 'size' conexiones, desde hilos
+        propios del pool: si una base se satura, sus lecturas esperan acá y no
+        ocupan los hilos compartidos que usan las demás. Las escrituras
+        pasan todas por una conexión propia en un único hilo: SQLite admite un
+        solo escritor a la vez, y así los commits terminan (y se difunden) en
+        el mismo orden en que se numeraron los eventos.
+
+        Args:
+            path: Ruta del archivo de base de datos
+            size: Cantidad de conexiones de lectura abiertas en simultáneo
+        """
+        self.path = path
+        self.size = size
+        self._conexiones: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._conexiones.put(self._connect())
+        self._lectores = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite-lector")
+        self._escritura = self._connect()
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-escritor")
+        # Callback opcional (consulta, segundos) para medir el tiempo de cada consulta
+        self.observador: Optional[Callable[[str, float], None]] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre una conexión configurada para uso concurrente"""
+        # cached_statements: sqlite3 reutiliza la sentencia compilada mientras
+        # el texto SQL sea el mismo, así que las consultas de este módulo
+        # quedan preparadas durante toda la vida de la conexión.
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def conexion(self):
+        """Toma una conexión del pool y la devuelve al terminar"""
+        conn = self._conexiones.get()
+        try:
+            yield conn
+        finally:
+            self._conexiones.put(conn)
+
+    def ejecutar(self, fn: Callable[..., T], *args) -> T:
+        """Ejecuta fn(conn, *args) con una conexión del pool"""
+        with self.conexion() as conn:
+            return self._medir(fn, conn, *args)
+
+    def _medir(self, fn: Callable[..., T], conn: sqlite3.Connection, *args) -> T:
+        if self.observador is None:
+            return fn(conn, *args)
+        inicio = time.perf_counter()
+        try:
+            return fn(conn, *args)
+        finally:
+            self.observador(fn.__name__, time.perf_counter() - inicio)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Ejecuta la lectura fn(conn, *args) fuera del event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._lectores, functools.partial(self.ejecutar, fn, *args))
+
+    async def escribir(self, fn: Callable[..., T], *args) -> T:
+        """
+        Ejecuta la escritura fn(conn, *args) en el hilo escritor.
+
+        Los awaits se reanudan en orden de commit: quien publique el resultado
+        sin hacer otro await antes respeta el orden de los seq.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._escritor, functools.partial(self._medir, fn, self._escritura, *args))
+
+    def close(self) -> None:
+        """Cierra todas las conexiones del pool"""
+        self._lectores.shutdown()
+        self._escritor.shutdown()
+        self._escritura.close()
+        for _ in range(self.size):
+            self._conexiones.get().close()
+
+
+class Transicion(NamedTuple):
+    """
+    Resultado de un cambio de estado condicional.
+
+    ok=True: guarda, estado nuevo y versión (seq) de la fila actualizada.
+    ok=False: estado y versión actuales si hubo conflicto, o None si la
+    pieza no existe.
+    """
+    ok: bool
+    guarda: Optional[str] = None
+    estado: Optional[str] = None
+    version: Optional[int] = None
+    id: Optional[int] = None
+    # Estado del que salió el pedido (solo con ok=True)
+    anterior: Optional[str] = None
+
+
+# Próximo seq del log de eventos, para fijar la versión en el mismo UPDATE
+PROXIMO_SEQ_SQL = "(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'eventos'), 0) + 1)"
+
+
+# Consultas
+def _registrar_evento(conn: sqlite3.Connection, pieza: str, guarda: str, estado: str,
+                      anterior: Optional[str], seq: Optional[int] = None) -> int:
+    """Agrega el cambio (y el estado del que sale, si el pedido existía) al log de eventos y devuelve su seq"""
+    cursor = conn.execute(
+        "INSERT INTO eventos (seq, pieza, guarda, estado, estado_anterior, creado_en)"
+        f" VALUES (?, ?, ?, ?, ?, {AHORA_SQL})",
+        (seq, pieza, guarda, estado, anterior)
+    )
+    return cursor.lastrowid
+
+
+def _registrar_transicion(conn: sqlite3.Connection, pieza: str, anterior: Optional[Tuple[str, str]],
+                          estado: str, sector: Optional[str], creado_en: str) -> None:
+    """Agrega el cambio al historial; 'anterior' es (estado, desde cuándo) o None si el pedido es nuevo"""
+    estado_anterior, desde = anterior or (None, None)
+    conn.execute(
+        "INSERT INTO pedido_eventos (pieza, estado_anterior, estado, sector, desde, creado_en) VALUES (?, ?, ?, ?, ?, ?)",
+        (pieza, estado_anterior, estado, sector, desde, creado_en)
+    )
+
+
+def _estado_actual(conn: sqlite3.Connection, pieza: str) -> Optional[Tuple[str, str]]:
+    # actualizado_en solo cambia con el estado: es cuándo entró al estado actual.
+    # Las escrituras abren la transacción con BEGIN IMMEDIATE, así que esto se
+    # lee con el lock tomado aunque otro worker escriba en la misma base.
+    return conn.execute("SELECT estado, actualizado_en FROM pedidos WHERE pieza = ?", (pieza,)).fetchone()
+
+
+def _insertar(conn: sqlite3.Connection, pieza: str, guarda: str, estado: str,
+              sector: Optional[str] = None) -> Tuple[int, int, Optional[str]]:
+    anterior = _estado_actual(conn, pieza)
+    estado_anterior = anterior[0] if anterior else None
+    seq = _registrar_evento(conn, pieza, guarda, estado, estado_anterior)
+    row = conn.execute(f'''
+        INSERT INTO pedidos (pieza, guarda, estado, version, creado_en, actualizado_en)
+        VALUES (?, ?, ?, ?, {AHORA_SQL}, {AHORA_SQL})
+        ON CONFLICT (pieza) DO UPDATE SET
+            guarda = excluded.guarda,
+            estado = excluded.estado,
+            version = excluded.version,
+            actualizado_en = excluded.actualizado_en
+        RETURNING id, actualizado_en
+    ''', (pieza, guarda, estado, seq)).fetchone()
+    _registrar_transicion(conn, pieza, anterior, estado, sector, row[1])
+    return row[0], seq, estado_anterior
+
+
+def _actualizar(conn: sqlite3.Connection, pieza: str, estado: str, esperado: Optional[str],
+                sector: Optional[str] = None) -> Transicion:
+    # Un solo UPDATE condicional: si otro cliente cambió el estado antes, no
+    # afecta ninguna fila y no se registra ni difunde nada.
+    anterior = _estado_actual(conn, pieza)
+    if anterior is None:
+        return Transicion(False)
+    esperados = [esperado] if esperado else maquina.origenes(estado)
+    placeholders = ",".join("?" * len(esperados))
+    row = conn.execute(f'''
+        UPDATE pedidos SET estado = ?, version = {PROXIMO_SEQ_SQL}, actualizado_en = {AHORA_SQL}
+        WHERE pieza = ? AND estado IN ({placeholders})
+        RETURNING guarda, version, id, actualizado_en
+    ''', (estado, pieza, *esperados)).fetchone()
+    if row is not None:
+        guarda, version, id, actualizado_en = row
+        _registrar_evento(conn, pieza, guarda, estado, anterior[0], version)
+        _registrar_transicion(conn, pieza, anterior, estado, sector, actualizado_en)
+        return Transicion(True, guarda, estado, version, id, anterior[0])
+
+    actual = conn.execute("SELECT guarda, estado, version, id FROM pedidos WHERE pieza = ?", (pieza,)).fetchone()
+    if actual is None:
+        return Transicion(False)
+    return Transicion(False, *actual)
+
+
+def insertar_pedido(conn: sqlite3.Connection, pieza: str, guarda: str, estado: str,
+                    sector: Optional[str] = None) -> Tuple[int, int, Optional[str]]:
+    """
+    Inserta el pedido; si la pieza ya existía se vuelve a pedir con la nueva guarda.
+    'sector' es el que hizo el cambio, para el historial de transiciones.
+
+    Returns:
+        (id, seq, anterior): id de la fila, número de secuencia del evento
+        (que pasa a ser la versión de la fila) y estado que tenía la pieza,
+        o None si es nueva
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return _insertar(conn, pieza, guarda, estado, sector)
+
+
+def actualizar_estado(conn: sqlite3.Connection, pieza: str, estado: str,
+                      esperado: Optional[str] = None, sector: Optional[str] = None) -> Transicion:
+    """
+    Cambia el estado solo si el actual es 'esperado' (o, sin él, cualquier
+    estado desde el que la transición sea válida).
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return _actualizar(conn, pieza, estado, esperado, sector)
+
+
+def insertar_pedidos(conn: sqlite3.Connection, pedidos: List[Tuple[str, str]], estado: str,
+                     sector: Optional[str] = None) -> List[Tuple[int, int, Optional[str]]]:
+    """Inserta varios pedidos (pieza, guarda) en una sola transacción y devuelve sus (id, seq, anterior)"""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return [_insertar(conn, pieza, guarda, estado, sector) for pieza, guarda in pedidos]
+
+
+def actualizar_estados(conn: sqlite3.Connection, cambios: List[Tuple[str, str, Optional[str]]],
+                       sector: Optional[str] = None) -> List[Transicion]:
+    """Aplica varios cambios (pieza, estado, esperado) en una sola transacción"""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return [_actualizar(conn, pieza, estado, esperado, sector) for pieza, estado, esperado in cambios]
+
+
+def _estados_de(conn: sqlite3.Connection, piezas: List[str]) -> Dict[str, str]:
+    """Estado actual de las piezas que ya existen (un solo parámetro, sin importar cuántas sean)"""
+    return dict(conn.execute(
+        "SELECT pieza, estado FROM pedidos WHERE pieza IN (SELECT value FROM json_each(?))",
+        (json.dumps(piezas),)
+    ))
+
+
+def importar_pedidos(conn: sqlite3.Connection, filas: List[Tuple[str, str, str]]
+                     ) -> Tuple[List[Tuple[int, str, str, str, int]], List[Tuple[str, str]]]:
+    """
+    Carga masiva: inserta las filas (pieza, guarda, estado) con executemany
+    en una sola transacción, con un evento numerado por fila, igual que
+    insertar_pedido. Una pieza repetida en el lote queda con su última fila.
+
+    La carga no cambia estados: si la pieza ya existe en otro estado, la
+    fila se rechaza (ese cambio va por actualizar_estado, que valida la
+    transición y lo deja en el historial); si está en el mismo, solo se
+    actualiza la guarda.
+
+    Returns:
+        (filas, rechazadas): filas (id, pieza, guarda, estado, version)
+        resultantes, para la caché, y (pieza, estado actual) de las rechazadas
+    """
+    unicas = {pieza: (guarda, estado) for pieza, guarda, estado in filas}
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        actuales = _estados_de(conn, list(unicas))
+        rechazadas = [(pieza, actuales[pieza]) for pieza, (_, estado) in unicas.items()
+                      if actuales.get(pieza, estado) != estado]
+        aceptadas = [(pieza, guarda, estado) for pieza, (guarda, estado) in unicas.items()
+                     if actuales.get(pieza, estado) == estado]
+        base = ultimo_seq(conn)
+        versionadas = [(pieza, guarda, estado, base + i, actuales.get(pieza))
+                       for i, (pieza, guarda, estado) in enumerate(aceptadas, start=1)]
+        conn.executemany(
+            "INSERT INTO eventos (pieza, guarda, estado, seq, estado_anterior, creado_en)"
+            f" VALUES (?, ?, ?, ?, ?, {AHORA_SQL})",
+            versionadas
+        )
+        # Si la pieza existía, el estado es el mismo: actualizado_en sigue
+        # marcando desde cuándo está en él
+        conn.executemany(f'''
+            INSERT INTO pedidos (pieza, guarda, estado, version, creado_en, actualizado_en)
+            VALUES (?, ?, ?, ?, {AHORA_SQL}, {AHORA_SQL})
+            ON CONFLICT (pieza) DO UPDATE SET
+                guarda = excluded.guarda,
+                version = excluded.version
+        ''', [fila[:4] for fila in versionadas])
+        importadas = conn.execute(
+            "SELECT id, pieza, guarda, estado, version FROM pedidos WHERE version > ? ORDER BY version",
+            (base,)
+        ).fetchall()
+    return importadas, rechazadas
+
+
+def ultimo_seq(conn: sqlite3.Connection) -> int:
+    # sqlite_sequence conserva el último seq aunque el archivador recorte el log
+    return conn.execute(f"SELECT {PROXIMO_SEQ_SQL} - 1").fetchone()[0]
+
+
+def pedidos_en_estados(conn: sqlite3.Connection, estados: List[str]) -> Tuple[int, List[Tuple[int, str, str, str, int]]]:
+    """Devuelve (seq, filas (id, pieza, guarda, estado, version)) para cargar la caché"""
+    conn.execute("BEGIN")
+    try:
+        seq = ultimo_seq(conn)
+        placeholders = ",".join("?" * len(estados))
+        rows = conn.execute(
+            f"SELECT id, pieza, guarda, estado, version FROM pedidos WHERE estado IN ({placeholders})",
+            estados
+        ).fetchall()
+    finally:
+        conn.commit()
+    return seq, rows
+
+
+def obtener_pedidos(conn: sqlite3.Connection, estados: Optional[List[str]] = None) -> Tuple[int, List[Tuple[str, str, str]]]:
+    """Devuelve (seq, filas) leídos de la misma instantánea de la base"""
+    conn.execute("BEGIN")
+    try:
+        seq = ultimo_seq(conn)
+        if estados:
+            placeholders = ",".join("?" * len(estados))
+            rows = conn.execute(
+                f"SELECT pieza, guarda, estado FROM pedidos WHERE estado IN ({placeholders})",
+                estados
+            ).fetchall()
+        else:
+            rows = conn.execute("SELECT pieza, guarda, estado FROM pedidos").fetchall()
+    finally:
+        conn.commit()
+    return seq, rows
+
+
+def cambios_pedidos(conn: sqlite3.Connection, since: Optional[int], estados: Optional[List[str]],
+                    cursor: int, limite: int) -> Tuple[int, List[Tuple[int, str, str, str, int]]]:
+    """
+    Página de pedidos para la sincronización incremental de los clientes.
+
+    Sin 'since' (arranque en frío) devuelve los pedidos en 'estados' ordenados
+    por id; con 'since' devuelve los pedidos de cualquier estado cuya versión
+    sea mayor, ordenados por versión. En ambos casos 'cursor' es el último id
+    o versión de la página anterior.
+
+    Returns:
+        (seq actual, filas (id, pieza, guarda, estado, version)); se piden
+        limite + 1 filas para saber si hay otra página
+    """
+    conn.execute("BEGIN")
+    try:
+        seq = ultimo_seq(conn)
+        if since is not None:
+            # Incluye el archivo: un cliente desconectado desde antes del
+            # archivado también tiene que enterarse de esos cierres
+            desde = max(since, cursor)
+            rows = conn.execute(
+                "SELECT id, pieza, guarda, estado, version FROM pedidos WHERE version > ?"
+                " UNION ALL"
+                " SELECT id, pieza, guarda, estado, version FROM pedidos_archivo WHERE version > ?"
+                " ORDER BY version LIMIT ?",
+                (desde, desde, limite + 1)
+            ).fetchall()
+        elif estados:
+            placeholders = ",".join("?" * len(estados))
+            rows = conn.execute(
+                "SELECT id, pieza, guarda, estado, version FROM pedidos"
+                f" WHERE estado IN ({placeholders}) AND id > ? ORDER BY id LIMIT ?",
+                (*estados, cursor, limite + 1)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT id, pieza, guarda, estado, version FROM pedidos"
+                " WHERE id > ? ORDER BY id LIMIT ?",
+                (cursor, limite + 1)
+            ).fetchall()
+    finally:
+        conn.commit()
+    return seq, rows
+
+
+def archivar_pedidos(conn: sqlite3.Connection, estados: List[str], antes_de: str, lote: int) -> int:
+    """
+    Mueve a pedidos_archivo hasta 'lote' pedidos en 'estados' sin cambios
+    desde 'antes_de', junto con los eventos anteriores a esa fecha.
+
+    Returns:
+        int: Cantidad de pedidos archivados
+    """
+    placeholders = ",".join("?" * len(estados))
+    seleccion = (f"SELECT id FROM pedidos WHERE estado IN ({placeholders}) AND actualizado_en < ?"
+                 " ORDER BY id LIMIT ?")
+    parametros = (*estados, antes_de, lote)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(f'''
+            INSERT INTO pedidos_archivo
+                (id, pieza, guarda, estado, version, creado_en, actualizado_en, archivado_en)
+            SELECT id, pieza, guarda, estado, version, creado_en, actualizado_en, {AHORA_SQL}
+            FROM pedidos WHERE id IN ({seleccion})
+        ''', parametros)
+        conn.execute(f"DELETE FROM pedidos WHERE id IN ({seleccion})", parametros)
+        conn.execute(
+            "DELETE FROM eventos WHERE seq IN (SELECT seq FROM eventos WHERE creado_en < ? ORDER BY seq LIMIT ?)",
+            (antes_de, lote)
+        )
+        return cursor.rowcount
+
+
+def buscar_historial(conn: sqlite3.Connection, pieza: Optional[str], guarda: Optional[str],
+                     desde: Optional[str], hasta: Optional[str], limite: int) -> List[Tuple[str, str, str, str, str]]:
+    """Busca en pedidos y en el archivo; devuelve (pieza, guarda, estado, creado_en, actualizado_en)"""
+    condiciones = []
+    parametros = []
+    for columna, operador, valor in (("pieza", "=", pieza), ("guarda", "=", guarda),
+                                     ("actualizado_en", ">=", desde), ("actualizado_en", "<", hasta)):
+        if valor is not None:
+            condiciones.append(f"{columna} {operador} ?")
+            parametros.append(valor)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    columnas = "pieza, guarda, estado, creado_en, actualizado_en"
+    return conn.execute(
+        f"SELECT {columnas} FROM pedidos {where}"
+        f" UNION ALL SELECT {columnas} FROM pedidos_archivo {where}"
+        " ORDER BY actualizado_en DESC LIMIT ?",
+        (*parametros, *parametros, limite)
+    ).fetchall()
+
+
+def analitica(conn: sqlite3.Connection, desde: str, hasta: str, percentiles: Tuple[float, ...]
+              ) -> Tuple[List[tuple], List[Tuple[str, str, int]]]:
+    """
+    Agregados del historial de transiciones entre 'desde' y 'hasta', leídos
+    del índice idx_pedido_eventos_creado.
+
+    Returns:
+        (etapas, por_hora): etapas son (estado_anterior, estado, cantidad,
+        promedio, máximo, *percentiles) con los segundos que los pedidos
+        pasaron en el estado anterior; por_hora son (hora, estado, cantidad)
+    """
+    # Percentil por el método del rango más cercano: el primer valor cuyo
+    # número de orden alcanza p * cantidad
+    columnas = ", ".join(f"MIN(CASE WHEN n >= {p!r} * cantidad THEN segundos END)" for p in percentiles)
+    conn.execute("BEGIN")
+    try:
+        etapas = conn.execute(f'''
+            WITH esperas AS (
+                SELECT estado_anterior, estado,
+                       (julianday(creado_en) - julianday(desde)) * 86400.0 AS segundos
+                FROM pedido_eventos
+                WHERE creado_en >= ? AND creado_en < ? AND desde IS NOT NULL
+            ), ordenadas AS (
+                SELECT estado_anterior, estado, segundos,
+                       ROW_NUMBER() OVER (PARTITION BY estado_anterior, estado ORDER BY segundos) AS n,
+                       COUNT(*) OVER (PARTITION BY estado_anterior, estado) AS cantidad
+                FROM esperas
+            )
+            SELECT estado_anterior, estado, cantidad, AVG(segundos), MAX(segundos), {columnas}
+            FROM ordenadas
+            GROUP BY estado_anterior, estado
+            ORDER BY cantidad DESC
+        ''', (desde, hasta)).fetchall()
+        por_hora = conn.execute('''
+            SELECT substr(creado_en, 1, 13) AS hora, estado, COUNT(*)
+            FROM pedido_eventos
+            WHERE creado_en >= ? AND creado_en < ?
+            GROUP BY hora, estado
+            ORDER BY hora
+        ''', (desde, hasta)).fetchall()
+    finally:
+        conn.commit()
+    return etapas, por_hora
+
+
+def eventos_desde(conn: sqlite3.Connection, since: int,
+                  limite: int = MAX_REPLAY) -> Tuple[int, Optional[List[Tuple[int, str, str, str, Optional[str]]]]]:
+    """
+    Obtiene los eventos posteriores a 'since' para reenviarlos a un cliente.
+
+    Returns:
+        (seq actual, eventos (seq, pieza, guarda, estado, anterior)). eventos
+        es None si el hueco no se puede reponer (demasiados eventos, log
+        recortado o base reiniciada) y el cliente debe recargar el estado completo.
+    """
+    conn.execute("BEGIN")
+    try:
+        maximo = ultimo_seq(conn)
+        minimo = conn.execute("SELECT MIN(seq) FROM eventos").fetchone()[0]
+        if minimo is None:
+            minimo = maximo + 1
+        if since > maximo or since < minimo - 1:
+            return maximo, None
+        rows = conn.execute(
+            "SELECT seq, pieza, guarda, estado, estado_anterior FROM eventos WHERE seq > ? ORDER BY seq LIMIT ?",
+            (since, limite + 1)
+        ).fetchall()
+    finally:
+        conn.commit()
+    if len(rows) > limite:
+        return maximo, None
+    return maximo, rows
+
+
+def eventos_posteriores(conn: sqlite3.Connection, since: int,
+                        limite: int) -> List[Tuple[Optional[int], str, str, str, int, Optional[str]]]:
+    """
+    Eventos posteriores a 'since' como filas (id, pieza, guarda, estado, seq,
+    anterior) para la caché, en orden de seq. id es None si el pedido ya se archivó.
+    """
+    return conn.execute(
+        "SELECT p.id, e.pieza, e.guarda, e.estado, e.seq, e.estado_anterior FROM eventos e"
+        " LEFT JOIN pedidos p ON p.pieza = e.pieza"
+        " WHERE e.seq > ? ORDER BY e.seq LIMIT ?",
+        (since, limite)
+    ).fetchall()
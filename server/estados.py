@@ -0,0 +1,50 @@
+from typing import Dict, List
+
+PEDIDO_AL_DEPOSITO = "Pedido al Deposito"
+LISTO_PARA_ENTREGAR = "Listo para ser Entregado"
+ENTREGADO_AL_CLIENTE = "Entregado al Cliente"
+NO_ENTREGADO = "No Entregado"
+EN_DEPOSITO = "En Deposito"
+
+ESTADOS_VALIDOS = [
+    PEDIDO_AL_DEPOSITO,
+    LISTO_PARA_ENTREGAR,
+    ENTREGADO_AL_CLIENTE,
+    NO_ENTREGADO,
+    EN_DEPOSITO
+]
+
+# Estado con el que entra todo pedido (también al volver a pedirse una pieza)
+ESTADO_INICIAL = PEDIDO_AL_DEPOSITO
+
+# Transiciones permitidas: estado actual -> estados a los que puede pasar
+TRANSICIONES: Dict[str, List[str]] = {
+    PEDIDO_AL_DEPOSITO: [LISTO_PARA_ENTREGAR],                 # Depósito lo prepara
+    LISTO_PARA_ENTREGAR: [ENTREGADO_AL_CLIENTE, NO_ENTREGADO],  # Entrega lo resuelve
+    NO_ENTREGADO: [EN_DEPOSITO],                               # Depósito lo guarda
+    ENTREGADO_AL_CLIENTE: [],
+    EN_DEPOSITO: [],
+}
+
+
+def es_transicion_valida(actual: str, nuevo: str) -> bool:
+    """Verifica si un pedido puede pasar de 'actual' a 'nuevo'"""
+    return nuevo in TRANSICIONES.get(actual, [])
+
+
+def origenes(nuevo: str) -> List[str]:
+    """Estados desde los que se puede llegar a 'nuevo'"""
+    return [actual for actual, destinos in TRANSICIONES.items() if nuevo in destinos]
+
+
+# Estados en los que un pedido sigue en circulación y algún sector lo muestra
+ESTADOS_ACTIVOS = [PEDIDO_AL_DEPOSITO, LISTO_PARA_ENTREGAR, NO_ENTREGADO]
+
+# Estados finales: el pedido ya no cambia y con el tiempo pasa al archivo
+ESTADOS_FINALES = [ENTREGADO_AL_CLIENTE, EN_DEPOSITO]
+
+# Estados que muestra cada sector; un cliente se suscribe con ?sector=
+SECTORES: Dict[str, List[str]] = {
+    "deposito": [PEDIDO_AL_DEPOSITO, NO_ENTREGADO],
+    "entrega": [LISTO_PARA_ENTREGAR],
+}
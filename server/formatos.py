@@ -0,0 +1,66 @@
+from typing import List, Tuple
+
+import msgpack
+
+from estados import ESTADOS_VALIDOS
+
+# Formato compacto (MessagePack): los estados viajan como enteros y cada
+# mensaje lleva la versión del esquema. JSON sigue siendo el predeterminado.
+ESQUEMA = 1
+FORMATO_MSGPACK = "msgpack"
+TIPO_MSGPACK = "application/x-msgpack"
+
+# Código de cada estado: su posición en ESTADOS_VALIDOS. Solo se agregan
+# estados al final; reordenar rompe a los clientes ya instalados.
+CODIGOS = {estado: codigo for codigo, estado in enumerate(ESTADOS_VALIDOS)}
+
+# Primer elemento de cada mensaje WebSocket compacto, después del esquema
+TIPO_EVENTO = 0
+TIPO_LOTE = 1
+TIPO_RESYNC = 2
+TIPO_PING = 3
+
+
+def acepta_msgpack(accept: str) -> bool:
+    """Indica si el header Accept pide el formato compacto"""
+    return TIPO_MSGPACK in (accept or "")
+
+
+def _evento(evento: dict) -> list:
+    return [evento["seq"], evento["pieza"], evento["guarda"], CODIGOS[evento["estado"]]]
+
+
+def codificar_mensaje(mensaje: dict) -> bytes:
+    """
+    Mensaje WebSocket como lista MessagePack:
+        [esquema, TIPO_EVENTO, seq, pieza, guarda, codigo]
+        [esquema, TIPO_LOTE, seq, [[seq, pieza, guarda, codigo], ...]]
+        [esquema, TIPO_RESYNC, seq]
+        [esquema, TIPO_PING]
+    """
+    tipo = mensaje.get("tipo")
+    if tipo == "lote":
+        compacto = [ESQUEMA, TIPO_LOTE, mensaje["seq"], [_evento(e) for e in mensaje["eventos"]]]
+    elif tipo == "resync":
+        compacto = [ESQUEMA, TIPO_RESYNC, mensaje["seq"]]
+    elif tipo == "ping":
+        compacto = [ESQUEMA, TIPO_PING]
+    else:
+        compacto = [ESQUEMA, TIPO_EVENTO, *_evento(mensaje)]
+    return msgpack.packb(compacto)
+
+
+def codificar_pedidos(rows: List[Tuple[str, str, str]]) -> bytes:
+    """Respuesta de GET /pedidos: {"v": esquema, "pedidos": [[pieza, guarda, codigo], ...]}"""
+    return msgpack.packb({"v": ESQUEMA, "pedidos": [[r[0], r[1], CODIGOS[r[2]]] for r in rows]})
+
+
+def codificar_cambios(rows: List[Tuple[int, str, str, str, int]], cursor: int, mas: bool, seq: int) -> bytes:
+    """Respuesta de GET /pedidos/changes, con [pieza, guarda, codigo, version] por pedido"""
+    return msgpack.packb({
+        "v": ESQUEMA,
+        "pedidos": [[r[1], r[2], CODIGOS[r[3]], r[4]] for r in rows],
+        "cursor": cursor,
+        "mas": mas,
+        "seq": seq,
+    })
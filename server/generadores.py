@@ -0,0 +1,15 @@
+import random
+import string
+
+# Función para generar letras aleatorias
+def generar_letras():
+    return ''.join(random.choices(string.ascii_uppercase, k=2))  # Genera 2 letras aleatorias
+
+def generar_pieza():
+    letras = generar_letras()
+    middle = f"{random.randint(10000,99999)}{random.randint(1000,9999)}"
+    suffix = "AR"
+    return letras + middle + suffix
+
+def generar_guarda():
+    return str(random.randint(1, 150))
@@ -0,0 +1,278 @@
+"""
+Carga masiva de pedidos desde CSV o NDJSON, para migrar una sucursal desde
+las planillas o poblar una base de pruebas.
+
+El archivo se lee línea por línea y se guarda en lotes de IMPORTAR_LOTE
+filas, cada uno en una transacción con executemany: la memoria usada no
+depende del tamaño del archivo.
+
+CSV: primera línea con los nombres de columna (pieza, guarda y,
+opcionalmente, estado). NDJSON: un objeto {"pieza", "guarda", "estado"} por
+línea. Sin estado, el pedido entra como "Pedido al Deposito".
+
+La carga no cambia estados: una pieza que ya existe en otro estado se
+rechaza (ese cambio va por PUT /pedido, que valida la transición y la deja
+en el historial). Si una pieza se repite, queda su última fila del lote.
+
+Uso (desde la carpeta server/, con el servidor detenido; con el servidor
+andando usar POST /pedidos/importar):
+    python importador.py pedidos.csv
+    python importador.py pedidos.ndjson --db sucursal_norte.db
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import importlib.util
+import json
+import os
+import sys
+import time
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from estados import ESTADO_INICIAL, ESTADOS_VALIDOS
+from repositorio import RepositorioPedidos, RepositorioSQLite
+import db
+
+IMPORTAR_LOTE = int(os.environ.get("IMPORTAR_LOTE", "5000"))
+# Errores detallados en el reporte; el resto solo se cuenta
+MAX_ERRORES = 100
+
+FORMATO_CSV = "csv"
+FORMATO_NDJSON = "ndjson"
+
+Fila = Tuple[str, str, str]
+
+
+def _cargar_validador():
+    """
+    PiezaValidator de la app de consulta (consulta/GUI/validator.py): las
+    reglas de la pieza (2 letras de un código conocido + 9 dígitos + AR)
+    están en un solo lugar. Se carga por ruta para no sumar consulta/GUI al
+    sys.path del servidor, que tiene módulos con los mismos nombres.
+    """
+    ruta = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "consulta", "GUI", "validator.py")
+    spec = importlib.util.spec_from_file_location("consulta_validator", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo.PiezaValidator
+
+
+PiezaValidator = _cargar_validador()
+
+
+def pieza_valida(pieza: str) -> bool:
+    """Valida el formato completo de una pieza (ya en mayúsculas)"""
+    return PiezaValidator.validar_formato_completo(pieza)
+
+
+def formato_de(nombre: str) -> Optional[str]:
+    """Formato según la extensión del archivo o el Content-Type"""
+    nombre = nombre.lower()
+    if "csv" in nombre:
+        return FORMATO_CSV
+    if "ndjson" in nombre or "jsonl" in nombre or "json" in nombre:
+        return FORMATO_NDJSON
+    return None
+
+
+class Importacion:
+    """Convierte cada línea en una fila validada y lleva la cuenta para el reporte"""
+
+    def __init__(self, formato: str):
+        if formato not in (FORMATO_CSV, FORMATO_NDJSON):
+            raise ValueError(f"Formato desconocido: {formato!r}")
+        self.formato = formato
+        self.columnas: Optional[List[str]] = None
+        self.linea = 0
+        self.importados = 0
+        self.invalidos = 0
+        # Filas pisadas por otra de la misma pieza más adelante en el lote
+        self.repetidos = 0
+        self.errores: List[dict] = []
+        self.inicio = time.perf_counter()
+
+    def leer(self, linea: str) -> Optional[Fila]:
+        """Fila (pieza, guarda, estado) de la línea, o None si está vacía o es inválida"""
+        self.linea += 1
+        linea = linea.strip()
+        if not linea:
+            return None
+        try:
+            campos = self._campos(linea)
+        except ValueError as e:
+            if self.formato == FORMATO_CSV and self.columnas is None:
+                raise  # Sin encabezado no se puede leer ninguna fila
+            return self._invalida(str(e))
+        if campos is None:
+            return None
+
+        pieza = str(campos.get("pieza") or "").strip().upper()
+        guarda = str(campos.get("guarda") or "").strip()
+        estado = str(campos.get("estado") or "").strip() or ESTADO_INICIAL
+        if not pieza_valida(pieza):
+            return self._invalida(f"Pieza inválida: {pieza!r}")
+        if not guarda:
+            return self._invalida("Falta la guarda")
+        if estado not in ESTADOS_VALIDOS:
+            return self._invalida(f"Estado inválido: {estado!r}")
+        return pieza, guarda, estado
+
+    def _campos(self, linea: str) -> Optional[dict]:
+        if self.formato == FORMATO_NDJSON:
+            try:
+                campos = json.loads(linea)
+            except json.JSONDecodeError:
+                raise ValueError("JSON inválido")
+            if not isinstance(campos, dict):
+                raise ValueError("Se esperaba un objeto JSON")
+            return campos
+
+        valores = next(csv.reader([linea]))
+        if self.columnas is None:
+            columnas = [c.strip().lower() for c in valores]
+            if "pieza" not in columnas or "guarda" not in columnas:
+                raise ValueError("La primera línea del CSV debe tener las columnas pieza y guarda")
+            self.columnas = columnas
+            return None
+        if len(valores) != len(self.columnas):
+            raise ValueError(f"Se esperaban {len(self.columnas)} columnas")
+        return dict(zip(self.columnas, valores))
+
+    def _invalida(self, error: str) -> None:
+        """Cuenta la línea como inválida; solo se guarda el detalle de las primeras"""
+        self.rechazar(self.linea, error)
+        return None
+
+    def rechazar(self, linea: int, error: str) -> None:
+        self.invalidos += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"linea": linea, "error": error})
+
+    def reporte(self) -> dict:
+        segundos = time.perf_counter() - self.inicio
+        return {
+            "importados": self.importados,
+            "invalidos": self.invalidos,
+            "repetidos": self.repetidos,
+            # Las piezas rechazadas se conocen al guardar el lote, después de las inválidas
+            "errores": sorted(self.errores, key=lambda e: e["linea"]),
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(self.importados / segundos, 1) if segundos else None,
+        }
+
+
+async def importar(repo: RepositorioPedidos, lineas: AsyncIterator[str], formato: str,
+                   lote: int = IMPORTAR_LOTE,
+                   al_guardar: Callable[[List[Tuple[int, str, str, str, int]]], None] = None) -> dict:
+    """
+    Guarda las líneas válidas en lotes de 'lote' filas.
+
+    Args:
+        repo: Repositorio de la sucursal
+        lineas: Líneas del archivo, leídas a medida que se necesitan
+        formato: "csv" o "ndjson"
+        lote: Filas por transacción
+        al_guardar: Se llama con las filas (id, pieza, guarda, estado, version)
+            de cada lote apenas se guarda, sin awaits de por medio
+
+    Returns:
+        dict: Reporte con importados, inválidos (también las piezas rechazadas),
+            repetidos, errores y filas por segundo
+
+    Raises:
+        ValueError: Si el formato o el encabezado del CSV no sirven
+    """
+    importacion = Importacion(formato)
+    pendientes: List[Fila] = []
+    # Última línea de cada pieza del lote, para el detalle de las rechazadas
+    lineas_pieza: Dict[str, int] = {}
+
+    async def guardar() -> None:
+        filas, rechazadas = await repo.importar(pendientes)
+        if al_guardar:
+            al_guardar(filas)
+        importacion.importados += len(filas)
+        importacion.repetidos += len(pendientes) - len(lineas_pieza)
+        for pieza, estado in rechazadas:
+            importacion.rechazar(lineas_pieza[pieza], f"La pieza {pieza} ya está en '{estado}': "
+                                                      "los cambios de estado van por PUT /pedido")
+        pendientes.clear()
+        lineas_pieza.clear()
+
+    async for linea in lineas:
+        fila = importacion.leer(linea)
+        if fila is not None:
+            pendientes.append(fila)
+            lineas_pieza[fila[0]] = importacion.linea
+            if len(pendientes) >= lote:
+                await guardar()
+    if pendientes:
+        await guardar()
+    return importacion.reporte()
+
+
+async def lineas_de(bloques: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Parte en líneas un cuerpo que llega en bloques (UTF-8, con o sin BOM)"""
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    resto = ""
+    async for bloque in bloques:
+        *completas, resto = (resto + decodificador.decode(bloque)).split("\n")
+        for linea in completas:
+            yield linea
+    resto += decodificador.decode(b"", final=True)
+    if resto:
+        yield resto
+
+
+async def _lineas_archivo(archivo: Iterable[str]) -> AsyncIterator[str]:
+    for linea in archivo:
+        yield linea
+
+
+async def _importar_archivo(args) -> dict:
+    repo = RepositorioSQLite(args.db)
+    ultimo = time.perf_counter()
+
+    def progreso(filas) -> None:
+        nonlocal ultimo
+        ahora = time.perf_counter()
+        print(f"💾 Lote de {len(filas)} pedidos guardado ({len(filas) / (ahora - ultimo):.0f} filas/s)",
+              file=sys.stderr)
+        ultimo = ahora
+
+    try:
+        if args.archivo == "-":
+            return await importar(repo, _lineas_archivo(sys.stdin), args.formato, args.lote, progreso)
+        with open(args.archivo, encoding="utf-8-sig", newline="") as archivo:
+            return await importar(repo, _lineas_archivo(archivo), args.formato, args.lote, progreso)
+    finally:
+        repo.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga masiva de pedidos desde CSV o NDJSON")
+    parser.add_argument("archivo", help="archivo .csv o .ndjson ('-' para leer de la entrada estándar)")
+    parser.add_argument("--db", default=db.DB_PATH, help="base de la sucursal")
+    parser.add_argument("--formato", choices=[FORMATO_CSV, FORMATO_NDJSON],
+                        help="formato del archivo; por defecto, según la extensión")
+    parser.add_argument("--lote", type=int, default=IMPORTAR_LOTE, help="filas por transacción")
+    args = parser.parse_args()
+
+    args.formato = args.formato or formato_de(args.archivo)
+    if args.formato is None:
+        parser.error("no se puede deducir el formato; usar --formato csv|ndjson")
+
+    try:
+        reporte = asyncio.run(_importar_archivo(args))
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+    print(f"✅ {reporte['importados']} pedidos importados ({reporte['filas_por_segundo']} filas/s), "
+          f"{reporte['invalidos']} inválidos", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,82 @@
-from fastapi import FastAPI, WebSocket, Query
+import os
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, Request, WebSocket, WebSocketDisconnect, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List
-import sqlite3
+from starlette.requests import HTTPConnection
+from typing import List, Optional, Tuple
+from estados import ESTADOS_VALIDOS, ESTADO_INICIAL, SECTORES, es_transicion_valida
+from metricas import MetricasMiddleware, Registro
+from sucursales import Sucursal, Sucursales, SucursalMiddleware
+from bus import WORKERS
+from repositorio import Transicion
+import formatos
+import importador
 
-app = FastAPI()
+# Cada sucursal con su base, su caché y su sala WebSocket: una no puede
+# bloquear ni inundar a otra
+sucursales = Sucursales()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sucursales.iniciar()
+    yield
+    await sucursales.cerrar()
+
+app = FastAPI(lifespan=lifespan)
+
+def sucursal_actual(conexion: HTTPConnection) -> Sucursal:
+    """Sucursal elegida por SucursalMiddleware (prefijo /s/{sucursal} o header X-Sucursal)"""
+    return conexion.scope["sucursal"]
+
+# Sectores que se registran como origen de cada cambio en el historial
+SECTORES_ORIGEN = ("consulta", *SECTORES)
+
+def sector_origen(x_sector: Optional[str] = Header(default=None)) -> Optional[str]:
+    """Sector que hace el cambio (header X-Sector); uno desconocido no se registra"""
+    return x_sector if x_sector in SECTORES_ORIGEN else None
+
+def por_sucursal(leer) -> dict:
+    return {(s.nombre,): leer(s) for s in sucursales}
+
+# Métricas
+metricas = Registro()
+latencia_http = metricas.histograma(
+    "http_request_segundos", "Latencia de los requests HTTP por ruta", ("sucursal", "metodo", "ruta", "status"))
+tiempo_db = metricas.histograma(
+    "db_consulta_segundos", "Tiempo de cada operación del almacenamiento", ("sucursal", "consulta"))
+
+def observar_consultas(sucursal: Sucursal) -> None:
+    sucursal.repo.observador = lambda consulta, segundos: tiempo_db.observar(segundos, sucursal.nombre, consulta)
+
+for s in sucursales:
+    observar_consultas(s)
+metricas.medidor("ws_conexiones", "Sockets WebSocket conectados",
+                 lambda: por_sucursal(lambda s: len(s.hub.clientes)), etiquetas=("sucursal",))
+metricas.medidor("ws_mensajes_publicados_total", "Mensajes difundidos por el hub",
+                 lambda: por_sucursal(lambda s: s.hub.publicados), "counter", ("sucursal",))
+metricas.medidor("ws_clientes_inactivos_total", "Clientes desconectados por pasar WS_PING_TIMEOUT sin enviar nada",
+                 lambda: por_sucursal(lambda s: s.hub.inactivos), "counter", ("sucursal",))
+metricas.medidor("ws_mensajes_descartados_total", "Mensajes perdidos por clientes lentos",
+                 lambda: por_sucursal(lambda s: s.hub.mensajes_descartados), "counter", ("sucursal",))
+metricas.medidor("ws_clientes_descartados_total", "Clientes desconectados por lentos",
+                 lambda: por_sucursal(lambda s: s.hub.descartados), "counter", ("sucursal",))
+metricas.medidor("ws_cola_pendientes", "Mensajes en las colas de salida",
+                 lambda: por_sucursal(lambda s: s.hub.profundidad_colas()[0]), etiquetas=("sucursal",))
+metricas.medidor("ws_cola_pendientes_max", "Cola de salida más larga",
+                 lambda: por_sucursal(lambda s: s.hub.profundidad_colas()[1]), etiquetas=("sucursal",))
+metricas.medidor("cache_hits_total", "Lecturas servidas desde memoria",
+                 lambda: por_sucursal(lambda s: s.cache.hits), "counter", ("sucursal",))
+metricas.medidor("cache_misses_total", "Lecturas que fueron a la base",
+                 lambda: por_sucursal(lambda s: s.cache.misses), "counter", ("sucursal",))
+metricas.medidor("cache_pedidos", "Pedidos activos en memoria",
+                 lambda: por_sucursal(lambda s: s.cache.estadisticas()["pedidos"]), etiquetas=("sucursal",))
+metricas.medidor("pedidos_archivados_total", "Pedidos movidos al archivo",
+                 lambda: por_sucursal(lambda s: s.archivador.archivados), "counter", ("sucursal",))
+
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,32 +85,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Estados
-ESTADOS_VALIDOS = [
-    "Pedido al Deposito",
-    "Listo para ser Entregado",
-    "Entregado al Cliente",
-    "No Entregado",
-    "En Deposito"
-]
-
-# Base de datos
-def init_db():
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS pedidos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pieza TEXT,
-            guarda TEXT,
-            estado TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
+# Último agregado = primero en ejecutarse: las métricas envuelven la
+# compresión, así que miden lo que tarda el cliente en recibir la respuesta,
+# y ya ven la sucursal
+app.add_middleware(MetricasMiddleware, histograma=latencia_http)
+app.add_middleware(SucursalMiddleware, sucursales=sucursales)
 
 # Modelos
 class Pedido(BaseModel):
@@ -48,85 +98,343 @@ class Pedido(BaseModel):
 
 class EstadoUpdate(BaseModel):
     estado: str
+    esperado: Optional[str] = None
 
-conexiones: List[WebSocket] = []
+class PedidosBatch(BaseModel):
+    pedidos: List[Pedido]
+
+class CambioEstado(BaseModel):
+    pieza: str
+    estado: str
+    esperado: Optional[str] = None
+
+class EstadosBatch(BaseModel):
+    cambios: List[CambioEstado]
+
+MAX_BATCH = 1000
+
+def validar_cambio(estado: str, esperado: Optional[str]) -> Optional[str]:
+    """Devuelve el motivo por el que el cambio es inválido, o None si es válido"""
+    if estado not in ESTADOS_VALIDOS:
+        return "Estado inválido"
+    if esperado is not None and not es_transicion_valida(esperado, estado):
+        return f"Transición inválida: {esperado} → {estado}"
+    return None
+
+def conflicto(pieza: str, transicion: Transicion) -> dict:
+    return {"pieza": pieza, "guarda": transicion.guarda, "estado_actual": transicion.estado, "version": transicion.version}
+
+# Distingue esta ejecución del servidor: al reiniciar (o recrear la base)
+# ningún ETag anterior vuelve a coincidir. Los workers de un mismo uvicorn
+# son hijos del mismo proceso y comparten la instancia.
+INSTANCIA = f"{os.getppid():x}" if WORKERS > 1 else os.urandom(4).hex()
+# El listado depende del formato pedido y de la sucursal elegida por header
+VARY = "Accept, X-Sucursal"
+
+async def version_listado(sucursal: Sucursal, estados: Optional[List[str]]) -> Tuple[str, int]:
+    """Versión barata del listado de 'estados' (sin leer los pedidos) y el seq actual"""
+    await sucursal.sincronizar()
+    version = sucursal.cache.version(estados)
+    if version is not None:
+        return str(version), sucursal.cache.seq
+    # Fuera de la caché: cualquier evento o pasada del archivador puede cambiarlo.
+    # La caché aplica todos los eventos (los de otros workers, por el bus), así
+    # que su seq es el último de la base sin ir al pool por él.
+    seq = sucursal.cache.seq
+    return f"{seq}.{sucursal.version_archivo()}", seq
+
+def etag(sucursal: Sucursal, version: str, accept: str) -> str:
+    formato = formatos.FORMATO_MSGPACK if formatos.acepta_msgpack(accept) else "json"
+    # Débil: el mismo contenido puede viajar comprimido o no
+    return f'W/"{INSTANCIA}-{sucursal.nombre}-{version}-{formato}"'
+
+def no_modificado(if_none_match: str, tag: str) -> bool:
+    return any(t.strip() in (tag, "*") for t in if_none_match.split(",")) if if_none_match else False
 
 @app.post("/pedido")
-async def nuevo_pedido(pedido: Pedido):
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO pedidos (pieza, guarda, estado) VALUES (?, ?, ?)",
-              (pedido.pieza, pedido.guarda, "Pedido al Deposito"))
-    conn.commit()
-    conn.close()
-
-    for ws in conexiones:
-        await ws.send_json({
-            "pieza": pedido.pieza,
-            "guarda": pedido.guarda,
-            "estado": "Pedido al Deposito"
-        })
-
-    return {"status": "ok"}
+async def nuevo_pedido(pedido: Pedido, sucursal: Sucursal = Depends(sucursal_actual),
+                       sector: Optional[str] = Depends(sector_origen)):
+    id, seq, anterior = await sucursal.repo.crear(pedido.pieza, pedido.guarda, ESTADO_INICIAL, sector)
+    await sucursal.confirmar([(id, pedido.pieza, pedido.guarda, ESTADO_INICIAL, seq, anterior)])
+
+    return {"status": "ok", "seq": seq}
 
 @app.put("/pedido/{pieza}")
-async def actualizar_estado(pieza: str, estado_update: EstadoUpdate):
+async def actualizar_estado(pieza: str, estado_update: EstadoUpdate, sucursal: Sucursal = Depends(sucursal_actual),
+                            sector: Optional[str] = Depends(sector_origen)):
     nuevo_estado = estado_update.estado
-    if nuevo_estado not in ESTADOS_VALIDOS:
-        return JSONResponse(status_code=400, content={"error": "Estado inválido"})
-
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute("UPDATE pedidos SET estado = ? WHERE pieza = ?", (nuevo_estado, pieza))
-    conn.commit()
-
-    c.execute("SELECT guarda FROM pedidos WHERE pieza = ?", (pieza,))
-    row = c.fetchone()
-    conn.close()
-
-    if not row:
-        return JSONResponse(status_code=404, content={"error": "Pieza no encontrada"})
-
-    guarda = row[0]
-    for ws in conexiones:
-        try:
-            await ws.send_json({
-                "pieza": pieza,
-                "guarda": guarda,
-                "estado": nuevo_estado
-            })
-        except:
-            conexiones.remove(ws)
-
-    return {"status": "ok", "pieza": pieza, "nuevo_estado": nuevo_estado}
+    error = validar_cambio(nuevo_estado, estado_update.esperado)
+    if error:
+        return JSONResponse(status_code=400, content={"error": error})
+
+    transicion = await sucursal.repo.transicionar(pieza, nuevo_estado, estado_update.esperado, sector)
+    if not transicion.ok:
+        if transicion.estado is None:
+            return JSONResponse(status_code=404, content={"error": "Pieza no encontrada"})
+        return JSONResponse(status_code=409, content={"error": "Conflicto", **conflicto(pieza, transicion)})
+
+    await sucursal.confirmar([
+        (transicion.id, pieza, transicion.guarda, nuevo_estado, transicion.version, transicion.anterior)
+    ])
+
+    return {"status": "ok", "pieza": pieza, "nuevo_estado": nuevo_estado, "version": transicion.version}
+
+@app.post("/pedidos/batch")
+async def nuevos_pedidos(batch: PedidosBatch, sucursal: Sucursal = Depends(sucursal_actual),
+                         sector: Optional[str] = Depends(sector_origen)):
+    if len(batch.pedidos) > MAX_BATCH:
+        return JSONResponse(status_code=400, content={"error": f"Máximo {MAX_BATCH} pedidos por lote"})
+    if not batch.pedidos:
+        return {"status": "ok", "seqs": []}
+
+    pedidos = [(p.pieza, p.guarda) for p in batch.pedidos]
+    insertados = await sucursal.repo.crear_varios(pedidos, ESTADO_INICIAL, sector)
+
+    await sucursal.confirmar([
+        (id, pieza, guarda, ESTADO_INICIAL, seq, anterior)
+        for (pieza, guarda), (id, seq, anterior) in zip(pedidos, insertados)
+    ])
+
+    return {"status": "ok", "seqs": [seq for _, seq, _ in insertados]}
+
+@app.put("/pedidos/estado/batch")
+async def actualizar_estados(batch: EstadosBatch, sucursal: Sucursal = Depends(sucursal_actual),
+                             sector: Optional[str] = Depends(sector_origen)):
+    if len(batch.cambios) > MAX_BATCH:
+        return JSONResponse(status_code=400, content={"error": f"Máximo {MAX_BATCH} cambios por lote"})
+    invalidos = [
+        {"pieza": c.pieza, "error": error}
+        for c in batch.cambios
+        if (error := validar_cambio(c.estado, c.esperado))
+    ]
+    if invalidos:
+        return JSONResponse(status_code=400, content={"error": "Cambios inválidos", "cambios": invalidos})
+
+    cambios = [(c.pieza, c.estado, c.esperado) for c in batch.cambios]
+    transiciones = await sucursal.repo.transicionar_varios(cambios, sector)
+
+    eventos = []
+    no_encontradas = []
+    conflictos = []
+    for (pieza, estado, _), transicion in zip(cambios, transiciones):
+        if transicion.ok:
+            eventos.append((transicion.id, pieza, transicion.guarda, estado, transicion.version, transicion.anterior))
+        elif transicion.estado is None:
+            no_encontradas.append(pieza)
+        else:
+            conflictos.append(conflicto(pieza, transicion))
+
+    if eventos:
+        await sucursal.confirmar(eventos)
+
+    return {
+        "status": "ok",
+        "actualizados": len(eventos),
+        "no_encontradas": no_encontradas,
+        "conflictos": conflictos
+    }
+
+@app.post("/pedidos/importar")
+async def importar_pedidos(
+    request: Request,
+    formato: Optional[str] = Query(default=None),
+    sucursal: Sucursal = Depends(sucursal_actual),
+):
+    """
+    Carga masiva desde CSV o NDJSON (según ?formato= o el Content-Type),
+    guardada en lotes a medida que llega el cuerpo. Ver importador.py.
+    """
+    formato = formato or importador.formato_de(request.headers.get("content-type", ""))
+    if formato is None:
+        return JSONResponse(status_code=415, content={"error": "Enviar text/csv o application/x-ndjson"})
+
+    seq_inicial = await sucursal.repo.ultimo_seq()
+
+    def al_guardar(filas):
+        sucursal.aplicar(filas, difundir=False)
+
+    try:
+        reporte = await importador.importar(
+            sucursal.repo, importador.lineas_de(request.stream()), formato,
+            al_guardar=None if sucursal.bus else al_guardar)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    if sucursal.bus:
+        # El bus ya lo aplicó y avisó a los sockets de todos los workers
+        await sucursal.bus.alcanzar(await sucursal.repo.ultimo_seq())
+    elif reporte["importados"]:
+        # Un solo aviso en vez de un evento por fila: cada cliente trae lo
+        # modificado desde seq_inicial, o recarga todo si ya aplicó algo posterior
+        sucursal.hub.publicar({"tipo": "resync", "seq": seq_inicial})
+    reporte["seq"] = sucursal.cache.seq
+    return reporte
 
 @app.get("/pedidos")
-async def obtener_pedidos(estado: str = Query(default=None)):
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-
-    if estado:
-        estados = [e.strip() for e in estado.split(",")]
-        placeholders = ",".join("?" * len(estados))
-        c.execute(
-            f"SELECT pieza, guarda, estado FROM pedidos WHERE estado IN ({placeholders})",
-            estados
-        )
+async def obtener_pedidos(
+    estado: str = Query(default=None),
+    accept: str = Header(default=""),
+    if_none_match: str = Header(default=""),
+    sucursal: Sucursal = Depends(sucursal_actual),
+):
+    estados = [e.strip() for e in estado.split(",")] if estado else None
+    version, seq = await version_listado(sucursal, estados)
+    tag = etag(sucursal, version, accept)
+    if no_modificado(if_none_match, tag):
+        # Lo que tiene el cliente sigue vigente al seq actual
+        return Response(status_code=304, headers={"ETag": tag, "X-Seq": str(seq), "Vary": VARY})
+
+    activos = sucursal.cache.listar(estados)
+    if activos is not None:
+        seq, rows = sucursal.cache.seq, [(p.pieza, p.guarda, p.estado) for p in activos]
     else:
-        c.execute("SELECT pieza, guarda, estado FROM pedidos")
-    rows = c.fetchall()
-    conn.close()
-    return [{"pieza": r[0], "guarda": r[1], "estado": r[2]} for r in rows]
+        seq, rows = await sucursal.repo.listar(estados)
+    # X-Seq: último evento incluido en la respuesta, para reanudar el WebSocket desde ahí
+    headers = {"X-Seq": str(seq), "ETag": tag, "Vary": VARY}
+    if formatos.acepta_msgpack(accept):
+        return Response(formatos.codificar_pedidos(rows), media_type=formatos.TIPO_MSGPACK, headers=headers)
+    return JSONResponse(
+        content=[{"pieza": r[0], "guarda": r[1], "estado": r[2]} for r in rows],
+        headers=headers
+    )
+
+@app.get("/pedidos/changes")
+async def cambios_pedidos(
+    since: Optional[int] = Query(default=None),
+    estado: str = Query(default=None),
+    cursor: int = Query(default=0),
+    limit: int = Query(default=500, ge=1, le=5000),
+    accept: str = Header(default=""),
+    if_none_match: str = Header(default=""),
+    sucursal: Sucursal = Depends(sucursal_actual),
+):
+    """
+    Sincronización incremental paginada.
+
+    Sin 'since' devuelve los pedidos en 'estado' (arranque en frío); con
+    'since' devuelve todos los pedidos modificados después de ese seq. Se
+    repite la consulta con 'cursor' mientras 'mas' sea verdadero; el 'seq' de
+    la primera página es desde donde reanudar el WebSocket.
+
+    En el arranque en frío cada página lleva ETag; con If-None-Match se
+    responde 304 si esos pedidos no cambiaron, con el seq actual en X-Seq.
+    """
+    estados = [e.strip() for e in estado.split(",")] if estado else None
+    headers = {"Vary": VARY}
+    if since is None:
+        version, seq = await version_listado(sucursal, estados)
+        headers["ETag"] = etag(sucursal, version, accept)
+        if no_modificado(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers={**headers, "X-Seq": str(seq)})
+
+    activos = sucursal.cache.listar(estados) if since is None else None
+    if activos is not None:
+        seq = sucursal.cache.seq
+        rows = [tuple(p) for p in activos if p.id > cursor][:limit + 1]
+    else:
+        seq, rows = await sucursal.repo.cambios(since, estados, cursor, limit)
+    mas = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        cursor = rows[-1][4] if since is not None else rows[-1][0]
+    if formatos.acepta_msgpack(accept):
+        return Response(formatos.codificar_cambios(rows, cursor, mas, seq),
+                        media_type=formatos.TIPO_MSGPACK, headers=headers)
+    return JSONResponse(content={
+        "pedidos": [{"pieza": r[1], "guarda": r[2], "estado": r[3], "version": r[4]} for r in rows],
+        "cursor": cursor,
+        "mas": mas,
+        "seq": seq,
+    }, headers=headers)
+
+@app.get("/pedidos/historial")
+async def historial_pedidos(
+    pieza: str = Query(default=None),
+    guarda: str = Query(default=None),
+    desde: str = Query(default=None),
+    hasta: str = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=5000),
+    sucursal: Sucursal = Depends(sucursal_actual),
+):
+    """Busca pedidos activos y archivados; desde/hasta filtran por fecha del último cambio (UTC)"""
+    rows = await sucursal.repo.buscar_historial(pieza, guarda, desde, hasta, limit)
+    return [
+        {"pieza": r[0], "guarda": r[1], "estado": r[2], "creado_en": r[3], "actualizado_en": r[4]}
+        for r in rows
+    ]
+
+# Código de cierre 1008 "Policy Violation": sector, estados o formato inválidos
+CIERRE_PARAMETROS_INVALIDOS = 1008
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    since: Optional[int] = Query(default=None),
+    sector: Optional[str] = Query(default=None),
+    estados: Optional[str] = Query(default=None),
+    formato: Optional[str] = Query(default=None),
+    latido: bool = Query(default=False),
+    sucursal: Sucursal = Depends(sucursal_actual),
+):
+    """
+    Eventos de pedidos en tiempo real. Con 'sector' (deposito, entrega) o
+    'estados' (separados por coma) solo llegan los eventos de pedidos que
+    entran o salen de esos estados. Con formato=msgpack los mensajes llegan
+    como frames binarios en el formato compacto de formatos.py. El servidor
+    cierra el socket si el cliente pasa WS_PING_TIMEOUT segundos sin enviar
+    nada; con latido=1 además envía {"tipo": "ping"} periódicamente para que
+    el cliente tenga qué responder.
+    """
+    if sector is not None:
+        visibles = SECTORES.get(sector)
+    elif estados:
+        visibles = [e.strip() for e in estados.split(",")]
+    else:
+        visibles = ESTADOS_VALIDOS
+    if formato not in (None, "json", formatos.FORMATO_MSGPACK):
+        await websocket.close(code=CIERRE_PARAMETROS_INVALIDOS)
+        return
+    if not visibles or any(e not in ESTADOS_VALIDOS for e in visibles):
+        await websocket.close(code=CIERRE_PARAMETROS_INVALIDOS)
+        return
+    filtro = None if visibles is ESTADOS_VALIDOS else frozenset(visibles)
+
     await websocket.accept()
-    conexiones.append(websocket)
+    cliente = sucursal.hub.conectar(websocket, since, filtro, formato if formato != "json" else None, latido)
     try:
         while True:
-            await websocket.receive_text()
-    except:
-        conexiones.remove(websocket)
+            # Cualquier frame (texto o binario) cuenta como señal de vida
+            mensaje = await websocket.receive()
+            if mensaje["type"] == "websocket.disconnect":
+                break
+            cliente.recibido()
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: el hub ya cerró el socket por ser un cliente lento
+        pass
+    finally:
+        sucursal.hub.desconectar(cliente)
+
+@app.get("/pedidos/analitica")
+async def analitica(
+    desde: Optional[str] = Query(default=None),
+    hasta: Optional[str] = Query(default=None),
+    sucursal: Sucursal = Depends(sucursal_actual),
+):
+    """
+    Percentiles del tiempo que los pedidos pasan en cada etapa y cambios de
+    estado por hora, entre 'desde' y 'hasta' (UTC, por defecto los últimos 7
+    días). El resultado se reutiliza durante ANALITICA_TTL segundos.
+    """
+    resultado = await sucursal.analitica.consultar(desde, hasta)
+    return JSONResponse(content=resultado, headers={"Cache-Control": f"max-age={int(sucursal.analitica.ttl)}"})
+
+@app.get("/cache")
+async def estadisticas_cache(sucursal: Sucursal = Depends(sucursal_actual)):
+    return sucursal.cache.estadisticas()
+
+@app.get("/metrics")
+async def exportar_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 async def ping():
@@ -0,0 +1,128 @@
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Segundos; cubre desde lecturas en memoria hasta escrituras lentas a disco
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _etiquetas(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    pares = [f'{n}="{v}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Histograma:
+    """Histograma acumulativo con etiquetas, en el formato de Prometheus"""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        # Por combinación de etiquetas: [conteos por bucket (+Inf al final), suma]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores: str) -> None:
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for valores, (conteos, suma) in self._series.items():
+                acumulado = 0
+                for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                    acumulado += conteo
+                    le = "+Inf" if limite == float("inf") else repr(limite)
+                    etiquetas = _etiquetas(self.etiquetas, valores, f'le="{le}"')
+                    lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+                lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {suma}")
+                lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    """
+    Valor que se lee recién al exportar; tipo "counter" si lo leído solo crece.
+    Con etiquetas, 'leer' devuelve {(valores de etiquetas): valor}.
+    """
+
+    def __init__(self, nombre: str, ayuda: str, leer: Callable[[], Any], tipo: str = "gauge",
+                 etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.leer = leer
+        self.tipo = tipo
+        self.etiquetas = tuple(etiquetas)
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        if not self.etiquetas:
+            return lineas + [f"{self.nombre} {self.leer()}"]
+        for valores, valor in self.leer().items():
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {valor}")
+        return lineas
+
+
+class Registro:
+    """Conjunto de métricas exportadas juntas en /metrics"""
+
+    def __init__(self):
+        self._metricas = []
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Histograma:
+        return self._agregar(Histograma(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre: str, ayuda: str, leer: Callable[[], Any], tipo: str = "gauge",
+                etiquetas: Sequence[str] = ()) -> Medidor:
+        return self._agregar(Medidor(nombre, ayuda, leer, tipo, etiquetas))
+
+    def _agregar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+class MetricasMiddleware:
+    """Middleware ASGI que mide la latencia de cada request por sucursal y ruta"""
+
+    def __init__(self, app, histograma: Histograma):
+        self.app = app
+        self.histograma = histograma
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                status[0] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # La plantilla de la ruta (/pedido/{pieza}) y no la URL, para no
+            # crear una serie por pieza
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            sucursal = getattr(scope.get("sucursal"), "nombre", "")
+            self.histograma.observar(time.perf_counter() - inicio, sucursal, scope["method"], ruta, str(status[0]))
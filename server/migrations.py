@@ -0,0 +1,182 @@
+import sqlite3
+from typing import Callable, List, Tuple
+
+AHORA_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _crear_tabla_pedidos(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pieza TEXT,
+            guarda TEXT,
+            estado TEXT
+        )
+    ''')
+
+
+def _indice_unico_pieza(conn: sqlite3.Connection) -> None:
+    # Las bases existentes pueden tener la misma pieza repetida (la consulta
+    # la envió más de una vez). Se conserva la fila más reciente.
+    conn.execute('''
+        DELETE FROM pedidos
+        WHERE id NOT IN (SELECT MAX(id) FROM pedidos GROUP BY pieza)
+    ''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_pedidos_pieza ON pedidos (pieza)")
+
+
+def _indice_estado(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_estado_id ON pedidos (estado, id)")
+
+
+def _timestamps(conn: sqlite3.Connection) -> None:
+    # ALTER TABLE no admite defaults no constantes: se completan a mano
+    conn.execute("ALTER TABLE pedidos ADD COLUMN creado_en TEXT")
+    conn.execute("ALTER TABLE pedidos ADD COLUMN actualizado_en TEXT")
+    conn.execute(f"UPDATE pedidos SET creado_en = {AHORA_SQL}, actualizado_en = {AHORA_SQL}")
+
+
+def _log_eventos(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE eventos (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            pieza TEXT,
+            guarda TEXT,
+            estado TEXT,
+            creado_en TEXT
+        )
+    ''')
+
+
+def _version_de_fila(conn: sqlite3.Connection) -> None:
+    # La versión de cada fila es el seq del último evento que la modificó
+    conn.execute("ALTER TABLE pedidos ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''
+        UPDATE pedidos SET version = COALESCE(
+            (SELECT MAX(seq) FROM eventos WHERE eventos.pieza = pedidos.pieza), 0
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_pedidos_version ON pedidos (version)")
+
+
+def _archivo(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE pedidos_archivo (
+            id INTEGER PRIMARY KEY,
+            pieza TEXT,
+            guarda TEXT,
+            estado TEXT,
+            version INTEGER NOT NULL,
+            creado_en TEXT,
+            actualizado_en TEXT,
+            archivado_en TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_archivo_pieza ON pedidos_archivo (pieza)")
+    conn.execute("CREATE INDEX idx_archivo_version ON pedidos_archivo (version)")
+    conn.execute("CREATE INDEX idx_archivo_actualizado ON pedidos_archivo (actualizado_en)")
+
+
+def _historial_transiciones(conn: sqlite3.Connection) -> None:
+    # Cada cambio de estado con el estado anterior y desde cuándo estaba en
+    # él, para medir cuánto espera un pedido en cada etapa. No se recorta.
+    conn.execute('''
+        CREATE TABLE pedido_eventos (
+            id INTEGER PRIMARY KEY,
+            pieza TEXT NOT NULL,
+            estado_anterior TEXT,
+            estado TEXT NOT NULL,
+            sector TEXT,
+            desde TEXT,
+            creado_en TEXT NOT NULL
+        )
+    ''')
+    # Cubre las consultas de analítica por rango de fechas sin leer la tabla
+    conn.execute('''
+        CREATE INDEX idx_pedido_eventos_creado
+        ON pedido_eventos (creado_en, estado_anterior, estado, desde)
+    ''')
+    # Lo que queda del log de eventos alcanza para reconstruir las transiciones recientes
+    conn.execute('''
+        INSERT INTO pedido_eventos (pieza, estado_anterior, estado, desde, creado_en)
+        SELECT pieza, LAG(estado) OVER w, estado, LAG(creado_en) OVER w, creado_en
+        FROM eventos
+        WINDOW w AS (PARTITION BY pieza ORDER BY seq)
+        ORDER BY seq
+    ''')
+
+
+def _estado_anterior_en_eventos(conn: sqlite3.Connection) -> None:
+    # Con el estado anterior, los sockets suscriptos a un sector se enteran
+    # también de los pedidos que salen de su vista (por ejemplo, al volver a
+    # pedirse una pieza que estaba lista para entregar)
+    conn.execute("ALTER TABLE eventos ADD COLUMN estado_anterior TEXT")
+    # Lo que queda del log alcanza para completar los eventos existentes
+    conn.execute('''
+        CREATE TEMP TABLE anteriores AS
+        SELECT seq, LAG(estado) OVER (PARTITION BY pieza ORDER BY seq) AS estado_anterior
+        FROM eventos
+    ''')
+    conn.execute("CREATE UNIQUE INDEX temp.idx_anteriores_seq ON anteriores (seq)")
+    conn.execute('''
+        UPDATE eventos SET estado_anterior = (
+            SELECT estado_anterior FROM anteriores WHERE anteriores.seq = eventos.seq
+        )
+    ''')
+    conn.execute("DROP TABLE temp.anteriores")
+
+
+# Migraciones en orden. La versión de cada una es su posición (1, 2, ...) y
+# la versión aplicada se guarda en PRAGMA user_version. Nunca modificar ni
+# reordenar una migración ya publicada: agregar una nueva al final.
+MIGRACIONES: List[Tuple[str, Callable[[sqlite3.Connection], None]]] = [
+    ("Tabla pedidos", _crear_tabla_pedidos),
+    ("Índice único sobre pieza", _indice_unico_pieza),
+    ("Índice compuesto (estado, id)", _indice_estado),
+    ("Columnas creado_en y actualizado_en", _timestamps),
+    ("Log de eventos numerados", _log_eventos),
+    ("Columna version de cada pedido", _version_de_fila),
+    ("Tabla de pedidos archivados", _archivo),
+    ("Historial de transiciones (pedido_eventos)", _historial_transiciones),
+    ("Estado anterior en el log de eventos", _estado_anterior_en_eventos),
+]
+
+
+def version_actual(conn: sqlite3.Connection) -> int:
+    """Obtiene la versión de esquema de la base"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn: sqlite3.Connection) -> int:
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción.
+
+    Con varios workers arrancando a la vez sobre la misma base, cada
+    migración toma el lock de escritura antes de volver a leer la versión:
+    solo uno la aplica y los demás la saltean.
+
+    Args:
+        conn: Conexión a la base a actualizar
+
+    Returns:
+        int: Versión de esquema resultante
+    """
+    version = version_actual(conn)
+    for numero, (descripcion, migracion) in enumerate(MIGRACIONES, start=1):
+        if numero <= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = version_actual(conn)
+            if numero <= version:
+                conn.commit()
+                continue
+            migracion(conn)
+            conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"🗄️ Migración {numero} aplicada: {descripcion}")
+        version = numero
+    return version
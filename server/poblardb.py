@@ -1,46 +1,54 @@
-import sqlite3
+"""
+Puebla una base de pruebas con pedidos al azar.
+
+Guarda con RepositorioSQLite.importar, igual que el importador: cada pedido
+queda con su evento, su versión y sus fechas, así que se ve en
+/pedidos/changes, en la reposición del WebSocket, en el archivador y en la
+analítica.
+
+Uso (desde la carpeta server/, con el servidor detenido: la caché de un
+servidor andando no se enteraría; con el servidor andando usar
+POST /pedidos/importar):
+    python poblardb.py [--cantidad 50] [--db database.db]
+
+Para empezar de cero, borrar antes el archivo de la base.
+"""
+import argparse
+import asyncio
 import random
-import string  # Importamos para generar letras aleatorias
 
-# Conexión a la base de datos
-conn = sqlite3.connect("database.db")
-cursor = conn.cursor()
-
-# Opcional: limpiar la tabla antes de poblarla
-cursor.execute("DELETE FROM pedidos")
+import db
+from generadores import generar_guarda, generar_pieza
+from repositorio import RepositorioSQLite
 
 # Estados posibles
-estados = [
+ESTADOS = [
     "Pedido al Deposito",
     "Listo para ser Entregado",
     "No Entregado",
 ]
 
-# Función para generar letras aleatorias
-def generar_letras():
-    return ''.join(random.choices(string.ascii_uppercase, k=2))  # Genera 2 letras aleatorias
-
-# Generar 50 piezas aleatorias
-def generar_pieza():
-    letras = generar_letras()
-    middle = f"{random.randint(10000,99999)}{random.randint(1000,9999)}"
-    suffix = "AR"
-    return letras + middle + suffix
-
-def generar_guarda():
-    return str(random.randint(1, 150))
-
-# Poblar la base de datos con 50 piezas aleatorias
-for _ in range(50):
-    pieza = generar_pieza()
-    guarda = generar_guarda()
-    estado = random.choice(estados)
-    cursor.execute(
-        "INSERT INTO pedidos (pieza, guarda, estado) VALUES (?, ?, ?)",
-        (pieza, guarda, estado)
-    )
-
-conn.commit()
-conn.close()
-
-print("✅ Se han insertado 50 piezas de prueba en la base de datos.")
+
+async def poblar(db_path: str, cantidad: int) -> int:
+    """Guarda 'cantidad' piezas al azar y devuelve cuántas quedaron guardadas"""
+    repo = RepositorioSQLite(db_path)
+    try:
+        filas = [(generar_pieza(), generar_guarda(), random.choice(ESTADOS)) for _ in range(cantidad)]
+        importadas, _ = await repo.importar(filas)
+        return len(importadas)
+    finally:
+        repo.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Puebla una base de pruebas con pedidos al azar")
+    parser.add_argument("--cantidad", type=int, default=50)
+    parser.add_argument("--db", default=db.DB_PATH, help="base de la sucursal")
+    args = parser.parse_args()
+
+    insertadas = asyncio.run(poblar(args.db, args.cantidad))
+    print(f"✅ Se han insertado {insertadas} piezas de prueba en la base de datos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+import math
+import os
+import time
+from bisect import bisect_right
+from datetime import datetime, timezone
+from heapq import nlargest
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+import db
+import estados as maquina
+import migrations
+from db import Transicion
+
+T = TypeVar("T")
+
+# Motor de almacenamiento de los pedidos: "sqlite" (predeterminado) o
+# "memoria", que no persiste nada y sirve para pruebas y para medir el
+# servidor sin el costo de la base
+ALMACEN = os.environ.get("ALMACEN", "sqlite")
+MOTOR_SQLITE = "sqlite"
+MOTOR_MEMORIA = "memoria"
+
+
+class RepositorioPedidos:
+    """
+    Almacenamiento de los pedidos de una sucursal.
+
+    Las escrituras se completan en el mismo orden en que se numeran sus
+    eventos: quien publique el resultado sin hacer otro await antes respeta
+    el orden de los seq.
+    """
+
+    # Callback opcional (consulta, segundos) para medir el tiempo de cada operación
+    observador: Optional[Callable[[str, float], None]] = None
+
+    def activos(self, estados: List[str]) -> Tuple[int, List[Tuple[int, str, str, str, int]]]:
+        """
+        (seq, filas (id, pieza, guarda, estado, version)) para cargar la caché
+        al arrancar. Es la única operación sincrónica: la llama
+        Sucursal.__init__, que corre al importar main.py, antes de que exista
+        el loop de eventos, y la caché, el hub y el bus se arman con su resultado.
+        """
+        raise NotImplementedError
+
+    async def crear(self, pieza: str, guarda: str, estado: str,
+                    sector: Optional[str] = None) -> Tuple[int, int, Optional[str]]:
+        """
+        Inserta el pedido (o lo vuelve a pedir si la pieza existía) y devuelve
+        (id, seq, estado anterior o None si es nueva). 'sector' (en todas las
+        escrituras) es quien hizo el cambio, para el historial de transiciones.
+        """
+        raise NotImplementedError
+
+    async def crear_varios(self, pedidos: List[Tuple[str, str]], estado: str,
+                           sector: Optional[str] = None) -> List[Tuple[int, int, Optional[str]]]:
+        """Inserta varios pedidos (pieza, guarda) de una sola vez"""
+        raise NotImplementedError
+
+    async def transicionar(self, pieza: str, estado: str, esperado: Optional[str] = None,
+                           sector: Optional[str] = None) -> Transicion:
+        """Cambia el estado solo si el actual es 'esperado' o un origen válido de la transición"""
+        raise NotImplementedError
+
+    async def transicionar_varios(self, cambios: List[Tuple[str, str, Optional[str]]],
+                                  sector: Optional[str] = None) -> List[Transicion]:
+        """Aplica varios cambios (pieza, estado, esperado) de una sola vez"""
+        raise NotImplementedError
+
+    async def importar(self, filas: List[Tuple[str, str, str]]
+                       ) -> Tuple[List[Tuple[int, str, str, str, int]], List[Tuple[str, str]]]:
+        """
+        Carga masiva de filas (pieza, guarda, estado). Devuelve las filas
+        resultantes para la caché y las (pieza, estado actual) rechazadas por
+        existir ya en otro estado (ver db.importar_pedidos).
+        """
+        raise NotImplementedError
+
+    async def ultimo_seq(self) -> int:
+        raise NotImplementedError
+
+    async def listar(self, estados: Optional[List[str]]) -> Tuple[int, List[Tuple[str, str, str]]]:
+        """(seq, filas (pieza, guarda, estado)) de los pedidos en 'estados', o de todos"""
+        raise NotImplementedError
+
+    async def cambios(self, since: Optional[int], estados: Optional[List[str]],
+                      cursor: int, limite: int) -> Tuple[int, List[Tuple[int, str, str, str, int]]]:
+        """Página de la sincronización incremental; ver db.cambios_pedidos"""
+        raise NotImplementedError
+
+    async def eventos_desde(self, since: int) -> Tuple[int, Optional[List[Tuple[int, str, str, str, Optional[str]]]]]:
+        """Eventos (seq, pieza, guarda, estado, anterior) posteriores a 'since', o None si el hueco no se puede reponer"""
+        raise NotImplementedError
+
+    async def buscar_historial(self, pieza: Optional[str], guarda: Optional[str], desde: Optional[str],
+                               hasta: Optional[str], limite: int) -> List[Tuple[str, str, str, str, str]]:
+        """Busca en pedidos y en el archivo; devuelve (pieza, guarda, estado, creado_en, actualizado_en)"""
+        raise NotImplementedError
+
+    async def archivar(self, estados: List[str], antes_de: str, lote: int) -> int:
+        """Archiva hasta 'lote' pedidos en 'estados' sin cambios desde 'antes_de'"""
+        raise NotImplementedError
+
+    async def analitica(self, desde: str, hasta: str, percentiles: Tuple[float, ...]
+                        ) -> Tuple[List[tuple], List[Tuple[str, str, int]]]:
+        """Esperas por etapa y cambios por hora del historial; ver db.analitica"""
+        raise NotImplementedError
+
+    def cerrar(self) -> None:
+        pass
+
+
+class RepositorioSQLite(RepositorioPedidos):
+    """Pedidos en una base SQLite, a través del pool de conexiones"""
+
+    def __init__(self, path: str):
+        self.pool = db.ConnectionPool(path)
+        self.pool.ejecutar(migrations.migrar)
+
+    @property
+    def observador(self):
+        return self.pool.observador
+
+    @observador.setter
+    def observador(self, observador):
+        self.pool.observador = observador
+
+    def activos(self, estados):
+        return self.pool.ejecutar(db.pedidos_en_estados, estados)
+
+    async def crear(self, pieza, guarda, estado, sector=None):
+        return await self.pool.escribir(db.insertar_pedido, pieza, guarda, estado, sector)
+
+    async def crear_varios(self, pedidos, estado, sector=None):
+        return await self.pool.escribir(db.insertar_pedidos, pedidos, estado, sector)
+
+    async def transicionar(self, pieza, estado, esperado=None, sector=None):
+        return await self.pool.escribir(db.actualizar_estado, pieza, estado, esperado, sector)
+
+    async def transicionar_varios(self, cambios, sector=None):
+        return await self.pool.escribir(db.actualizar_estados, cambios, sector)
+
+    async def importar(self, filas):
+        return await self.pool.escribir(db.importar_pedidos, filas)
+
+    async def ultimo_seq(self):
+        return await self.pool.run(db.ultimo_seq)
+
+    async def listar(self, estados):
+        return await self.pool.run(db.obtener_pedidos, estados)
+
+    async def cambios(self, since, estados, cursor, limite):
+        return await self.pool.run(db.cambios_pedidos, since, estados, cursor, limite)
+
+    async def eventos_desde(self, since):
+        return await self.pool.run(db.eventos_desde, since)
+
+    async def eventos_posteriores(self, since: int,
+                                  limite: int) -> List[Tuple[Optional[int], str, str, str, int, Optional[str]]]:
+        """Eventos de cualquier proceso posteriores a 'since', para el bus entre workers"""
+        return await self.pool.run(db.eventos_posteriores, since, limite)
+
+    async def buscar_historial(self, pieza, guarda, desde, hasta, limite):
+        return await self.pool.run(db.buscar_historial, pieza, guarda, desde, hasta, limite)
+
+    async def archivar(self, estados, antes_de, lote):
+        return await self.pool.escribir(db.archivar_pedidos, estados, antes_de, lote)
+
+    async def analitica(self, desde, hasta, percentiles):
+        return await self.pool.run(db.analitica, desde, hasta, percentiles)
+
+    def cerrar(self):
+        self.pool.close()
+
+
+def ahora() -> str:
+    """Fecha actual con el mismo formato que AHORA_SQL (UTC, milisegundos)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+class _Fila:
+    __slots__ = ("id", "pieza", "guarda", "estado", "version", "creado_en", "actualizado_en")
+
+    def __init__(self, id: int, pieza: str, guarda: str, estado: str, version: int, creado_en: str):
+        self.id = id
+        self.pieza = pieza
+        self.guarda = guarda
+        self.estado = estado
+        self.version = version
+        self.creado_en = creado_en
+        self.actualizado_en = creado_en
+
+    def completa(self) -> Tuple[int, str, str, str, int]:
+        return self.id, self.pieza, self.guarda, self.estado, self.version
+
+
+class RepositorioMemoria(RepositorioPedidos):
+    """
+    Pedidos en estructuras de Python, sin persistencia: se pierden al
+    reiniciar. Reproduce el comportamiento de RepositorioSQLite (versiones,
+    conflictos, log de eventos y archivo) sin hilos ni awaits, así que cada
+    escritura termina antes de que empiece la siguiente. A diferencia de
+    SQLite, el archivado también recorta el historial de transiciones: la
+    analítica solo cubre los últimos ARCHIVO_DIAS.
+    """
+
+    def __init__(self, max_replay: int = db.MAX_REPLAY):
+        self.max_replay = max_replay
+        self._seq = 0
+        self._proximo_id = 1
+        # Activos por pieza; el orden de inserción coincide con el de los ids
+        self._pedidos: Dict[str, _Fila] = {}
+        self._ids: List[int] = []
+        self._archivo: List[_Fila] = []
+        # Log de eventos (seq, pieza, guarda, estado, creado_en, estado anterior), consecutivos
+        self._eventos: List[Tuple[int, str, str, str, str, Optional[str]]] = []
+        # Cada versión asignada y su fila, en orden: una entrada vale mientras
+        # la fila conserve esa versión (las archivadas no cambian más)
+        self._versiones: List[int] = []
+        self._filas: List[_Fila] = []
+        # Historial (estado_anterior, estado, sector, desde, creado_en); la pieza no se usa
+        self._transiciones: List[Tuple[Optional[str], str, Optional[str], Optional[str], str]] = []
+
+    def _medir(self, consulta: str, fn: Callable[..., T], *args) -> T:
+        if self.observador is None:
+            return fn(*args)
+        inicio = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.observador(consulta, time.perf_counter() - inicio)
+
+    def _registrar(self, fila: _Fila, momento: str, anterior: Optional[str]) -> None:
+        self._seq += 1
+        fila.version = self._seq
+        fila.actualizado_en = momento
+        self._eventos.append((self._seq, fila.pieza, fila.guarda, fila.estado, momento, anterior))
+        self._versiones.append(self._seq)
+        self._filas.append(fila)
+        # Compacta las versiones viejas cuando ya son mayoría
+        if len(self._filas) > 1024 and len(self._filas) > 2 * (len(self._pedidos) + len(self._archivo)):
+            vigentes = [(v, f) for v, f in zip(self._versiones, self._filas) if f.version == v]
+            self._versiones = [v for v, _ in vigentes]
+            self._filas = [f for _, f in vigentes]
+
+    def _insertar(self, pieza: str, guarda: str, estado: str,
+                  sector: Optional[str] = None) -> Tuple[int, int, Optional[str]]:
+        momento = ahora()
+        fila = self._pedidos.get(pieza)
+        anterior = fila.estado if fila is not None else None
+        if fila is None:
+            self._transiciones.append((None, estado, sector, None, momento))
+            fila = _Fila(self._proximo_id, pieza, guarda, estado, 0, momento)
+            self._proximo_id += 1
+            self._pedidos[pieza] = fila
+            self._ids.append(fila.id)
+        else:
+            self._transiciones.append((fila.estado, estado, sector, fila.actualizado_en, momento))
+            fila.guarda = guarda
+            fila.estado = estado
+        self._registrar(fila, momento, anterior)
+        return fila.id, fila.version, anterior
+
+    def _actualizar(self, pieza: str, estado: str, esperado: Optional[str],
+                    sector: Optional[str] = None) -> Transicion:
+        fila = self._pedidos.get(pieza)
+        if fila is None:
+            return Transicion(False)
+        esperados = [esperado] if esperado else maquina.origenes(estado)
+        if fila.estado not in esperados:
+            return Transicion(False, fila.guarda, fila.estado, fila.version, fila.id)
+        momento = ahora()
+        self._transiciones.append((fila.estado, estado, sector, fila.actualizado_en, momento))
+        anterior, fila.estado = fila.estado, estado
+        self._registrar(fila, momento, anterior)
+        return Transicion(True, fila.guarda, estado, fila.version, fila.id, anterior)
+
+    def _en_estados(self, estados: Optional[List[str]]):
+        if not estados:
+            return self._pedidos.values()
+        return (f for f in self._pedidos.values() if f.estado in estados)
+
+    def activos(self, estados):
+        return self._medir("pedidos_en_estados", lambda: (self._seq, [f.completa() for f in self._en_estados(estados)]))
+
+    async def crear(self, pieza, guarda, estado, sector=None):
+        return self._medir("insertar_pedido", self._insertar, pieza, guarda, estado, sector)
+
+    async def crear_varios(self, pedidos, estado, sector=None):
+        return self._medir("insertar_pedidos", lambda: [self._insertar(p, g, estado, sector) for p, g in pedidos])
+
+    async def transicionar(self, pieza, estado, esperado=None, sector=None):
+        return self._medir("actualizar_estado", self._actualizar, pieza, estado, esperado, sector)
+
+    async def transicionar_varios(self, cambios, sector=None):
+        return self._medir("actualizar_estados", lambda: [self._actualizar(*c, sector) for c in cambios])
+
+    def _importar(self, filas):
+        # Una pieza repetida en el lote queda con su última fila
+        unicas = {pieza: (guarda, estado) for pieza, guarda, estado in filas}
+        importadas, rechazadas = [], []
+        for pieza, (guarda, estado) in unicas.items():
+            fila = self._pedidos.get(pieza)
+            if fila is None:
+                # Como en SQLite, una carga masiva no es un cambio de estado: no va al historial
+                transiciones = len(self._transiciones)
+                self._insertar(pieza, guarda, estado)
+                del self._transiciones[transiciones:]
+            elif fila.estado != estado:
+                rechazadas.append((pieza, fila.estado))
+                continue
+            else:
+                desde = fila.actualizado_en
+                fila.guarda = guarda
+                self._registrar(fila, ahora(), estado)
+                fila.actualizado_en = desde
+            importadas.append(self._pedidos[pieza].completa())
+        return importadas, rechazadas
+
+    async def importar(self, filas):
+        return self._medir("importar_pedidos", self._importar, filas)
+
+    async def ultimo_seq(self):
+        return self._seq
+
+    async def listar(self, estados):
+        return self._medir("obtener_pedidos", lambda: (
+            self._seq, [(f.pieza, f.guarda, f.estado) for f in self._en_estados(estados)]))
+
+    def _cambios(self, since, estados, cursor, limite):
+        filas = []
+        if since is not None:
+            # Versión mayor que 'desde', incluidas las del archivo
+            desde = max(since, cursor)
+            for i in range(bisect_right(self._versiones, desde), len(self._versiones)):
+                fila = self._filas[i]
+                if fila.version == self._versiones[i]:
+                    filas.append(fila.completa())
+                    if len(filas) > limite:
+                        break
+            return self._seq, filas
+        # _ids sigue el orden de _pedidos: la posición del cursor es la misma en ambos
+        for fila in islice(self._pedidos.values(), bisect_right(self._ids, cursor), None):
+            if estados and fila.estado not in estados:
+                continue
+            filas.append(fila.completa())
+            if len(filas) > limite:
+                break
+        return self._seq, filas
+
+    async def cambios(self, since, estados, cursor, limite):
+        return self._medir("cambios_pedidos", self._cambios, since, estados, cursor, limite)
+
+    def _eventos_desde(self, since: int):
+        minimo = self._eventos[0][0] if self._eventos else self._seq + 1
+        if since > self._seq or since < minimo - 1:
+            return self._seq, None
+        if self._seq - since > self.max_replay:
+            return self._seq, None
+        return self._seq, [(*e[:4], e[5]) for e in self._eventos[since - minimo + 1:]]
+
+    async def eventos_desde(self, since):
+        return self._medir("eventos_desde", self._eventos_desde, since)
+
+    def _buscar_historial(self, pieza, guarda, desde, hasta, limite):
+        def coincide(fila: _Fila) -> bool:
+            return ((pieza is None or fila.pieza == pieza) and (guarda is None or fila.guarda == guarda)
+                    and (desde is None or fila.actualizado_en >= desde)
+                    and (hasta is None or fila.actualizado_en < hasta))
+
+        encontrados = (f for filas in (self._pedidos.values(), self._archivo) for f in filas if coincide(f))
+        return [(f.pieza, f.guarda, f.estado, f.creado_en, f.actualizado_en)
+                for f in nlargest(limite, encontrados, key=lambda f: f.actualizado_en)]
+
+    async def buscar_historial(self, pieza, guarda, desde, hasta, limite):
+        return self._medir("buscar_historial", self._buscar_historial, pieza, guarda, desde, hasta, limite)
+
+    def _archivar(self, estados, antes_de, lote):
+        movidos = [f for f in self._pedidos.values() if f.estado in estados and f.actualizado_en < antes_de][:lote]
+        for fila in movidos:
+            del self._pedidos[fila.pieza]
+        if movidos:
+            self._archivo.extend(movidos)
+            self._ids = [f.id for f in self._pedidos.values()]
+        recortar = 0
+        while recortar < min(lote, len(self._eventos)) and self._eventos[recortar][4] < antes_de:
+            recortar += 1
+        del self._eventos[:recortar]
+        # Sin esto el historial crece mientras viva el proceso; está en orden de creado_en
+        recortar = 0
+        while recortar < min(lote, len(self._transiciones)) and self._transiciones[recortar][4] < antes_de:
+            recortar += 1
+        del self._transiciones[:recortar]
+        return len(movidos)
+
+    async def archivar(self, estados, antes_de, lote):
+        return self._medir("archivar_pedidos", self._archivar, estados, antes_de, lote)
+
+    def _analitica(self, desde, hasta, percentiles):
+        esperas: Dict[Tuple[str, str], List[float]] = {}
+        por_hora: Dict[Tuple[str, str], int] = {}
+        for anterior, estado, _, entrada, momento in self._transiciones:
+            if not desde <= momento < hasta:
+                continue
+            clave = (momento[:13], estado)
+            por_hora[clave] = por_hora.get(clave, 0) + 1
+            if entrada is not None:
+                segundos = (_fecha(momento) - _fecha(entrada)).total_seconds()
+                esperas.setdefault((anterior, estado), []).append(segundos)
+        etapas = []
+        for (anterior, estado), valores in esperas.items():
+            valores.sort()
+            n = len(valores)
+            etapas.append((anterior, estado, n, sum(valores) / n, valores[-1],
+                           *(valores[max(0, math.ceil(p * n) - 1)] for p in percentiles)))
+        etapas.sort(key=lambda e: -e[2])
+        return etapas, [(hora, estado, n) for (hora, estado), n in sorted(por_hora.items())]
+
+    async def analitica(self, desde, hasta, percentiles):
+        return self._medir("analitica", self._analitica, desde, hasta, percentiles)
+
+
+def _fecha(texto: str) -> datetime:
+    return datetime.strptime(texto, "%Y-%m-%d %H:%M:%S.%f")
+
+
+def crear_repositorio(db_path: str, motor: str = ALMACEN) -> RepositorioPedidos:
+    """Repositorio del motor elegido; 'db_path' solo se usa con SQLite"""
+    if motor == MOTOR_SQLITE:
+        return RepositorioSQLite(db_path)
+    if motor == MOTOR_MEMORIA:
+        return RepositorioMemoria()
+    raise ValueError(f"Motor de almacenamiento desconocido: {motor!r}")
@@ -0,0 +1,190 @@
+import os
+import re
+from typing import Dict, Iterator, List, Optional
+
+from analitica import Analitica
+from archivo import Archivador
+from broadcast import BroadcastHub
+from bus import WORKERS, BusEventos, Evento
+from cache import CachePedidos
+from estados import ESTADOS_ACTIVOS
+from repositorio import ALMACEN, MOTOR_MEMORIA, crear_repositorio
+import db
+
+# Sucursal a la que van los requests sin prefijo ni header; usa DB_PATH
+SUCURSAL_PRINCIPAL = "principal"
+# Sucursales adicionales, separadas por coma; cada una con su base en DB_DIR
+SUCURSALES = [s.strip() for s in os.environ.get("SUCURSALES", "").split(",") if s.strip()]
+DB_DIR = os.environ.get("DB_DIR", ".")
+
+NOMBRE_VALIDO = re.compile(r"^[a-z0-9_-]{1,32}$")
+PREFIJO = "/s/"
+HEADER = b"x-sucursal"
+# Código de cierre 1008 "Policy Violation" para sockets de una sucursal desconocida
+CIERRE_SUCURSAL_DESCONOCIDA = 1008
+
+
+class Sucursal:
+    """Base, caché, sala WebSocket, archivador y analítica propios de una sucursal"""
+
+    def __init__(self, nombre: str, db_path: str, almacen: str = ALMACEN, compartida: bool = False):
+        """
+        Args:
+            nombre: Nombre de la sucursal
+            db_path: Base de la sucursal
+            almacen: Motor de almacenamiento ("sqlite" o "memoria")
+            compartida: Otros workers escriben en la misma base; la caché y
+                los sockets de este proceso se actualizan desde el log de eventos
+        """
+        self.nombre = nombre
+        self.repo = crear_repositorio(db_path, almacen)
+
+        # Pedidos activos en memoria. Se actualiza justo después de cada escritura,
+        # sin awaits de por medio, así que siempre coincide con la base. Con
+        # varios workers se actualiza desde el bus, en el orden del log.
+        self.cache = CachePedidos(ESTADOS_ACTIVOS)
+        self.cache.cargar(*self.repo.activos(ESTADOS_ACTIVOS))
+
+        self.hub = BroadcastHub(self.historial)
+        self.archivador = Archivador(self.repo)
+        self.analitica = Analitica(self.repo)
+        self.bus = BusEventos(self.repo, self.cache.seq, self.aplicar, self.hub.publicar) if compartida else None
+
+    def aplicar(self, eventos: List[Evento], difundir: bool = True) -> None:
+        """Refleja en la caché escrituras ya confirmadas, en orden de seq, y las difunde"""
+        for evento in eventos:
+            # Las filas del importador no traen el estado anterior
+            self.cache.aplicar(*evento[:5])
+        if not difundir or not eventos:
+            return
+        # 'anterior' permite avisar a los sockets de un sector que el pedido salió de su vista
+        mensajes = [{"seq": seq, "pieza": pieza, "guarda": guarda, "estado": estado, "anterior": anterior}
+                    for _, pieza, guarda, estado, seq, anterior in eventos]
+        if len(mensajes) == 1:
+            self.hub.publicar(mensajes[0])
+        else:
+            self.hub.publicar({"tipo": "lote", "seq": mensajes[-1]["seq"], "eventos": mensajes})
+
+    async def confirmar(self, eventos: List[Evento]) -> None:
+        """
+        Refleja las escrituras (id, pieza, guarda, estado, seq, anterior) que este
+        worker acaba de hacer. Sin bus se aplican sin suspenderse: llamarla
+        justo después de la escritura, sin otro await, respeta el orden de
+        los seq. Con bus se espera a que el lector del log llegue hasta ellas.
+        """
+        if self.bus:
+            await self.bus.alcanzar(eventos[-1][4])
+        else:
+            self.aplicar(eventos)
+
+    async def sincronizar(self) -> None:
+        """Antes de leer de la caché: con bus, incorpora lo que ya confirmaron otros workers"""
+        if self.bus:
+            await self.bus.sincronizar()
+
+    def version_archivo(self) -> int:
+        """Cambia con cada pasada del archivador que movió pedidos, también las de otros workers"""
+        return self.archivador.archivados + (self.bus.cambios_sin_eventos if self.bus else 0)
+
+    async def historial(self, since: int) -> List[dict]:
+        """Eventos posteriores a 'since', o un aviso de resincronización si no se pueden reponer"""
+        seq, eventos = await self.repo.eventos_desde(since)
+        if eventos is None:
+            return [{"tipo": "resync", "seq": seq}]
+        return [{"seq": e[0], "pieza": e[1], "guarda": e[2], "estado": e[3], "anterior": e[4]} for e in eventos]
+
+    def iniciar(self) -> None:
+        self.hub.iniciar()
+        self.archivador.iniciar()
+        if self.bus:
+            self.bus.iniciar()
+
+    async def cerrar(self) -> None:
+        await self.archivador.detener()
+        if self.bus:
+            await self.bus.cerrar()
+        await self.hub.cerrar()
+        self.repo.cerrar()
+
+
+class Sucursales:
+    """Sucursales atendidas por este proceso, cada una aislada en su propia base"""
+
+    def __init__(self, nombres: List[str] = SUCURSALES, db_dir: str = DB_DIR, db_principal: str = db.DB_PATH,
+                 almacen: str = ALMACEN, workers: int = WORKERS):
+        """
+        Args:
+            nombres: Sucursales además de la principal
+            db_dir: Carpeta de las bases de las sucursales adicionales
+            db_principal: Base de la sucursal principal
+            almacen: Motor de almacenamiento ("sqlite" o "memoria")
+            workers: Procesos de uvicorn que atienden las mismas sucursales
+        """
+        for nombre in nombres:
+            if not NOMBRE_VALIDO.match(nombre) or nombre == SUCURSAL_PRINCIPAL:
+                raise ValueError(f"Nombre de sucursal inválido: {nombre!r}")
+        compartidas = workers > 1
+        if compartidas and almacen == MOTOR_MEMORIA:
+            raise ValueError("ALMACEN=memoria no se comparte entre procesos: usar un solo worker")
+        self.principal = Sucursal(SUCURSAL_PRINCIPAL, db_principal, almacen, compartidas)
+        self._sucursales: Dict[str, Sucursal] = {SUCURSAL_PRINCIPAL: self.principal}
+        for nombre in nombres:
+            self._sucursales[nombre] = Sucursal(nombre, os.path.join(db_dir, f"sucursal_{nombre}.db"),
+                                                almacen, compartidas)
+
+    def get(self, nombre: str) -> Optional[Sucursal]:
+        return self._sucursales.get(nombre)
+
+    def __iter__(self) -> Iterator[Sucursal]:
+        return iter(self._sucursales.values())
+
+    def iniciar(self) -> None:
+        for sucursal in self:
+            sucursal.iniciar()
+
+    async def cerrar(self) -> None:
+        for sucursal in self:
+            await sucursal.cerrar()
+
+
+class SucursalMiddleware:
+    """
+    Middleware ASGI que elige la sucursal de cada request, por el prefijo
+    /s/{sucursal}/... (que se quita de la ruta) o por el header X-Sucursal,
+    y la deja en scope["sucursal"].
+    """
+
+    def __init__(self, app, sucursales: Sucursales):
+        self.app = app
+        self.sucursales = sucursales
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path.startswith(PREFIJO):
+            nombre, _, resto = path[len(PREFIJO):].partition("/")
+            path = "/" + resto
+        else:
+            nombre = dict(scope["headers"]).get(HEADER, b"").decode("latin-1") or SUCURSAL_PRINCIPAL
+
+        sucursal = self.sucursales.get(nombre)
+        if sucursal is None:
+            await self._rechazar(scope, send)
+            return
+        scope = dict(scope, path=path, raw_path=path.encode(), sucursal=sucursal)
+        await self.app(scope, receive, send)
+
+    async def _rechazar(self, scope, send) -> None:
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": CIERRE_SUCURSAL_DESCONOCIDA})
+            return
+        cuerpo = b'{"error":"Sucursal desconocida"}'
+        await send({
+            "type": "http.response.start",
+            "status": 404,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(cuerpo)).encode())],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})